@@ -1,144 +1,321 @@
-
 """
-This file is the DataFetch Module as mentioned in our Design Document.Please note that in order to use this file, one 
-would need Trader Workstation in the correct directory along with the required market data subscriptions in order to 
-execute this file. Thus there is no need to execute the file or any code as it only extracts the data - which we have 
-already pushed to the github repo. 
+This file is the DataFetch Module as mentioned in our Design Document.Please note that in order to use this file, one
+would need Trader Workstation in the correct directory along with the required market data subscriptions in order to
+execute this file. Thus there is no need to execute the file or any code as it only extracts the data - which we have
+already pushed to the github repo.
+
 
+This file takes a list of stock tickers and calls the earnings_dates module to generate the historical price data
+on the specific dates (between the time periods : 16:00 and 17:00) each company released its earnings report.
 
-This file picks one stock ticker at a time and calls the earnings_dates module to generate the historical price data 
-on the specific dates (between the time periods : 16:00 and 17:00) a company released its earnings report.
+Requests for every (ticker, earnings date) pair are pipelined by HistoricalFetcher: it keeps a bounded window of
+requests in flight under IB's historical data pacing limits, maps each reqId back to its (ticker, date), treats a
+request as done when historicalDataEnd (or an error) arrives instead of sleeping for a fixed time, and buffers bars
+in lists that are turned into one DataFrame per ticker at the end. Nothing connects to TWS on import, and ibapi is
+only imported once a fetch starts; the fetcher only needs a client object with reqHistoricalData/cancelHistoricalData,
+so it can be driven by a local fake client.
 
-We tried to make this method generalizable and more modular so that we can just a single list of stocks and populate 
-all of them, however due to concurrency, this script can AT MAX return one csv file per ticker at a time. 
-The csvs generated are stored as [TICKER_NAME]_Earnings_Data(5M).csv and are further utilized by the backtest.py. 
+The csvs generated are stored as [TICKER_NAME]_Earnings_Data(5M).csv and are further utilized by the backtest.py.
+By default only earnings dates without bars on disk are requested, and the new bars are merged into the existing
+csv (and its columnar copies); pass --full to refetch everything.
 
 """
 
-import sys 
-sys.path.insert(0,"")  #Insert Path to your broker's API files in your local directory 
-from ibapi.client import EClient
-from ibapi.wrapper import EWrapper
-from ibapi.contract import Contract
-from ibapi.order import Order
-from ibapi.execution import *
+import sys
+import os
+sys.path.insert(0,"")  #Insert Path to your broker's API files in your local directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backtest"))  #Shared earnings dates cache
 import time
 import threading
-import random 
-import yfinance as yf
+import random
+import argparse
+from collections import deque
 import pandas as pd
-from datetime import datetime
+from earnings_cache import get_earnings_dates
+from bar_store import merge_price_bars, stored_bar_dates
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# IB historical data pacing limits - https://ibkrcampus.com/ibkr-api-page/trader-workstation-api/#historical-pacing-limitations
+MAX_IN_FLIGHT = 50              # simultaneous open historical data requests
+MAX_REQUESTS_PER_WINDOW = 60    # requests in any PACING_WINDOW seconds
+PACING_WINDOW = 600
+MAX_REQUESTS_PER_CONTRACT = 6   # requests for the same contract in any CONTRACT_WINDOW seconds
+CONTRACT_WINDOW = 2
+REQUEST_TIMEOUT = 120           # seconds before an unanswered request is cancelled
+
+# Informational TWS messages that are not tied to a failed request
+INFO_CODES = {2104, 2106, 2107, 2108, 2158, 2174}
+
+colums = ['ReqId', 'ticker', 'date', 'Open' , 'High' , 'Low' , 'Close' , 'Volume']
+
+
+def stockContract(symbol, sec_type="STK", currency="USD", exchange="SMART", primary_exchange="NASDAQ"):
+    from ibapi.contract import Contract
+    contract = Contract()
+    contract.symbol = symbol
+    contract.secType = sec_type
+    contract.exchange = exchange
+    contract.currency = currency
+    contract.primaryExchange = primary_exchange
+    return contract
 
-today = pd.Timestamp.now(tz='America/New_York').normalize() 
 
+def request_date(earnings_date):
+    """
+    Trading date ('YYYYMMDD') covered by the request sent for an earnings date.
+    """
+    return str(earnings_date)[0:10].replace('-', '')
 
-selected = 'GOOGL'
-tickerlist = [selected]
-ticker_objlist = [] 
-ticker_dfs = {} 
 
-for item in tickerlist:
-    ticker_objlist.append(yf.Ticker(item))
-    
-    # Get earnings dates
-    ticker_dfs[item] = ticker_objlist[tickerlist.index(item)].get_earnings_dates(64)
+def get_past_earnings_dates(ticker, max_earnings=64):
+    """
+    Earnings dates for a ticker (converted to UTC) up to today, or None if none could
+    be fetched (an offline cache miss or a yfinance failure).
+    """
+    earnings_df = get_earnings_dates(ticker, max_earnings)
+    if earnings_df is None:
+        return None
 
     # Convert from America/New_York (UTC-5) to UTC
-    ticker_dfs[item].index = ticker_dfs[item].index.tz_convert('UTC')
+    earnings_df.index = earnings_df.index.tz_convert('UTC')
 
     # Keep only past earnings dates
     today = pd.Timestamp.now(tz='UTC').normalize()
-    ticker_dfs[item] = ticker_dfs[item][ticker_dfs[item].index <= today]
+    return earnings_df[earnings_df.index <= today]
 
-# Print the fixed DataFrame
-print(ticker_dfs[selected])
 
-"""
-Request Historical OHLCV data (via reqHistoricalData) - https://ibkrcampus.com/ibkr-api-page/trader-workstation-api/#historical-bars
-"""
-cols = ['ReqID','Time', 'Price' , 'Size']
-tickdf = pd.DataFrame(columns = cols)
-colums = ['ReqId', 'ticker', 'date', 'Open' , 'High' , 'Low' , 'Close' , 'Volume']
-pricedflist = [pd.DataFrame(columns=colums) for _ in range(len(tickerlist))]
-# request_ids = range(4102,4102 + len(tickerlist)) 
-# req_idlist = [[_ for _ in range(x,x+buffer)] for x in range(4102,4102 + len(tickerlist)*buffer,buffer)]
-# request_ticker_map = dict(zip(tickerlist,req_idlist))
+class HistoricalFetcher:
+    """
+    Pipelines reqHistoricalData calls for many (ticker, earnings date) pairs.
 
+    The wrapper forwards historicalData / historicalDataEnd / error callbacks to
+    on_bar / on_end / on_error; fetch() sends requests as in-flight slots and the
+    pacing limits allow, then waits until every request has completed.
+    """
 
+    def __init__(self, client, max_in_flight=MAX_IN_FLIGHT, max_requests=MAX_REQUESTS_PER_WINDOW,
+                 pacing_window=PACING_WINDOW, max_per_contract=MAX_REQUESTS_PER_CONTRACT,
+                 contract_window=CONTRACT_WINDOW, timeout=REQUEST_TIMEOUT, first_req_id=1,
+                 clock=time.monotonic):
+        self.client = client
+        self.max_in_flight = max_in_flight
+        self.max_requests = max_requests
+        self.pacing_window = pacing_window
+        self.max_per_contract = max_per_contract
+        self.contract_window = contract_window
+        self.timeout = timeout
+        self.clock = clock
+        self.next_req_id = first_req_id
+        self.cond = threading.Condition()
+        self.requests = {}      # reqId -> (ticker, end date)
+        self.bars = {}          # reqId -> list of bar tuples
+        self.in_flight = {}     # reqId -> time sent
+        self.errors = {}        # reqId -> (error code, message)
+        self.sent_times = deque()
+        self.contract_sent_times = {}
 
-print("expected records" , len(ticker_dfs[selected].index)) 
+    def on_bar(self, reqId, bar):
+        # Bars of cancelled or unknown requests are dropped
+        if reqId in self.in_flight:
+            self.bars[reqId].append((bar.date, bar.open, bar.high, bar.low, bar.close, bar.volume))
 
-class TradeApp(EWrapper, EClient): 
-    def __init__(self): 
-        EClient.__init__(self, self) 
-        self.data = {}
-        self.responses_received = 0 
-        self.requests_sent = 1
-        
-    def historicalData(self, reqId, bar):
-        for ticker in tickerlist[0:1] : 
-                print(reqId)
-                pricedflist[tickerlist.index(ticker)].loc[len(pricedflist[tickerlist.index(ticker)])] = [reqId, ticker, bar.date, bar.open , bar.high , bar.low , bar.close , bar.volume ]
-                self.responses_received += 1  # Increment when data is received
+    def on_end(self, reqId):
+        self._finish(reqId)
 
+    def on_error(self, reqId, errorCode, errorString):
+        if errorCode in INFO_CODES or reqId not in self.requests:
+            return
+        self.errors[reqId] = (errorCode, errorString)
+        print(f"Request {reqId} {self.requests[reqId]} failed: {errorCode} {errorString}")
+        self._finish(reqId)
 
-            # Stop the loop when all requests are processed
+    def _finish(self, reqId):
+        with self.cond:
+            if self.in_flight.pop(reqId, None) is not None:
+                self.cond.notify_all()
 
-            
+    def _expire_stale(self):
+        # Called with self.cond held
+        now = self.clock()
+        for reqId, sent_at in list(self.in_flight.items()):
+            if now - sent_at > self.timeout:
+                print(f"Request {reqId} {self.requests[reqId]} timed out, cancelling")
+                self.errors[reqId] = (None, 'timeout')
+                del self.in_flight[reqId]
+                self.client.cancelHistoricalData(reqId)
 
-def stockContract(symbol, sec_type="STK", currency="USD", exchange="SMART"):
-    contract = Contract()
-    contract.symbol = ticker
-    contract.secType = "STK"
-    contract.exchange = "SMART"
-    contract.currency = "USD"
-    contract.primaryExchange = "NASDAQ"
-    return contract
+    def _pacing_delay(self, ticker):
+        # Seconds to wait before another request (for this ticker) stays within the pacing limits
+        now = self.clock()
+        while self.sent_times and now - self.sent_times[0] >= self.pacing_window:
+            self.sent_times.popleft()
+        contract_times = self.contract_sent_times.setdefault(ticker, deque())
+        while contract_times and now - contract_times[0] >= self.contract_window:
+            contract_times.popleft()
+
+        delay = 0.0
+        if len(self.sent_times) >= self.max_requests:
+            delay = max(delay, self.sent_times[0] + self.pacing_window - now)
+        if len(contract_times) >= self.max_per_contract:
+            delay = max(delay, contract_times[0] + self.contract_window - now)
+        return delay
+
+    def _wait(self, predicate):
+        # Waits on self.cond (held) until predicate() is False, expiring stale requests
+        while predicate():
+            self._expire_stale()
+            if predicate():
+                self.cond.wait(timeout=1.0)
+
+    def send(self, ticker, end_date):
+        """
+        Sends one request once a slot is free and pacing allows. Returns its reqId.
+        """
+        with self.cond:
+            self._wait(lambda: len(self.in_flight) >= self.max_in_flight)
+            delay = self._pacing_delay(ticker)
+            while delay > 0:
+                self.cond.wait(timeout=delay)
+                delay = self._pacing_delay(ticker)
+
+            reqId = self.next_req_id
+            self.next_req_id += 1
+            now = self.clock()
+            self.requests[reqId] = (ticker, end_date)
+            self.bars[reqId] = []
+            self.in_flight[reqId] = now
+            self.sent_times.append(now)
+            self.contract_sent_times[ticker].append(now)
+
+        self.client.reqHistoricalData(reqId,
+                                      contract=stockContract(ticker),
+                                      endDateTime=request_date(end_date) + ' 23:30:00 UTC',
+                                      durationStr='12400 S',
+                                      barSizeSetting='5 mins',
+                                      whatToShow='Trades',
+                                      useRTH=0,                 #0 = Includes data outside of RTH | 1 = RTH data only
+                                      formatDate=1,
+                                      keepUpToDate=0,           #0 = False | 1 = True
+                                      chartOptions=[])
+        return reqId
+
+    def wait_all(self):
+        with self.cond:
+            self._wait(lambda: bool(self.in_flight))
+
+    def fetch(self, requests):
+        """
+        Fetches 5-minute bars for every (ticker, earnings date) pair.
+
+        Returns a dict of ticker -> DataFrame with the columns of the
+        [TICKER_NAME]_Earnings_Data(5M).csv files.
+        """
+        for ticker, end_date in requests:
+            self.send(ticker, end_date)
+        self.wait_all()
+        return self.build_frames()
+
+    def build_frames(self):
+        rows = {}
+        for reqId in sorted(self.requests):
+            ticker, _ = self.requests[reqId]
+            ticker_rows = rows.setdefault(ticker, [])
+            ticker_rows.extend((reqId, ticker) + bar for bar in self.bars[reqId])
+        return {ticker: pd.DataFrame(ticker_rows, columns=colums) for ticker, ticker_rows in rows.items()}
+
+
+def trade_app():
+    """
+    Creates the TWS client that forwards historical data callbacks to its fetcher.
+
+    ibapi is imported here rather than at module level, so importing this module
+    needs neither the broker API files nor a connection.
+    """
+    from ibapi.client import EClient
+    from ibapi.wrapper import EWrapper
+
+    class TradeApp(EWrapper, EClient):
+        def __init__(self):
+            EClient.__init__(self, self)
+            self.fetcher = None
+            self.ready = threading.Event()
+
+        def nextValidId(self, orderId):
+            self.ready.set()
+
+        def historicalData(self, reqId, bar):
+            self.fetcher.on_bar(reqId, bar)
+
+        def historicalDataEnd(self, reqId, start, end):
+            self.fetcher.on_end(reqId)
+
+        def error(self, reqId, *args):
+            # Newer ibapi versions pass an errorTime before (errorCode, errorString)
+            if len(args) > 1 and isinstance(args[1], int):
+                args = args[1:]
+            errorCode, errorString = args[0], args[1]
+            if self.fetcher is not None:
+                self.fetcher.on_error(reqId, errorCode, errorString)
+
+    return TradeApp()
+
+
+def fetch_earnings_bars(tickerlist, host="127.0.0.1", port=7496, incremental=True, **fetcher_kwargs):
+    """
+    Connects to TWS and fetches the earnings-date bars for every ticker.
+
+    Tickers without earnings dates are skipped with a message, and in incremental
+    mode so are earnings dates that already have bars on disk.
+
+    Raises:
+        ConnectionError: If TWS cannot be reached (before any request is sent)
+    """
+    requests = []
+    for ticker in tickerlist:
+        ticker_dfs = get_past_earnings_dates(ticker)
+        if ticker_dfs is None:
+            print(f"Skipping {ticker}: no earnings dates available")
+            continue
+        dates = ticker_dfs.index
+        if incremental:
+            on_disk = stored_bar_dates(ticker)
+            dates = [d for d in dates if request_date(d) not in on_disk]
+        print(f"{ticker}: {len(dates)} of {len(ticker_dfs.index)} earnings windows to fetch")
+        requests.extend((ticker, d) for d in dates)
+
+    if not requests:
+        return {}
+
+    app = trade_app()
+    app.fetcher = HistoricalFetcher(app, **fetcher_kwargs)
+    app.connect(host, port, clientId=random.randint(1,1000)) #randomized client Ids to avoid timeouts
+    con_thread = threading.Thread(target=app.run, daemon=True)
+    con_thread.start()
+    if not app.ready.wait(timeout=30) or not app.isConnected():
+        app.disconnect()
+        raise ConnectionError(f"Could not connect to TWS at {host}:{port}")
+
+    try:
+        return app.fetcher.fetch(requests)
+    finally:
+        app.disconnect()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch 5-minute bars around earnings dates from TWS.")
+    parser.add_argument('tickers', nargs='*', default=['GOOGL'], help="Stock symbols (defaults to GOOGL)")
+    parser.add_argument('--full', action='store_true',
+                        help="Refetch every earnings window and overwrite the CSVs")
+    args = parser.parse_args(argv)
 
-def histData(req_num, contract):
-
-    for ticker in tickerlist : 
-            
-            mycontract = stockContract(ticker)
-            # strused = str(ticker_dfs['GOOGL'].index[0])[0:10].replace('-', '') + "-13:30:00 UTC"
-            for dates in ticker_dfs[ticker].index :           
-
-                    app.reqHistoricalData(req_num, 
-                                        contract=mycontract,
-                                        endDateTime= str(dates)[0:10].replace('-', '') + ' 23:30:00 UTC', 
-                                        durationStr='12400 S',
-                                        barSizeSetting='5 mins',
-                                        whatToShow='Trades',
-                                        useRTH=0,                 #0 = Includes data outside of RTH | 1 = RTH data only 
-                                        formatDate=1,    
-                                        keepUpToDate=0,           #0 = False | 1 = True 
-                                        chartOptions=[])	
-                    time.sleep(3)      #Sleep function to avoid data leakage due to asynchronous nature of the api 
-                    req_num += 1 
-                    app.requests_sent += 1 
-                    print(str(dates)[0:10].replace('-', '') + ' 21:30:00 UTC')
-          
-def websocket_con():
-    app.run()
-    
-app = TradeApp()      
-app.connect("127.0.0.1", 7496, clientId=random.randint(1,1000)) #randomized client Ids to avoid timeouts
-
-con_thread = threading.Thread(target=websocket_con, daemon=True)
-con_thread.start()
-time.sleep(1) 
-
-for ticker in tickerlist[0:1]:
-    histData(tickerlist[0:1].index(ticker), stockContract(ticker))    #Only one ticker at a time 
-   
-    
- 
-pricedflist[0] = pricedflist[0].sort_values(by='ReqId')
-for df in pricedflist[0:1] : 
-      df.to_csv(f"{df['ticker'][0]}_Earnings_Data(5M).csv")   # Outputs The Extracted Data to csv files
-    
-    
-    
-    
+    try:
+        frames = fetch_earnings_bars(args.tickers, incremental=not args.full)
+    except ConnectionError as e:
+        parser.exit(1, f"{e}\n")
+    for ticker, df in frames.items():
+        merge_price_bars(ticker, df, BASE_DIR, replace=args.full)   # Outputs The Extracted Data to csv files
 
 
+if __name__ == "__main__":
+    main()
@@ -9,189 +9,106 @@ Results are saved in a directory structure organized by stock.
 
 import os
 import datetime
+import json
+import gzip
+import argparse
 import warnings
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
 import numpy as np
-import backtrader as bt
-import backtrader.analyzers as btanalyzers
-import yfinance as yf
-import plotly.express as px
+
+from bar_store import DATASET_DIR, csv_path, has_dataset_bars, load_bars, parse_price_csv, read_columnar_bars
+from earnings_cache import get_earnings_dates
+from equity import DOWNSAMPLE_METHOD, EQUITY_RESOLUTIONS, downsample_equity
+from manifest import input_fingerprints, is_unchanged, read_manifest, read_state, stored_result, write_manifest
+from regression_models import attach_predictions, load_predictions
+from shared_data import SharedFrames
+from timing import StageTimer, profile_call, write_timing_report
 
 # Ignore warnings
 warnings.filterwarnings("ignore")
 
-class EarningsTradingStrategy(bt.Strategy):
-    """
-    A trading strategy that trades based on earnings surprises.
-    
-    The strategy enters long positions for positive earnings surprises and
-    short positions for negative earnings surprises. Positions are managed
-    with take-profit, stop-loss, and maximum holding period rules.
-    """
-    
-    params = (
-        ('take_profit', 0.015),   # 1.5% Take Profit
-        ('stop_loss', 0.015),     # 1.5% Stop Loss
-        ('holding_period', 24),   # Max holding period in 5-min bars
-        ('max_trade_value', 1000), # $1,000 max per trade
-        ('stock', None),  #To get the stock_symbol
-        ('regression_file', 'regression_predictions_new.csv')
-    )
-
-    def __init__(self):
-        self.order = None
-        self.entry_price = None
-        self.bar_count = 0
-        self.trade_outcomes = []
-        self._closed_by_tp = False
-        self._closed_by_sl = False
-        self.is_long = None  # Track position type: True=Long, False=Short
-        self.portfolio_value = []
-        self.reg_preds = pd.read_csv(self.p.regression_file)
-        self.symbol = self.p.stock
-        self.reg_preds = self.reg_preds[self.reg_preds['Symbol'] == self.symbol].copy()
-        # Initialize DataFrame for trade entries
-        self.df = pd.DataFrame(columns=['datetime', 'price', 'signal', 'closed'])
-
-    def notify_trade(self, trade):
-        if trade.isclosed:
-            outcome = 'timeout'
-            if self._closed_by_tp:
-                outcome = 'tp'
-            elif self._closed_by_sl:
-                outcome = 'sl'
-            self.trade_outcomes.append((outcome, 'long' if self.is_long else 'short'))
-            print(f"Trade closed by {outcome} ({'Long' if self.is_long else 'Short'})")
-
-    def next(self):
-        current_time = self.datas[0].datetime.time()
-        current_date = self.datas[0].datetime.date()
-        current_ts = pd.Timestamp(current_date)
-        current_dt = datetime.datetime.combine(current_date, current_time)
-
-        pred_df = self.reg_preds.loc[:,['Predicted_EPS', 'Earnings_Date']]
-        pred_df['Earnings_Date'] = pd.to_datetime(pred_df['Earnings_Date'])
-        closest_row = pred_df.loc[(pred_df['Earnings_Date'] - current_ts).abs().idxmin()]
-
-        if datetime.time(16, 0) <= current_time <= datetime.time(16, 10) and not self.order:
-            earnings = self._get_earnings_for_date(current_date)
-            if not earnings.empty:
-                predicted_eps_value = float(closest_row['Predicted_EPS'])
-                estimated_eps = earnings['EPS Estimate'].values[0]
-                reported_eps = earnings['Reported EPS'].values[0]
-                estimated_surprise = (reported_eps - estimated_eps) / estimated_eps
-                regression_suprise = (reported_eps - predicted_eps_value) / predicted_eps_value
-                surprise = 0.1*regression_suprise + 0.9*estimated_surprise
-
-                # Calculate position size based on $1,000 trade limit
-                current_price = self.data.close[0]
-                position_size = int(self.params.max_trade_value / current_price)  # Round to whole shares
-
-                print(f"Date: {current_date}, Price: {current_price:.2f}, Position Size: {position_size}")
-
-                if position_size <= 0:
-                    print(f"Skipping trade on {current_date}: Position size is zero or negative.")
-                    return
-
-                if surprise >= 0.1:  # Long entry
-                    self.order = self.buy(size=position_size)
-                    self.is_long = True
-                    print(f"LONG ENTRY at {current_price:.2f} on {current_date}")
-                    # Record trade entry
-                    trade_entry = pd.DataFrame({
-                        'datetime': [current_dt],
-                        'price': [current_price],
-                        'signal': ['BUY'],
-                        'closed': ['OPENED']
-                    })
-                    self.df = pd.concat([self.df, trade_entry], ignore_index=True)
-                elif surprise <= -0.1:  # Short entry
-                    self.order = self.sell(size=position_size)
-                    self.is_long = False
-                    print(f"SHORT ENTRY at {current_price:.2f} on {current_date}")
-                    # Record trade entry
-                    trade_entry = pd.DataFrame({
-                        'datetime': [current_dt],
-                        'price': [current_price],
-                        'signal': ['SELL'],
-                        'closed': ['OPENED']
-                    })
-                    self.df = pd.concat([self.df, trade_entry], ignore_index=True)
-                
-                if self.order:
-                    self.entry_price = current_price
-                    self.bar_count = 0
-
-        if self.order and self.order.status == bt.Order.Completed:
-            self.bar_count += 1
-            price = self.data.close[0]
-            
-            # Calculate price change based on position type
-            if self.is_long:
-                price_change = (price - self.entry_price) / self.entry_price
-                tp_condition = price_change >= self.params.take_profit
-                sl_condition = price_change <= -self.params.stop_loss
-            else:  # Short position
-                price_change = (self.entry_price - price) / self.entry_price
-                tp_condition = price_change >= self.params.take_profit
-                sl_condition = price_change <= -self.params.stop_loss
-
-            if tp_condition:
-                print(f"Closing {'Long' if self.is_long else 'Short'} via Take Profit")
-                # Record trade exit
-                trade_entry = pd.DataFrame({
-                    'datetime': [current_dt],
-                    'price': [price],
-                    'signal': ['BUY' if self.is_long else 'SELL'],
-                    'closed': ['TOOK PROFIT']
-                })
-                self.df = pd.concat([self.df, trade_entry], ignore_index=True)
-                self._closed_by_tp = True
-                self.close()
-                self.order = None
-            elif sl_condition:
-                print(f"Closing {'Long' if self.is_long else 'Short'} via Stop Loss")
-                # Record trade exit
-                trade_entry = pd.DataFrame({
-                    'datetime': [current_dt],
-                    'price': [price],
-                    'signal': ['BUY' if self.is_long else 'SELL'],
-                    'closed': ['STOPPED OUT']
-                })
-                self.df = pd.concat([self.df, trade_entry], ignore_index=True)
-                self._closed_by_sl = True
-                self.close()
-                self.order = None
-            elif self.bar_count >= self.params.holding_period:
-                print(f"Closing {'Long' if self.is_long else 'Short'} via Timeout")
-                # Record trade exit
-                trade_entry = pd.DataFrame({
-                    'datetime': [current_dt],
-                    'price': [price],
-                    'signal': ['BUY' if self.is_long else 'SELL'],
-                    'closed': ['EXITED']
-                })
-                self.df = pd.concat([self.df, trade_entry], ignore_index=True)
-                self.close()
-                self.order = None
-        
-            self.portfolio_value.append(self.broker.getvalue())
+DEFAULT_STOCKS = ['NVDA', 'GOOGL', 'GS', 'GME', 'MSFT']
+
+
+def __getattr__(name):
+    # EarningsTradingStrategy is imported on first use, so backtrader is only loaded by the backtrader engine
+    if name == 'EarningsTradingStrategy':
+        from strategy import EarningsTradingStrategy
+        return EarningsTradingStrategy
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def build_prediction_index(reg_preds):
+    """
+    Builds a sorted lookup of regression predictions for one symbol.
+    
+    Args:
+        reg_preds: DataFrame with 'Earnings_Date' and 'Predicted_EPS' columns
+    
+    Returns:
+        tuple: (sorted datetime64 array of earnings dates, matching array of predicted EPS)
+    """
+    dates = pd.to_datetime(reg_preds['Earnings_Date'])
+    valid = dates.notna().values
+    dates = dates.values[valid]
+    values = reg_preds['Predicted_EPS'].to_numpy(dtype=float)[valid]
+    # Stable sort so duplicate dates keep their file order, like idxmin did
+    order = np.argsort(dates, kind='stable')
+    return dates[order], values[order]
+
+
+def lookup_closest_prediction(pred_dates, pred_values, ts):
+    """
+    Finds the predicted EPS whose earnings date is closest to a timestamp.
+    
+    Args:
+        pred_dates: Sorted datetime64 array from build_prediction_index
+        pred_values: Predicted EPS values aligned with pred_dates
+        ts: Timestamp to look up
+    
+    Returns:
+        float: Predicted EPS, preferring the earlier date on ties
+    """
+    ts = np.datetime64(ts, 'ns')
+    i = np.searchsorted(pred_dates, ts, side='left')
+    if i == len(pred_dates) or (i > 0 and ts - pred_dates[i - 1] <= pred_dates[i] - ts):
+        i -= 1
+    i = np.searchsorted(pred_dates, pred_dates[i], side='left')
+    return float(pred_values[i])
+
+
+def build_earnings_index(earnings_data):
+    """
+    Builds a date -> (EPS Estimate, Reported EPS) map from yfinance earnings data.
+    
+    Args:
+        earnings_data: DataFrame indexed by earnings timestamp, or None
+    
+    Returns:
+        dict: First earnings row for each calendar date
+    """
+    if earnings_data is None:
+        return {}
+    
+    earnings_by_date = {}
+    dates = earnings_data.index.date
+    estimates = earnings_data['EPS Estimate'].values
+    reported = earnings_data['Reported EPS'].values
+    for date, estimated_eps, reported_eps in zip(dates, estimates, reported):
+        earnings_by_date.setdefault(date, (estimated_eps, reported_eps))
+    return earnings_by_date
 
-    def _get_earnings_for_date(self, date):
-        """
-        Helper method to get earnings data for a specific date.
-        
-        Args:
-            date: The date to check for earnings data
-            
-        Returns:
-            DataFrame: Earnings data for the specified date or empty DataFrame
-        """
-        # This will be set by the backtest runner
-        if not hasattr(self, 'earnings_data'):
-            return pd.DataFrame()
-        
-        return self.earnings_data[self.earnings_data.index.date == date]
+
+def default_results_path():
+    """
+    Directory the dashboard reads results from.
+    
+    Returns:
+        str: Path to frontend/results
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend", "results")
 
 
 def create_results_dir(stock, base_path=None):
@@ -205,10 +122,8 @@ def create_results_dir(stock, base_path=None):
     Returns:
         str: Path to the created directory
     """
-    # Get the absolute path to the frontend directory
-    current_dir = os.path.dirname(os.path.abspath(__file__))
     if base_path is None:
-        base_path = os.path.join(current_dir, "frontend", "results")
+        base_path = default_results_path()
     
     # Create a timestamp-based folder name
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -249,63 +164,48 @@ def flatten_dict(d, parent_key='', sep='.'):
     return dict(items)
 
 
-def get_metric_value(trade_df, metric_key):
+def load_price_data(stock, memory_map=False, base_dir=None):
     """
-    Safely extracts a metric value from the DataFrame.
-    
-    Args:
-        trade_df: DataFrame containing metrics
-        metric_key: Key to look for
-    
-    Returns:
-        Value of the metric or None if not found
-    """
-    matches = trade_df[trade_df['Metric'].str.contains(metric_key)]
-    if not matches.empty:
-        return matches['Value'].values[0]
-    return None
-
-
-def load_price_data(stock):
-    """
-    Load price data from CSV file for a specific stock.
+    Load price data for a specific stock, preferring the consolidated bar dataset,
+    then the columnar Feather file written by bar_store.py, then the CSV. The
+    dataset and the Feather file are skipped when the CSV was modified after them.
     
     Args:
         stock: Stock symbol
+        memory_map: Memory map the Feather file instead of reading it into memory
+        base_dir: Directory holding the bar files and bar_dataset (defaults to the repository root)
     
     Returns:
         DataFrame: Price data for the stock
     """
+    dataset_dir = None if base_dir is None else os.path.join(base_dir, os.path.basename(DATASET_DIR))
     try:
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        file_path = os.path.join(base_dir, f"{stock}_Earnings_Data(5M).csv")
-        stock_df = pd.read_csv(file_path)
-        stock_df['date'] = pd.to_datetime(stock_df['date'], format='%Y%m%d %H:%M:%S %Z', errors='coerce')
-        stock_df = stock_df.loc[:, ~stock_df.columns.str.contains('^Unnamed')]
-        stock_df.dropna(subset=['date'], inplace=True)
-        stock_df.set_index('date', inplace=True)
-        stock_df = stock_df.sort_index()
-        stock_df = stock_df.drop(columns=['ReqId', 'ticker'])
-        return stock_df
+        if has_dataset_bars(stock, dataset_dir, source=csv_path(stock, base_dir)):
+            return load_bars([stock], dataset_dir=dataset_dir).drop(columns=['ticker'])
+        stock_df = read_columnar_bars(stock, base_dir, memory_map=memory_map)
+        if stock_df is not None:
+            return stock_df
+        return parse_price_csv(csv_path(stock, base_dir))
     except Exception as e:
         print(f"Error loading price data for {stock}: {e}")
         return None
 
 
-def load_earnings_data(stock, max_earnings=64):
+def load_earnings_data(stock, max_earnings=64, offline=None, cache_path=None):
     """
-    Load earnings data for a specific stock using yfinance.
+    Load earnings data for a specific stock using yfinance, through the local cache.
     
     Args:
         stock: Stock symbol
         max_earnings: Maximum number of earnings releases to fetch
+        offline: Only use cached data (defaults to the PEAD_OFFLINE environment variable)
+        cache_path: Earnings dates cache (defaults to earnings_cache.sqlite at the repository root)
     
     Returns:
         DataFrame: Earnings data for the stock
     """
     try:
-        obj = yf.Ticker(stock)
-        earnings_data = obj.get_earnings_dates(max_earnings)
+        earnings_data = get_earnings_dates(stock, max_earnings, offline=offline, cache_path=cache_path)
         
         # Check if earnings_data is not None before processing
         if earnings_data is not None:
@@ -333,256 +233,855 @@ def filter_trading_hours(df):
     Returns:
         DataFrame: Filtered price data
     """
-    df['hour'] = df.index.hour
-    df['minute'] = df.index.minute
-    filtered_df = df[(df['hour'] >= 16) & (df['hour'] <= 18) & ((df['hour'] != 16) | (df['minute'] >= 5))]
-    filtered_df.drop(columns=['hour', 'minute'], inplace=True)
-    return filtered_df
+    hour = df.index.hour
+    minute = df.index.minute
+    return df[(hour >= 16) & (hour <= 18) & ((hour != 16) | (minute >= 5))]
 
 
-def save_backtest_results(results_dir, trade_analysis, sharpe_ratio, strategy):
+def filter_date_range(df, start=None, end=None):
     """
-    Save backtest results to files.
+    Keep only the bars between two dates.
     
     Args:
-        results_dir: Directory to save results
-        trade_analysis: Analysis of trades
-        sharpe_ratio: Sharpe ratio of the strategy
-        strategy: Strategy object with performance data
+        df: DataFrame with price data
+        start: First date to keep, inclusive (None keeps everything before end)
+        end: Last date to keep, inclusive of the whole day (None keeps everything after start)
+    
+    Returns:
+        DataFrame: Price data within the range
+    """
+    if start is None and end is None:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    if start is not None:
+        mask &= df.index >= pd.Timestamp(start).normalize()
+    if end is not None:
+        mask &= df.index < pd.Timestamp(end).normalize() + pd.Timedelta(days=1)
+    return df[mask]
+
+
+ENTRY_WINDOW = (datetime.time(16, 0), datetime.time(16, 10))  # Bar times EarningsTradingStrategy enters at
+
+
+def event_windows(index, event_dates, holding_period=24, entry_window=ENTRY_WINDOW):
     """
-    # Save trade entries to CSV
-    strategy.df.to_csv(os.path.join(results_dir, "trade_entries.csv"))
-    print(f"Trade entries saved to CSV")
+    Finds the bars around each earnings event by binary search of a sorted index.
     
-    # Flatten the trade_analysis object
-    flat_trade_analysis = flatten_dict(trade_analysis)
+    A window starts at the first bar of the entry window on the event date and
+    ends with the bar that fills the exit of a trade entered on its last entry
+    bar and held for holding_period bars, so every trade the strategy can make
+    opens and closes inside one window.
     
-    # Convert the flattened dictionary to a DataFrame
-    trade_df = pd.DataFrame(list(flat_trade_analysis.items()), columns=['Metric', 'Value'])
+    Args:
+        index: Sorted, timezone-naive DatetimeIndex of the bars
+        event_dates: Earnings dates (datetime.date)
+        holding_period: Max holding period in bars
+        entry_window: (first, last) bar time an entry can be signalled at
     
-    # Save the full analysis to CSV
-    trade_df.to_csv(os.path.join(results_dir, "trade_analysis.csv"), index=False)
-    print(f"Trade analysis saved to CSV")
+    Returns:
+        ndarray: One (start, stop) row of bar positions per event with entry bars, by start
+    """
+    if len(index) == 0 or len(event_dates) == 0:
+        return np.empty((0, 2), dtype=int)
+    days = pd.DatetimeIndex(sorted(pd.Timestamp(date) for date in event_dates))
+    first, last = (pd.Timedelta(hours=t.hour, minutes=t.minute) for t in entry_window)
+    bars = index.to_numpy()
+    starts = np.searchsorted(bars, (days + first).to_numpy(), side='left')
+    entry_ends = np.searchsorted(bars, (days + last).to_numpy(), side='right')
+    stops = np.minimum(entry_ends + holding_period + 1, len(bars))
+    return np.column_stack((starts, stops))[entry_ends > starts]
+
+
+def _count_days(bars):
+    # Calendar days in a sorted datetime64 array
+    days = bars.astype('datetime64[D]')
+    return int(len(days) and 1 + np.count_nonzero(days[1:] != days[:-1]))
+
+
+def slice_event_windows(price_df, earnings_df, holding_period=24):
+    """
+    Keeps only the bars of the earnings event windows, as one compact frame.
     
-    # Print the DataFrame
-    print(trade_df)
+    The strategy holds no position outside the windows, so the portfolio value
+    is flat there and the skipped days only add zero daily returns to the
+    Sharpe ratio; their number is returned for StreamingMetrics.add_flat_days.
     
-    # 1. Total Trades
-    total_trades = trade_df[trade_df['Metric'].str.contains('total.total')]['Value'].values[0]
-    won_trades = trade_df[trade_df['Metric'].str.contains('won.total')]['Value'].values[0]
-    lost_trades = trade_df[trade_df['Metric'].str.contains('lost.total')]['Value'].values[0]
+    Args:
+        price_df: After-hours price data indexed by sorted, timezone-naive timestamps
+        earnings_df: Earnings data without timezone
+        holding_period: Max holding period in bars
     
-    # Create a DataFrame for trade outcomes
-    trade_outcomes_df = pd.DataFrame({
-        'Outcome': ['Won', 'Lost'],
-        'Count': [won_trades, lost_trades]
-    })
+    Returns:
+        tuple: (price data of the windows, number of days left out entirely)
+    """
+    windows = event_windows(price_df.index, list(build_earnings_index(earnings_df)), holding_period)
+    inside = np.zeros(len(price_df) + 1, dtype=int)
+    np.add.at(inside, windows[:, 0], 1)
+    np.add.at(inside, windows[:, 1], -1)
+    keep = np.cumsum(inside[:-1]) > 0
+    bars = price_df.index.to_numpy()
+    return price_df[keep], _count_days(bars) - _count_days(bars[keep])
+
+
+RESULTS_BUNDLE = "results.json"
+DASHBOARD_FILE = "dashboard.json"
+INDEX_FILE = "index.json"
+EQUITY_POINTS = 500  # Max equity curve points shipped to the dashboard
+
+
+def result_file_name(output_format='csv'):
+    """
+    Name of the file that marks a finished results directory.
+
+    Args:
+        output_format: 'csv' or 'json'
+
+    Returns:
+        str: summary.txt for CSV output, the JSON bundle otherwise
+    """
+    if output_format == 'csv':
+        return "summary.txt"
+    if output_format == 'json':
+        return RESULTS_BUNDLE
+    raise ValueError(f"Unknown output format: {output_format}")
+
+
+def result_files(output_format='csv'):
+    """
+    Files a finished results directory must contain.
     
-    # Save trade outcomes to CSV
-    trade_outcomes_df.to_csv(os.path.join(results_dir, "trade_outcomes.csv"), index=False)
+    Args:
+        output_format: 'csv' or 'json'
+    
+    Returns:
+        tuple: The result file and the dashboard entry
+    """
+    return (result_file_name(output_format), DASHBOARD_FILE)
+
+
+def summarize_trade_analysis(trade_analysis):
+    """
+    Pulls the dashboard metrics straight out of a TradeAnalyzer dict.
+
+    Args:
+        trade_analysis: Nested trade analysis (TradeAnalyzer.get_analysis() layout)
+
+    Returns:
+        dict: Metric values, None where the analysis has no such entry
+    """
+    def get(*keys):
+        node = trade_analysis
+        for key in keys:
+            if not isinstance(node, dict) or key not in node:
+                return None
+            node = node[key]
+        return node
+
+    return {
+        'total_trades': get('total', 'total'),
+        'won_trades': get('won', 'total'),
+        'lost_trades': get('lost', 'total'),
+        'gross_pnl': get('pnl', 'gross', 'total'),
+        'net_pnl': get('pnl', 'net', 'total'),
+        'won_streak_current': get('streak', 'won', 'current'),
+        'won_streak_longest': get('streak', 'won', 'longest'),
+        'lost_streak_current': get('streak', 'lost', 'current'),
+        'lost_streak_longest': get('streak', 'lost', 'longest'),
+        'avg_trade_length': get('len', 'average'),
+        'max_trade_length': get('len', 'max'),
+    }
+
+
+def _json_value(value):
+    # NaN/inf are not valid JSON, and numpy scalars are not serializable
+    if isinstance(value, (np.integer, np.floating)):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    if isinstance(value, (datetime.datetime, pd.Timestamp)):
+        return str(value)
+    return value
+
+
+def _table_json(df):
+    # Column names once, then one list per row
+    return {
+        'columns': list(df.columns),
+        'data': [[_json_value(v) for v in row] for row in df.itertuples(index=False, name=None)],
+    }
+
+
+def _equity_json(times, values):
+    # [[timestamp, value], ...] with timestamps formatted as in equity_curve.csv
+    stamps = pd.DatetimeIndex(times).strftime('%Y-%m-%d %H:%M:%S')
+    return [[t, _json_value(v)] for t, v in zip(stamps, values)]
+
+
+def write_dashboard_entry(path, summary, trade_entries, equity_times, portfolio_value, max_points=EQUITY_POINTS,
+                          downsample_method=DOWNSAMPLE_METHOD):
+    """
+    Writes the precomputed data the dashboard shows for one ticker.
     
-    # Plot trade outcomes
-    fig = px.pie(trade_outcomes_df, values='Count', names='Outcome', title='Trade Outcomes')
-    fig.write_html(os.path.join(results_dir, "trade_outcomes.html"))
+    Args:
+        path: Output file path
+        summary: Metrics from summarize_trade_analysis plus the Sharpe ratio and win rate
+        trade_entries: Trade log DataFrame
+        equity_times: Equity curve timestamps
+        portfolio_value: Equity curve values
+        max_points: Maximum number of equity curve points to keep
+        downsample_method: 'lttb' or 'minmax' (see equity.downsample_equity)
+    """
+    entry = {
+        'summary': {k: _json_value(v) for k, v in summary.items()},
+        'equity_curve': _equity_json(*downsample_equity(equity_times, portfolio_value, max_points,
+                                                        downsample_method)),
+        'trades': _table_json(trade_entries),
+    }
+    with open(path, "w") as f:
+        json.dump(entry, f, separators=(',', ':'), allow_nan=False)
+
+
+def build_results_index(stocks, base_path=None, compress=True):
+    """
+    Combines the tickers' dashboard entries into one index the dashboard loads in a single request.
     
+    Args:
+        stocks: Stock symbols to include
+        base_path: Base directory for results (defaults to frontend/results)
+        compress: Also write a gzip copy (index.json.gz)
     
-    # 2. PnL (Profit and Loss)
-    gross_pnl = trade_df[trade_df['Metric'].str.contains('pnl.gross.total')]['Value'].values[0]
-    net_pnl = trade_df[trade_df['Metric'].str.contains('pnl.net.total')]['Value'].values[0]
+    Returns:
+        str: Path of the written index
+    """
+    base_path = base_path or default_results_path()
+    results = {}
+    for stock in stocks:
+        path = os.path.join(base_path, stock, f"{stock}_backtest_results", DASHBOARD_FILE)
+        if not os.path.exists(path):
+            print(f"No dashboard entry for {stock}, leaving it out of the index")
+            continue
+        with open(path) as f:
+            results[stock] = json.load(f)
     
-    # Create a DataFrame for PnL
-    pnl_df = pd.DataFrame({
-        'Type': ['Gross PnL', 'Net PnL'],
-        'Value': [gross_pnl, net_pnl]
-    })
+    index = {
+        'generated_on': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'tickers': list(results),
+        'results': results,
+    }
+    payload = json.dumps(index, separators=(',', ':'), allow_nan=False).encode()
+    index_path = os.path.join(base_path, INDEX_FILE)
+    with open(index_path, "wb") as f:
+        f.write(payload)
+    if compress:
+        with open(index_path + ".gz", "wb") as f:
+            f.write(gzip.compress(payload, mtime=0))
+    print(f"Results index for {len(results)} tickers saved to {index_path}")
+    return index_path
+
+
+def write_results_bundle(path, summary, flat_trade_analysis, trade_entries, equity_times, portfolio_value,
+                         downsampled=None):
+    """
+    Writes every result of a backtest to one JSON file.
+
+    Args:
+        path: Output file path
+        summary: Metrics from summarize_trade_analysis plus the Sharpe ratio
+        flat_trade_analysis: Flattened trade analysis
+        trade_entries: Trade log DataFrame
+        equity_times: Equity curve timestamps
+        portfolio_value: Equity curve values
+        downsampled: Dict of resolution -> (times, values) of the downsampled equity curves
+    """
+    bundle = {
+        'generated_on': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'summary': {k: _json_value(v) for k, v in summary.items()},
+        'trade_analysis': {k: _json_value(v) for k, v in flat_trade_analysis.items()},
+        'trade_entries': _table_json(trade_entries),
+        'equity_curve': _equity_json(equity_times, portfolio_value),
+        'equity_curve_downsampled': {str(points): _equity_json(times, values)
+                                     for points, (times, values) in (downsampled or {}).items()},
+    }
+    with open(path, "w") as f:
+        json.dump(bundle, f, separators=(',', ':'), allow_nan=False)
+
+
+def save_backtest_results(results_dir, trade_analysis, sharpe_ratio, strategy, output_format='csv', write_html=True,
+                          equity_resolutions=EQUITY_RESOLUTIONS, downsample_method=DOWNSAMPLE_METHOD, timer=None,
+                          stream_metrics=None):
+    """
+    Save backtest results to files.
+
+    Args:
+        results_dir: Directory to save results
+        trade_analysis: Analysis of trades
+        sharpe_ratio: Sharpe ratio of the strategy
+        strategy: Strategy object with performance data
+        output_format: 'csv' for the per-metric CSVs and summary.txt read by the
+            dashboard, or 'json' for a single results.json bundle
+        write_html: Also render the Plotly HTML charts
+        equity_resolutions: Point counts of the downsampled equity curves written
+            next to the full one (equity_curve_<points>.csv); the HTML chart
+            plots the largest
+        downsample_method: 'lttb' or 'minmax' (see equity.downsample_equity)
+        timer: StageTimer to record the writing stages in (see timing)
+        stream_metrics: StreamingMetrics.results() of the run, whose max drawdown is added to the summary
+    """
+    result_file_name(output_format)
+    timer = timer or StageTimer()
+    trade_entries = strategy.df
+    equity_times = strategy.equity_times
+    equity_values = np.asarray(strategy.portfolio_value, dtype=float)
+    with timer.stage('prepare_tables'):
+        downsampled = {points: downsample_equity(equity_times, equity_values, points, downsample_method)
+                       for points in sorted(equity_resolutions)}
+        flat_trade_analysis = flatten_dict(trade_analysis)
+        metrics = summarize_trade_analysis(trade_analysis)
+        total_trades = metrics['total_trades'] or 0
+        won_trades = metrics['won_trades'] or 0
+        lost_trades = metrics['lost_trades'] or 0
+
+        # Tables shared by the CSV files and the charts
+        tables = {
+            'trade_outcomes': pd.DataFrame({
+                'Outcome': ['Won', 'Lost'],
+                'Count': [won_trades, lost_trades]
+            }),
+            'pnl_data': pd.DataFrame({
+                'Type': ['Gross PnL', 'Net PnL'],
+                'Value': [metrics['gross_pnl'], metrics['net_pnl']]
+            }),
+            'streaks_data': pd.DataFrame({
+                'Streak Type': ['Won (Current)', 'Won (Longest)', 'Lost (Current)', 'Lost (Longest)'],
+                'Value': [metrics['won_streak_current'], metrics['won_streak_longest'],
+                          metrics['lost_streak_current'], metrics['lost_streak_longest']]
+            }),
+            'equity_curve': pd.DataFrame({
+                'Timestamp': equity_times,
+                'Value': equity_values
+            }),
+        }
+        for points, (times, values) in downsampled.items():
+            tables[f'equity_curve_{points}'] = pd.DataFrame({'Timestamp': times, 'Value': values})
+        if metrics['avg_trade_length'] is not None and metrics['max_trade_length'] is not None:
+            tables['trade_length_data'] = pd.DataFrame({
+                'Metric': ['Average Trade Length', 'Max Trade Length'],
+                'Value': [metrics['avg_trade_length'], metrics['max_trade_length']]
+            })
+        else:
+            print("Trade length metrics not found in the analysis.")
+
+    summary = {'sharpe_ratio': sharpe_ratio['sharperatio'], **metrics,
+               'win_rate': won_trades / total_trades * 100 if total_trades else None}
+    if stream_metrics is not None:
+        summary['max_drawdown'] = stream_metrics['max_drawdown']
+    with timer.stage('dashboard_entry'):
+        write_dashboard_entry(os.path.join(results_dir, DASHBOARD_FILE), summary, trade_entries,
+                              equity_times, equity_values, downsample_method=downsample_method)
     
-    # Save PnL data to CSV
-    pnl_df.to_csv(os.path.join(results_dir, "pnl_data.csv"), index=False)
+    with timer.stage('result_files'):
+        if output_format == 'json':
+            write_results_bundle(os.path.join(results_dir, RESULTS_BUNDLE), summary, flat_trade_analysis,
+                                 trade_entries, equity_times, equity_values, downsampled)
+        else:
+            trade_entries.to_csv(os.path.join(results_dir, "trade_entries.csv"))
+            pd.DataFrame(list(flat_trade_analysis.items()), columns=['Metric', 'Value']).to_csv(
+                os.path.join(results_dir, "trade_analysis.csv"), index=False)
+            for name, table in tables.items():
+                table.to_csv(os.path.join(results_dir, f"{name}.csv"), index=False)
+
+            win_rate = won_trades / total_trades * 100 if total_trades else 0.0
+            loss_rate = lost_trades / total_trades * 100 if total_trades else 0.0
+            # Create a summary text file
+            with open(os.path.join(results_dir, "summary.txt"), "w") as f:
+                f.write(f"Backtest Results Summary\n")
+                f.write(f"======================\n\n")
+                f.write(f"Generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+                f.write(f"Sharpe Ratio: {sharpe_ratio['sharperatio']}\n\n")
+                f.write(f"Total Trades: {total_trades}\n")
+                f.write(f"Won Trades: {won_trades} ({win_rate:.2f}%)\n")
+                f.write(f"Lost Trades: {lost_trades} ({loss_rate:.2f}%)\n\n")
+                f.write(f"Gross PnL: {metrics['gross_pnl']}\n")
+                f.write(f"Net PnL: {metrics['net_pnl']}\n\n")
+                f.write(f"Current Win Streak: {metrics['won_streak_current']}\n")
+                f.write(f"Longest Win Streak: {metrics['won_streak_longest']}\n")
+                f.write(f"Current Loss Streak: {metrics['lost_streak_current']}\n")
+                f.write(f"Longest Loss Streak: {metrics['lost_streak_longest']}\n")
+
+    with timer.stage('html_charts'):
+        if write_html:
+            import plotly.express as px
+            figures = {
+                'trade_outcomes': lambda df: px.pie(df, values='Count', names='Outcome', title='Trade Outcomes'),
+                'pnl_data': lambda df: px.bar(df, x='Type', y='Value', title='Gross vs Net PnL'),
+                'streaks_data': lambda df: px.bar(df, x='Streak Type', y='Value', title='Winning and Losing Streaks'),
+                'trade_length_data': lambda df: px.bar(df, x='Metric', y='Value', title='Trade Length'),
+                'equity_curve': lambda df: px.line(df, x='Timestamp', y='Value', title='Portfolio Equity Curve'),
+            }
+            charts = {name: table for name, table in tables.items() if name in figures}
+            if downsampled:
+                # Plot the finest downsampled curve instead of every sample
+                charts['equity_curve'] = tables[f'equity_curve_{max(downsampled)}']
+            for name, table in charts.items():
+                figures[name](table).write_html(os.path.join(results_dir, f"{name}.html"))
+
+    print(f"All results saved to {results_dir}")
+
+
+# Analyzers attached by run_cerebro. 'metrics' (StreamingMetricsAnalyzer) gives the
+# Sharpe ratio, drawdown and win rate in one pass; the others are backtrader's own.
+ANALYZER_PROFILES = {
+    'minimal': ('metrics', 'trade_analyzer'),
+    'standard': ('metrics', 'trade_analyzer', 'mysharpe', 'drawdown'),
+    'full': ('metrics', 'trade_analyzer', 'mysharpe', 'drawdown', 'time_return', 'annual_return',
+             'returns', 'pyfolio'),
+}
+DEFAULT_ANALYZERS = 'minimal'
+
+
+def add_analyzers(cerebro, analyzers=DEFAULT_ANALYZERS, flat_days=0):
+    """
+    Attaches the analyzers of a profile to a Cerebro.
     
-    # Plot PnL
-    fig = px.bar(pnl_df, x='Type', y='Value', title='Gross vs Net PnL')
-    fig.write_html(os.path.join(results_dir, "pnl_data.html"))
+    Args:
+        cerebro: backtrader Cerebro
+        analyzers: 'minimal' (streaming metrics and TradeAnalyzer), 'standard' (adds
+            SharpeRatio and DrawDown) or 'full' (adds TimeReturn, AnnualReturn, Returns
+            and PyFolio, which records the full per-bar series)
+        flat_days: Days left out of the data feed by slice_event_windows, counted by the
+            streaming metrics (backtrader's own analyzers only see the fed bars)
+    """
+    if analyzers not in ANALYZER_PROFILES:
+        raise ValueError(f"Unknown analyzer profile: {analyzers}")
+    import backtrader as bt
+    import backtrader.analyzers as btanalyzers
+    from strategy import StreamingMetricsAnalyzer
+    available = {
+        'metrics': (StreamingMetricsAnalyzer, {'riskfreerate': 0.03, 'flat_days': flat_days}),
+        'trade_analyzer': (btanalyzers.TradeAnalyzer, {}),
+        'mysharpe': (btanalyzers.SharpeRatio, {'riskfreerate': 0.03, 'timeframe': bt.TimeFrame.Days,
+                                               'annualize': True}),
+        'drawdown': (btanalyzers.DrawDown, {}),
+        'time_return': (btanalyzers.TimeReturn, {'timeframe': bt.TimeFrame.Days}),
+        'annual_return': (btanalyzers.AnnualReturn, {}),
+        'returns': (btanalyzers.Returns, {}),
+        'pyfolio': (btanalyzers.PyFolio, {}),  # For advanced metrics
+    }
+    for name in ANALYZER_PROFILES[analyzers]:
+        analyzer, kwargs = available[name]
+        cerebro.addanalyzer(analyzer, _name=name, **kwargs)
 
+
+def strategy_sharpe_ratio(thestrat):
+    """
+    Sharpe ratio analysis of a finished strategy, whichever analyzer profile it ran with.
     
-    # 3. Streaks
-    won_streak_current = trade_df[trade_df['Metric'].str.contains('streak.won.current')]['Value'].values[0]
-    won_streak_longest = trade_df[trade_df['Metric'].str.contains('streak.won.longest')]['Value'].values[0]
-    lost_streak_current = trade_df[trade_df['Metric'].str.contains('streak.lost.current')]['Value'].values[0]
-    lost_streak_longest = trade_df[trade_df['Metric'].str.contains('streak.lost.longest')]['Value'].values[0]
+    It is taken from the streaming metrics, which equal SharpeRatio on the full
+    bars and also count the days left out between event windows.
     
-    # Create a DataFrame for streaks
-    streaks_df = pd.DataFrame({
-        'Streak Type': ['Won (Current)', 'Won (Longest)', 'Lost (Current)', 'Lost (Longest)'],
-        'Value': [won_streak_current, won_streak_longest, lost_streak_current, lost_streak_longest]
-    })
+    Args:
+        thestrat: Strategy returned by run_cerebro
     
-    # Save streaks data to CSV
-    streaks_df.to_csv(os.path.join(results_dir, "streaks_data.csv"), index=False)
+    Returns:
+        dict: {'sharperatio': value or None}, like SharpeRatio.get_analysis()
+    """
+    return {'sharperatio': thestrat.analyzers.metrics.get_analysis()['sharperatio']}
+
+
+def strategy_params():
+    """
+    EarningsTradingStrategy and broker parameters used by run_backtest, as recorded in the manifest.
     
-    # Plot streaks
-    fig = px.bar(streaks_df, x='Streak Type', y='Value', title='Winning and Losing Streaks')
-    fig.write_html(os.path.join(results_dir, "streaks_data.html"))
+    Returns:
+        dict: Parameter values keyed by name
+    """
+    from strategy import EarningsTradingStrategy
+    params = {name: value for name, value in EarningsTradingStrategy.params._getitems()
+              if name not in ('stock', 'regression_file', 'predictions')}
+    params.update(cash=10000.0, commission=0.001, engine='backtrader')
+    return params
+
+
+def run_cerebro(filtered_price_df, earnings_df, stock, predictions='full', regression_file=None, timer=None,
+                analyzers=DEFAULT_ANALYZERS, flat_days=0):
+    """
+    Runs EarningsTradingStrategy over one stock's bars with the backtest's broker and analyzers.
     
-    # 4. Trade Length
-    avg_trade_length = get_metric_value(trade_df, 'len.average')
-    max_trade_length = get_metric_value(trade_df, 'len.max')
+    Args:
+        filtered_price_df: After-hours price data without timezone
+        earnings_df: Earnings data without timezone
+        stock: Stock symbol
+        predictions: Regression prediction set, 'full' or walk-forward (see regression_models)
+        regression_file: Predictions CSV to use instead of the model store
+        timer: StageTimer to record the import, setup and run stages in (see timing)
+        analyzers: Analyzer profile, 'minimal', 'standard' or 'full' (see add_analyzers)
+        flat_days: Days left out of filtered_price_df by slice_event_windows
     
-    # Create a DataFrame for trade length (only if metrics are available)
-    if avg_trade_length is not None and max_trade_length is not None:
-        trade_length_df = pd.DataFrame({
-            'Metric': ['Average Trade Length', 'Max Trade Length'],
-            'Value': [avg_trade_length, max_trade_length]
-        })
+    Returns:
+        EarningsTradingStrategy: The finished strategy, with its analyzers
+    """
+    timer = timer or StageTimer()
+    with timer.stage('import_backtrader'):
+        import backtrader as bt
+        from strategy import EarningsTradingStrategy
+
+    with timer.stage('cerebro_setup'):
+        # Create a cerebro instance
+        cerebro = bt.Cerebro()
+        
+        # Add data feed
+        data = bt.feeds.PandasData(dataname=filtered_price_df, datetime=None)
+        cerebro.adddata(data)
+        
+        # Create and add strategy
+        strategy = EarningsTradingStrategy
+        # Use a class attribute to pass earnings data to the strategy
+        strategy.earnings_data = earnings_df
+        cerebro.addstrategy(strategy, stock=stock, regression_file=regression_file, predictions=predictions)
         
-        # Save trade length data to CSV
-        trade_length_df.to_csv(os.path.join(results_dir, "trade_length_data.csv"), index=False)
+        # Set broker parameters
+        cerebro.broker.setcash(10000.0)
+        cerebro.broker.setcommission(commission=0.001)
         
-        # Plot trade length
-        fig = px.bar(trade_length_df, x='Metric', y='Value', title='Trade Length')
-        fig.write_html(os.path.join(results_dir, "trade_length_data.html"))
-
-    else:
-        print("Trade length metrics not found in the analysis.")
-    
-    # 5. Equity Curve
-    equity_df = pd.DataFrame({
-        'Timestamp': range(len(strategy.portfolio_value)),
-        'Value': strategy.portfolio_value
-    })
-    
-    # Save equity curve data to CSV
-    equity_df.to_csv(os.path.join(results_dir, "equity_curve.csv"), index=False)
-    
-    # Plot equity curve
-    fig = px.line(equity_df, x='Timestamp', y='Value', title='Portfolio Equity Curve')
-    fig.write_html(os.path.join(results_dir, "equity_curve.html"))
-    
-    # Create a summary text file
-    with open(os.path.join(results_dir, "summary.txt"), "w") as f:
-        f.write(f"Backtest Results Summary\n")
-        f.write(f"======================\n\n")
-        f.write(f"Generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-        f.write(f"Sharpe Ratio: {sharpe_ratio['sharperatio']}\n\n")
-        f.write(f"Total Trades: {total_trades}\n")
-        f.write(f"Won Trades: {won_trades} ({won_trades/total_trades*100:.2f}%)\n")
-        f.write(f"Lost Trades: {lost_trades} ({lost_trades/total_trades*100:.2f}%)\n\n")
-        f.write(f"Gross PnL: {gross_pnl}\n")
-        f.write(f"Net PnL: {net_pnl}\n\n")
-        f.write(f"Current Win Streak: {won_streak_current}\n")
-        f.write(f"Longest Win Streak: {won_streak_longest}\n")
-        f.write(f"Current Loss Streak: {lost_streak_current}\n")
-        f.write(f"Longest Loss Streak: {lost_streak_longest}\n")
+        # Add analyzers
+        add_analyzers(cerebro, analyzers, flat_days)
     
-    print(f"All results saved to {results_dir}")
+    # Run the backtest
+    with timer.stage('cerebro_run'):
+        thestrats = cerebro.run()
+    return thestrats[0]
 
 
-def run_backtest(stock):
+def run_backtest(stock, incremental=False, output_format='csv', write_html=True, predictions='full',
+                 start=None, end=None, analyzers=DEFAULT_ANALYZERS, event_windows=False):
     """
     Run a backtest for a specific stock.
     
     Args:
         stock: Stock symbol
+        incremental: Skip the stock if its inputs are unchanged since the last run
+        output_format: 'csv' or 'json' (see save_backtest_results)
+        write_html: Also render the Plotly HTML charts
+        predictions: Regression prediction set, 'full' or walk-forward (see regression_models)
+        start: First date to trade (defaults to the first bar)
+        end: Last date to trade (defaults to the last bar)
+        analyzers: Analyzer profile, 'minimal', 'standard' or 'full' (see add_analyzers)
+        event_windows: Feed Cerebro only the bars around each earnings event (see slice_event_windows)
     
     Returns:
-        dict: Results of the backtest
+        dict: Results of the backtest, with the per-stage timings (see timing.StageTimer)
     """
+    timer = StageTimer(stock)
     print(f"Running backtest for {stock}...")
     
     # Load price data
-    price_df = load_price_data(stock)
+    with timer.stage('load_price_data'):
+        price_df = load_price_data(stock)
     if price_df is None:
         print(f"Cannot run backtest for {stock} due to missing price data.")
         return None
     
     # Load earnings data
-    earnings_df = load_earnings_data(stock)
+    with timer.stage('load_earnings_data'):
+        earnings_df = load_earnings_data(stock)
     if earnings_df is None:
         print(f"Cannot run backtest for {stock} due to missing earnings data.")
         return None
     
-    # Ensure price_df and earnings_df have no timezone
-    price_df.index = price_df.index.tz_localize(None)
-    earnings_df.index = earnings_df.index.tz_localize(None)
-    
-    # Filter for trading hours
-    filtered_price_df = filter_trading_hours(price_df)
-    
-    # Create a cerebro instance
-    cerebro = bt.Cerebro()
-    
-    # Add data feed
-    data = bt.feeds.PandasData(dataname=filtered_price_df, datetime=None)
-    cerebro.adddata(data)
+    with timer.stage('filter_trading_hours'):
+        # Ensure price_df and earnings_df have no timezone
+        price_df.index = price_df.index.tz_localize(None)
+        earnings_df.index = earnings_df.index.tz_localize(None)
+        
+        # Filter for trading hours and the requested dates
+        filtered_price_df = filter_date_range(filter_trading_hours(price_df), start, end)
     
-    # Create and add strategy
-    strategy = EarningsTradingStrategy
-    # Use a class attribute to pass earnings data to the strategy
-    strategy.earnings_data = earnings_df
-    # cerebro.addstrategy(strategy,stock=stock,regression_file="../regression_predictions_new.csv")
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    regression_file_path = os.path.join(base_dir, "regression_predictions_new.csv")
-    cerebro.addstrategy(strategy, stock=stock, regression_file=regression_file_path)
-
+    flat_days = 0
+    if event_windows:
+        with timer.stage('event_windows'):
+            n_bars = len(filtered_price_df)
+            filtered_price_df, flat_days = slice_event_windows(filtered_price_df, earnings_df,
+                                                               strategy_params()['holding_period'])
+        print(f"Event windows keep {len(filtered_price_df)} of {n_bars} bars")
     
-    # Set broker parameters
-    cerebro.broker.setcash(10000.0)
-    cerebro.broker.setcommission(commission=0.001)
+    with timer.stage('load_predictions'):
+        reg_preds = load_predictions(stock, predictions=predictions)
     
-    # Add analyzers
-    cerebro.addanalyzer(bt.analyzers.TimeReturn, _name='time_return', timeframe=bt.TimeFrame.Days)
-    cerebro.addanalyzer(btanalyzers.SharpeRatio, _name='mysharpe', riskfreerate=0.03, timeframe=bt.TimeFrame.Days, annualize=True)
-    cerebro.addanalyzer(btanalyzers.AnnualReturn, _name='annual_return')
-    cerebro.addanalyzer(btanalyzers.DrawDown, _name='drawdown')
-    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name='trade_analyzer')
-    cerebro.addanalyzer(btanalyzers.Returns, _name='returns')
-    cerebro.addanalyzer(btanalyzers.PyFolio, _name='pyfolio')  # For advanced metrics
+    # Reuse the stored results if nothing the backtest reads has changed
+    with timer.stage('check_inputs'):
+        fingerprints = input_fingerprints(filtered_price_df, earnings_df, reg_preds, strategy_params(),
+                                          {'output_format': output_format, 'write_html': write_html})
+        results_dir = create_results_dir(stock)
+        state = None
+        if incremental and is_unchanged(read_manifest(results_dir), fingerprints, results_dir,
+                                        result_files(output_format)):
+            state = read_state(results_dir)
+    if state is not None:
+        print(f"Inputs for {stock} are unchanged, keeping the stored results")
+        return {**stored_result(stock, results_dir, state), 'timings': timer.stages}
     
-    # Run the backtest
-    thestrats = cerebro.run()
-    thestrat = thestrats[0]
+    thestrat = run_cerebro(filtered_price_df, earnings_df, stock, predictions=predictions, timer=timer,
+                           analyzers=analyzers, flat_days=flat_days)
     
     # Get the analyzers
-    sharpe_ratio = thestrat.analyzers.mysharpe.get_analysis()
+    sharpe_ratio = strategy_sharpe_ratio(thestrat)
     trade_analysis = thestrat.analyzers.trade_analyzer.get_analysis()
+    metrics = thestrat.analyzers.metrics.get_analysis()
     
     # Print results
     print(f"Sharpe Ratio for {stock}:", sharpe_ratio['sharperatio'])
     print(trade_analysis)
     
-    # Create results directory
-    results_dir = create_results_dir(stock)
-    
     # Save results
-    save_backtest_results(results_dir, trade_analysis, sharpe_ratio, thestrat)
+    with timer.stage('save_results'):
+        save_backtest_results(results_dir, trade_analysis, sharpe_ratio, thestrat,
+                              output_format=output_format, write_html=write_html, timer=timer,
+                              stream_metrics=metrics)
+    with timer.stage('write_manifest'):
+        write_manifest(results_dir, {
+            'stock': stock,
+            'engine': 'backtrader',
+            'fingerprints': fingerprints,
+        }, {
+            'df': thestrat.df,
+            'trade_analysis': trade_analysis,
+            'sharpe_ratio': dict(sharpe_ratio),
+        })
     
     return {
         'stock': stock,
         'sharpe_ratio': sharpe_ratio['sharperatio'],
         'trade_analysis': trade_analysis,
         'results_dir': results_dir,
-        'trade_entries': thestrat.df  # Include trade entries in the return dict
+        'trade_entries': thestrat.df,  # Include trade entries in the return dict
+        'timings': timer.stages,
     }
 
 
-def main():
+def get_backtest_runner(engine='backtrader'):
     """
-    Main function to run backtests for all stocks.
+    Get the per-stock backtest function for an engine.
+    
+    Args:
+        engine: 'backtrader' for EarningsTradingStrategy or 'vectorized' for the NumPy engine
+    
+    Returns:
+        callable: Function taking a stock symbol and returning its results dict
+    """
+    if engine == 'backtrader':
+        return run_backtest
+    if engine == 'vectorized':
+        from vectorized import run_vectorized_backtest
+        return run_vectorized_backtest
+    raise ValueError(f"Unknown backtest engine: {engine}")
+
+
+def run_backtests_parallel(stocks, max_workers=None, engine='backtrader', incremental=False,
+                           output_format='csv', write_html=True, predictions='full', start=None, end=None,
+                           profile=False, analyzers=DEFAULT_ANALYZERS, event_windows=False):
+    """
+    Run backtests for several stocks across a pool of worker processes.
+    
+    Each worker runs the backtest for one ticker, including writing that
+    ticker's results directory, so result files are written in parallel.
+    
+    Args:
+        stocks: List of stock symbols
+        max_workers: Number of worker processes (defaults to the CPU count)
+        engine: 'backtrader' or 'vectorized'
+        incremental: Skip stocks whose inputs are unchanged since the last run
+        output_format: 'csv' or 'json' (see save_backtest_results)
+        write_html: Also render the Plotly HTML charts
+        predictions: Regression prediction set, 'full' or walk-forward (see regression_models)
+        start: First date to trade (defaults to the first bar)
+        end: Last date to trade (defaults to the last bar)
+        profile: Run each backtest under cProfile and save the stats in its results directory
+        analyzers: Analyzer profile of the backtrader engine (see add_analyzers); the
+            vectorized engine always computes the streaming metrics
+        event_windows: Feed the backtrader engine only the bars around each earnings
+            event (see slice_event_windows)
+    
+    Returns:
+        dict: Results of the backtest keyed by stock symbol
+    """
+    if event_windows and engine != 'backtrader':
+        raise ValueError("Event windows are only used by the backtrader engine")
+    options = {'analyzers': analyzers, 'event_windows': event_windows} if engine == 'backtrader' else {}
+    runner = partial(get_backtest_runner(engine), incremental=incremental, output_format=output_format,
+                     write_html=write_html, predictions=predictions, start=start, end=end, **options)
+    if profile:
+        runner = partial(profile_call, runner)
+    results = {}
+    if max_workers == 1:
+        for stock in stocks:
+            stock_result = runner(stock)
+            if stock_result:
+                results[stock] = stock_result
+        return results
+    
+    # Workers attach to one shared copy of the prediction table instead of each loading it
+    with SharedFrames({predictions: load_predictions(predictions=predictions)}) as shared, \
+            ProcessPoolExecutor(max_workers=max_workers, initializer=attach_predictions,
+                                initargs=(shared.handle,)) as executor:
+        futures = {executor.submit(runner, stock): stock for stock in stocks}
+        for future in as_completed(futures):
+            stock = futures[future]
+            try:
+                stock_result = future.result()
+            except Exception as e:
+                print(f"Error running backtest for {stock}: {e}")
+                continue
+            if stock_result:
+                results[stock] = stock_result
+    
+    # Keep the caller's ticker order regardless of completion order
+    return {stock: results[stock] for stock in stocks if stock in results}
+
+
+def run_backtests(stocks=DEFAULT_STOCKS, max_workers=None, engine='backtrader', incremental=False,
+                  output_format='csv', write_html=True, predictions='full', start=None, end=None, profile=False,
+                  analyzers=DEFAULT_ANALYZERS, event_windows=False):
     """
-    # List of stocks to analyze
-    stocks = ['NVDA', 'GOOGL', 'GS', 'GME', 'MSFT']
+    Run backtests for several stocks and index their results for the dashboard.
     
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    base_results_path = os.path.join(script_dir, "frontend", "results")
+    Args:
+        stocks: List of stock symbols
+        max_workers: Number of worker processes (defaults to the CPU count)
+        engine: 'backtrader' or 'vectorized'
+        incremental: Skip stocks whose inputs are unchanged since the last run
+        output_format: 'csv' or 'json' (see save_backtest_results)
+        write_html: Also render the Plotly HTML charts
+        predictions: Regression prediction set, 'full' or walk-forward (see regression_models)
+        start: First date to trade (defaults to the first bar)
+        end: Last date to trade (defaults to the last bar)
+        profile: Also save cProfile stats of each backtest in its results directory
+        analyzers: Analyzer profile of the backtrader engine (see add_analyzers)
+        event_windows: Feed the backtrader engine only the bars around each earnings event
+    
+    Returns:
+        dict: Results of the backtest keyed by stock symbol
+    """
+    base_results_path = default_results_path()
     if not os.path.exists(base_results_path):
         os.makedirs(base_results_path)
     
     # Run backtests for all stocks
-    results = {}
+    timer = StageTimer()
+    with timer.stage('backtests'):
+        results = run_backtests_parallel(stocks, max_workers=max_workers, engine=engine, incremental=incremental,
+                                         output_format=output_format, write_html=write_html,
+                                         predictions=predictions, start=start, end=end, profile=profile,
+                                         analyzers=analyzers, event_windows=event_windows)
+    with timer.stage('build_results_index'):
+        build_results_index(list(results), base_results_path)
+    
+    # Per-ticker stages, slowest first, next to the results
+    write_timing_report({stock: result.get('timings', []) for stock, result in results.items()},
+                        base_results_path, {'engine': engine, 'workers': max_workers, 'wall': timer.total(),
+                                            'run': timer.stages})
+    return results
+
+
+def print_results_summary(stocks, base_path=None):
+    """
+    Prints the stored results of each stock without running anything.
+    
+    Args:
+        stocks: Stock symbols
+        base_path: Base directory for results (defaults to frontend/results)
+    """
+    base_path = base_path or default_results_path()
+    print(f"{'Ticker':<8}{'Sharpe':>12}{'Trades':>8}{'Win %':>8}{'Net PnL':>12}")
     for stock in stocks:
-        stock_result = run_backtest(stock)
-        if stock_result:
-            results[stock] = stock_result
+        results_dir = os.path.join(base_path, stock, f"{stock}_backtest_results")
+        dashboard_file = os.path.join(results_dir, DASHBOARD_FILE)
+        summary_file = os.path.join(results_dir, "summary.txt")
+        if os.path.exists(dashboard_file):
+            with open(dashboard_file) as f:
+                summary = json.load(f)['summary']
+        elif os.path.exists(summary_file):
+            # Older results only have the text summary
+            with open(summary_file) as f:
+                lines = dict(line.split(': ', 1) for line in f.read().splitlines() if ': ' in line)
+            trades = float(lines['Total Trades'])
+            won = float(lines['Won Trades'].split()[0])
+            summary = {'sharpe_ratio': float(lines['Sharpe Ratio']), 'total_trades': trades,
+                       'win_rate': won / trades * 100 if trades else None, 'net_pnl': float(lines['Net PnL'])}
+        else:
+            print(f"{stock:<8}no results")
+            continue
+        cells = [('-' if summary.get(key) is None else format(summary[key], spec)).rjust(width)
+                 for key, spec, width in (('sharpe_ratio', '.4g', 12), ('total_trades', '.0f', 8),
+                                          ('win_rate', '.1f', 8), ('net_pnl', '.2f', 12))]
+        print(f"{stock:<8}" + ''.join(cells))
+
+
+def main(argv=None):
+    """
+    Runs the backtests from the command line.
+    
+    Args:
+        argv: Command line arguments (defaults to sys.argv)
+    
+    Returns:
+        dict: Results of the backtest keyed by stock symbol, or by PORTFOLIO with --portfolio
+            (None with --summary)
+    """
+    parser = argparse.ArgumentParser(description="Backtest the earnings surprise strategy and write the "
+                                                 "dashboard's results.")
+    parser.add_argument('tickers', nargs='*', default=DEFAULT_STOCKS,
+                        help=f"Stock symbols (defaults to {' '.join(DEFAULT_STOCKS)})")
+    parser.add_argument('--start', help="First date to trade, YYYY-MM-DD (defaults to the first bar)")
+    parser.add_argument('--end', help="Last date to trade, YYYY-MM-DD (defaults to the last bar)")
+    parser.add_argument('--engine', choices=('backtrader', 'vectorized'), default='backtrader',
+                        help="Backtest engine (default backtrader)")
+    parser.add_argument('--format', choices=('csv', 'json'), default='csv', dest='output_format',
+                        help="Result files: the per-metric CSVs or one results.json (default csv)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes (defaults to the CPU count; 1 runs in this process)")
+    parser.add_argument('--predictions', default='full',
+                        help="Regression prediction set: full or walk_forward[_N] (default full)")
+    parser.add_argument('--analyzers', choices=tuple(ANALYZER_PROFILES), default=DEFAULT_ANALYZERS,
+                        help="backtrader analyzers to attach: minimal (streaming Sharpe, drawdown and win rate, "
+                             "and TradeAnalyzer), standard (adds SharpeRatio and DrawDown) or full (adds "
+                             f"TimeReturn, AnnualReturn, Returns and PyFolio) (default {DEFAULT_ANALYZERS})")
+    parser.add_argument('--event-windows', action='store_true',
+                        help="Feed backtrader only the bars around each earnings event instead of every "
+                             "after-hours bar (same results, far fewer bars on dense histories)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Skip tickers whose inputs are unchanged since the last run")
+    parser.add_argument('--no-html', dest='write_html', action='store_false',
+                        help="Skip the Plotly HTML charts")
+    parser.add_argument('--profile', action='store_true',
+                        help="Save cProfile stats of each backtest (profile.prof, profile.txt) with its results")
+    parser.add_argument('--portfolio', action='store_true',
+                        help="Backtest the tickers together with one shared broker (see portfolio.py)")
+    parser.add_argument('--cash', type=float, default=10000.0,
+                        help="Starting cash of the shared broker with --portfolio (default 10000)")
+    parser.add_argument('--summary', action='store_true',
+                        help="Print the stored results of the tickers instead of running")
+    args = parser.parse_args(argv)
+    
+    if args.event_windows and args.engine != 'backtrader':
+        parser.error("--event-windows is only used by the backtrader engine")
+    if args.portfolio and (args.engine != 'backtrader' or args.event_windows or args.incremental):
+        parser.error("--portfolio runs the backtrader engine without --event-windows or --incremental")
+    
+    stocks = [ticker.upper() for ticker in args.tickers]
+    if args.summary:
+        print_results_summary(stocks)
+        return None
+    if args.portfolio:
+        from portfolio import run_portfolio_backtest
+        result = run_portfolio_backtest(stocks, cash=args.cash, output_format=args.output_format,
+                                        write_html=args.write_html, predictions=args.predictions,
+                                        start=args.start, end=args.end)
+        return {result['stock']: result} if result else {}
+    return run_backtests(stocks, max_workers=args.workers, engine=args.engine, incremental=args.incremental,
+                         output_format=args.output_format, write_html=args.write_html,
+                         predictions=args.predictions, start=args.start, end=args.end, profile=args.profile,
+                         analyzers=args.analyzers, event_windows=args.event_windows)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Columnar Storage for 5-Minute Bar Data
+
+The bars fetched by DataFetch_Module.py are stored as
+{TICKER}_Earnings_Data(5M).csv, whose '%Y%m%d %H:%M:%S %Z' date strings have to be
+parsed on every load. This module offers two columnar layouts instead:
+
+- Per-ticker Feather (Arrow IPC) files next to the CSVs, typed and pre-sorted,
+  which load without any date parsing and can optionally be memory mapped.
+- One consolidated Parquet dataset for the whole universe, partitioned by ticker
+  and year, queried with load_bars(tickers, start, end, session). Ticker and year
+  predicates prune partitions, and date and session predicates are pushed down to
+  Parquet row-group statistics, so only the relevant files and rows are read.
+
+Run it as a script to build them from the bar CSVs:
+
+    python bar_store.py                  # Feather files for every *_Earnings_Data(5M).csv
+    python bar_store.py NVDA GS          # Feather files for selected tickers
+    python bar_store.py --dataset        # consolidated partitioned dataset
+
+pyarrow is needed for the columnar layouts; without it loaders fall back to CSV.
+"""
+
+import os
+import glob
+import argparse
+import datetime
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CSV_SUFFIX = "_Earnings_Data(5M).csv"
+FEATHER_SUFFIX = "_Earnings_Data(5M).feather"
+DATASET_DIR = os.path.join(BASE_DIR, "bar_dataset")
+
+# Minute-of-day ranges (inclusive) for each session, in exchange local time.
+# 'after_hours' matches filter_trading_hours in backtest.py.
+SESSIONS = {
+    'after_hours': (16*60 + 5, 18*60 + 59),
+    'regular': (9*60 + 30, 16*60),
+    'all': None,
+}
+
+
+def csv_path(stock, base_dir=None):
+    """
+    Path of a stock's bar CSV.
+
+    Args:
+        stock: Stock symbol
+        base_dir: Directory holding the bar files (defaults to the repository root)
+
+    Returns:
+        str: Path to {stock}_Earnings_Data(5M).csv
+    """
+    return os.path.join(base_dir or BASE_DIR, f"{stock}{CSV_SUFFIX}")
+
+
+def feather_path(stock, base_dir=None):
+    """
+    Path of a stock's columnar bar file.
+
+    Args:
+        stock: Stock symbol
+        base_dir: Directory holding the bar files (defaults to the repository root)
+
+    Returns:
+        str: Path to {stock}_Earnings_Data(5M).feather
+    """
+    return os.path.join(base_dir or BASE_DIR, f"{stock}{FEATHER_SUFFIX}")
+
+
+def parse_price_csv(file_path):
+    """
+    Parses a bar CSV into a sorted, timestamp-indexed DataFrame.
+
+    Args:
+        file_path: Path to a {TICKER}_Earnings_Data(5M).csv file
+
+    Returns:
+        DataFrame: Open/High/Low/Close/Volume indexed by 'date'
+    """
+    stock_df = pd.read_csv(file_path)
+    stock_df['date'] = pd.to_datetime(stock_df['date'], format='%Y%m%d %H:%M:%S %Z', errors='coerce')
+    stock_df = stock_df.loc[:, ~stock_df.columns.str.contains('^Unnamed')]
+    stock_df.dropna(subset=['date'], inplace=True)
+    stock_df.set_index('date', inplace=True)
+    stock_df = stock_df.sort_index()
+    stock_df = stock_df.drop(columns=['ReqId', 'ticker'])
+    return stock_df
+
+
+def convert_price_csv(stock, base_dir=None):
+    """
+    Converts a stock's bar CSV into a Feather file.
+
+    Args:
+        stock: Stock symbol
+        base_dir: Directory holding the bar files (defaults to the repository root)
+
+    Returns:
+        str: Path of the written Feather file
+    """
+    stock_df = parse_price_csv(csv_path(stock, base_dir))
+    output_file = feather_path(stock, base_dir)
+    # Uncompressed so the file can be memory mapped
+    stock_df.reset_index().to_feather(output_file, compression='uncompressed')
+    return output_file
+
+
+def read_columnar_bars(stock, base_dir=None, memory_map=False):
+    """
+    Reads a stock's Feather bar file if it exists and is not older than its CSV.
+
+    Args:
+        stock: Stock symbol
+        base_dir: Directory holding the bar files (defaults to the repository root)
+        memory_map: Memory map the file instead of reading it into memory
+
+    Returns:
+        DataFrame: Bars indexed by 'date', or None if no usable Feather file exists
+    """
+    path = feather_path(stock, base_dir)
+    if not os.path.exists(path):
+        return None
+
+    source = csv_path(stock, base_dir)
+    if os.path.exists(source) and os.path.getmtime(source) > os.path.getmtime(path):
+        print(f"{path} is older than {source}, reading the CSV instead")
+        return None
+
+    try:
+        import pyarrow.feather as feather
+    except ImportError:
+        return None
+
+    table = feather.read_table(path, memory_map=memory_map)
+    return table.to_pandas().set_index('date')
+
+
+def list_csv_stocks(base_dir=None):
+    """
+    Lists the tickers that have a bar CSV.
+
+    Args:
+        base_dir: Directory holding the bar files (defaults to the repository root)
+
+    Returns:
+        list: Sorted stock symbols
+    """
+    base_dir = base_dir or BASE_DIR
+    pattern = os.path.join(glob.escape(base_dir), f"*{glob.escape(CSV_SUFFIX)}")
+    return sorted(os.path.basename(p)[:-len(CSV_SUFFIX)] for p in glob.glob(pattern))
+
+
+def load_stored_bars(stock, base_dir=None):
+    """
+    Loads a stock's bars from the Feather file if usable, otherwise from the CSV.
+
+    Args:
+        stock: Stock symbol
+        base_dir: Directory holding the bar files (defaults to the repository root)
+
+    Returns:
+        DataFrame: Bars indexed by 'date', or None if the stock has no bar files
+    """
+    stock_df = read_columnar_bars(stock, base_dir)
+    if stock_df is None and os.path.exists(csv_path(stock, base_dir)):
+        stock_df = parse_price_csv(csv_path(stock, base_dir))
+    return stock_df
+
+
+def stored_bar_dates(stock, base_dir=None):
+    """
+    Trading dates that already have bars on disk for a stock.
+
+    Args:
+        stock: Stock symbol
+        base_dir: Directory holding the bar files (defaults to the repository root)
+
+    Returns:
+        set: 'YYYYMMDD' strings in exchange local time
+    """
+    stock_df = load_stored_bars(stock, base_dir)
+    if stock_df is None:
+        return set()
+    return set(stock_df.index.strftime('%Y%m%d'))
+
+
+def _raw_bars(stock, stock_df):
+    # Parsed bars back in the layout DataFetch_Module writes to the CSVs
+    raw = stock_df.reset_index()
+    raw['date'] = raw['date'].dt.strftime('%Y%m%d %H:%M:%S ') + str(stock_df.index.tz)
+    raw.insert(0, 'ticker', stock)
+    raw.insert(0, 'ReqId', 0)
+    return raw[['ReqId', 'ticker', 'date', 'Open', 'High', 'Low', 'Close', 'Volume']]
+
+
+def merge_price_bars(stock, new_df, base_dir=None, replace=False, dataset_dir=None):
+    """
+    Merges newly fetched bars into a stock's bar CSV and refreshes its columnar copies.
+
+    Rows are deduplicated on (ticker, date), keeping the newly fetched bar. The
+    Feather file and dataset partitions are rewritten only if they already exist.
+
+    Args:
+        stock: Stock symbol
+        new_df: Bars in the CSV layout (ReqId, ticker, date, Open, High, Low, Close, Volume)
+        base_dir: Directory holding the bar files (defaults to the repository root)
+        replace: Discard the stored bars instead of merging with them
+        dataset_dir: Root of the partitioned dataset (defaults to bar_dataset under base_dir)
+
+    Returns:
+        str: Path of the written CSV
+    """
+    output_file = csv_path(stock, base_dir)
+    if replace:
+        existing = None
+    elif os.path.exists(output_file):
+        existing = pd.read_csv(output_file, index_col=0)
+    else:
+        stored = read_columnar_bars(stock, base_dir)
+        existing = _raw_bars(stock, stored) if stored is not None else None
+
+    new_df = new_df.copy()
+    if existing is not None and len(existing) and len(new_df):
+        # Keep request ids unique across fetches
+        new_df['ReqId'] += existing['ReqId'].max() + 1 - new_df['ReqId'].min()
+        merged = pd.concat([existing, new_df], ignore_index=True)
+    else:
+        merged = new_df if existing is None or not len(existing) else existing
+    merged = merged.drop_duplicates(subset=['ticker', 'date'], keep='last')
+    merged = merged.sort_values(by='ReqId', kind='stable').reset_index(drop=True)
+    merged.to_csv(output_file)
+
+    if os.path.exists(feather_path(stock, base_dir)):
+        convert_price_csv(stock, base_dir)
+    dataset_dir = dataset_dir or os.path.join(base_dir or BASE_DIR, os.path.basename(DATASET_DIR))
+    if has_dataset_bars(stock, dataset_dir):
+        write_bar_dataset(stock, parse_price_csv(output_file), dataset_dir)
+    return output_file
+
+
+def write_bar_dataset(stock, stock_df, dataset_dir=None):
+    """
+    Writes one stock's bars into the consolidated dataset, replacing its partitions.
+
+    Args:
+        stock: Stock symbol
+        stock_df: Bars indexed by a timezone-aware 'date', as returned by parse_price_csv
+        dataset_dir: Root of the partitioned dataset (defaults to DATASET_DIR)
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df = stock_df.reset_index()
+    df['ticker'] = stock
+    df['year'] = df['date'].dt.year.astype('int32')
+    # Stored so session filters can be pushed down instead of computed after loading
+    df['minute_of_day'] = (df['date'].dt.hour * 60 + df['date'].dt.minute).astype('int16')
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_to_dataset(
+        table,
+        dataset_dir or DATASET_DIR,
+        partition_cols=['ticker', 'year'],
+        existing_data_behavior='delete_matching',
+    )
+
+
+def build_bar_dataset(stocks=None, dataset_dir=None, base_dir=None):
+    """
+    Builds the consolidated dataset from per-ticker bar files.
+
+    Args:
+        stocks: Stock symbols to include (defaults to every bar CSV)
+        dataset_dir: Root of the partitioned dataset (defaults to DATASET_DIR)
+        base_dir: Directory holding the bar files (defaults to the repository root)
+
+    Returns:
+        str: Root of the partitioned dataset
+    """
+    dataset_dir = dataset_dir or DATASET_DIR
+    for stock in stocks or list_csv_stocks(base_dir):
+        stock_df = load_stored_bars(stock, base_dir)
+        write_bar_dataset(stock, stock_df, dataset_dir)
+        print(f"{stock}: bars added to {dataset_dir}")
+    return dataset_dir
+
+
+def has_dataset_bars(stock, dataset_dir=None, source=None):
+    """
+    Checks whether a stock has partitions in the consolidated dataset.
+
+    Args:
+        stock: Stock symbol
+        dataset_dir: Root of the partitioned dataset (defaults to DATASET_DIR)
+        source: Bar CSV the partitions were written from; if it was modified after
+            the newest partition file, the dataset is stale and not used
+
+    Returns:
+        bool: True if load_bars can serve the stock
+    """
+    ticker_dir = os.path.join(dataset_dir or DATASET_DIR, f"ticker={stock}")
+    if not os.path.isdir(ticker_dir):
+        return False
+    if source is not None and os.path.exists(source):
+        written = [os.path.getmtime(os.path.join(root, name))
+                   for root, _, names in os.walk(ticker_dir) for name in names]
+        if not written or os.path.getmtime(source) > max(written):
+            print(f"{ticker_dir} is older than {source}, reading the CSV instead")
+            return False
+    try:
+        import pyarrow.dataset
+    except ImportError:
+        return False
+    return True
+
+
+def _is_date_only(value):
+    # A calendar day without a time of day, as a date or a string like '2024-01-31'
+    if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        return True
+    return isinstance(value, str) and ':' not in value and pd.Timestamp(value) == pd.Timestamp(value).normalize()
+
+
+def load_bars(tickers, start=None, end=None, session='all', dataset_dir=None):
+    """
+    Loads bars for several tickers from the consolidated dataset.
+
+    Only partitions of the requested tickers and years are opened, and the
+    date and session predicates are evaluated by the Parquet reader.
+
+    Args:
+        tickers: Stock symbol or list of symbols
+        start: First timestamp to include (inclusive); naive values are exchange local time
+        end: Last timestamp to include (inclusive); naive values are exchange local time,
+            and a date without a time includes the whole day, as backtest.filter_date_range does
+        session: 'after_hours', 'regular' or 'all'
+        dataset_dir: Root of the partitioned dataset (defaults to DATASET_DIR)
+
+    Returns:
+        DataFrame: Bars indexed by 'date' with a 'ticker' column, sorted by ticker then date
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    if isinstance(tickers, str):
+        tickers = [tickers]
+    if session not in SESSIONS:
+        raise ValueError(f"Unknown session: {session}")
+
+    dataset = ds.dataset(dataset_dir or DATASET_DIR, format='parquet', partitioning='hive')
+    date_type = dataset.schema.field('date').type
+
+    def to_scalar(value):
+        ts = pd.Timestamp(value)
+        if ts.tzinfo is None and date_type.tz is not None:
+            ts = ts.tz_localize(date_type.tz)
+        return pa.scalar(ts, type=date_type), ts
+
+    predicate = ds.field('ticker').isin(list(tickers))
+    if start is not None:
+        start_value, start_ts = to_scalar(start)
+        predicate &= (ds.field('year') >= start_ts.year) & (ds.field('date') >= start_value)
+    if end is not None and _is_date_only(end):
+        # Up to the start of the next day, so the day's after-hours bars are kept
+        end_value, end_ts = to_scalar(pd.Timestamp(end).normalize() + pd.Timedelta(days=1))
+        predicate &= (ds.field('year') <= end_ts.year) & (ds.field('date') < end_value)
+    elif end is not None:
+        end_value, end_ts = to_scalar(end)
+        predicate &= (ds.field('year') <= end_ts.year) & (ds.field('date') <= end_value)
+    if SESSIONS[session] is not None:
+        first_minute, last_minute = SESSIONS[session]
+        predicate &= (ds.field('minute_of_day') >= first_minute) & (ds.field('minute_of_day') <= last_minute)
+
+    columns = ['date', 'ticker', 'Open', 'High', 'Low', 'Close', 'Volume']
+    df = dataset.to_table(columns=columns, filter=predicate).to_pandas()
+    df['ticker'] = df['ticker'].astype(str)
+    df = df.sort_values(by=['ticker', 'date'], kind='stable').set_index('date')
+    return df
+
+
+def main(argv=None):
+    """
+    Builds the columnar bar files from the bar CSVs.
+
+    Args:
+        argv: Command line arguments (defaults to sys.argv)
+    """
+    parser = argparse.ArgumentParser(description="Convert bar CSVs into columnar storage.")
+    parser.add_argument('stocks', nargs='*', help="Stock symbols (defaults to every bar CSV)")
+    parser.add_argument('--dataset', action='store_true',
+                        help="Build the consolidated partitioned dataset instead of Feather files")
+    args = parser.parse_args(argv)
+
+    stocks = args.stocks or list_csv_stocks()
+    if args.dataset:
+        build_bar_dataset(stocks)
+        return
+
+    for stock in stocks:
+        output_file = convert_price_csv(stock)
+        print(f"{stock}: bars saved to {output_file}")
+
+
+if __name__ == "__main__":
+    main()
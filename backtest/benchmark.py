@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+Synthetic Benchmark of the Backtest Pipeline
+
+Measures how the backtest scales past the five sample stocks, without touching
+the network. generate_dataset writes synthetic data in the formats the
+backtest reads, for any number of tickers and years:
+
+    {TICKER}_Earnings_Data(5M).csv  5-minute bars around every earnings release (or on every trading day)
+    earnings_cache.sqlite           quarterly earnings dates with EPS estimates and reported EPS
+    predictions/{TICKER}.csv        regression predictions in the layout of regression_predictions_new.csv
+
+run_benchmark then backtests every ticker with each engine (backtrader,
+vectorized) and runner (serial in this process, parallel over a process pool)
+and times the load, filter, simulate and write phases of every ticker with
+timing.StageTimer. Each run is appended to benchmark_history.jsonl and
+compared with the last run of the same configuration, so slowdowns show up
+from one run to the next.
+
+    python benchmark.py                                       # 20 tickers, 10 years, every engine and runner
+    python benchmark.py --tickers 1000 --years 20 --engines vectorized --runners parallel
+    python benchmark.py --days all --years 2 --feather        # bars on every trading day, read from Feather
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import platform
+import tempfile
+import datetime
+import contextlib
+import subprocess
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from backtest import (
+    ANALYZER_PROFILES,
+    DEFAULT_ANALYZERS,
+    create_results_dir,
+    filter_trading_hours,
+    load_earnings_data,
+    load_price_data,
+    run_cerebro,
+    save_backtest_results,
+    slice_event_windows,
+    strategy_sharpe_ratio,
+)
+from bar_store import convert_price_csv, csv_path
+from earnings_cache import write_cached
+from regression_models import load_predictions
+from timing import StageTimer, stage_totals
+from vectorized import simulate_trades
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY_FILE = os.path.join(BASE_DIR, "benchmark_history.jsonl")
+DATA_MARKER = "benchmark_data.json"
+EARNINGS_CACHE = "earnings_cache.sqlite"
+PREDICTIONS_DIR = "predictions"
+
+ENGINES = ('backtrader', 'vectorized')
+RUNNERS = ('serial', 'parallel')
+SESSION = ('15:00', '19:25')   # Bar times of each day in the sample CSVs
+END_DATE = '2024-12-31'        # Fixed, so a configuration always generates the same data
+SLOWER = 1.10                  # Ratio to the previous run flagged as a slowdown
+
+# Top-level stages of a ticker's backtest, grouped into the phases that are compared
+PHASES = {
+    'load': ('load_price_data', 'load_earnings_data', 'load_predictions'),
+    'filter': ('filter_trading_hours', 'event_windows'),
+    'simulate': ('import_backtrader', 'cerebro_setup', 'cerebro_run', 'simulate'),
+    'write': ('save_results',),
+}
+
+
+def ticker_names(n):
+    return [f"SYN{i:04d}" for i in range(n)]
+
+
+def predictions_path(stock, data_dir):
+    return os.path.join(data_dir, PREDICTIONS_DIR, f"{stock}.csv")
+
+
+def synthetic_earnings(rng, start, end):
+    """
+    Quarterly earnings releases after the close, with estimates and reported EPS.
+
+    Args:
+        rng: numpy Generator
+        start: First quarter to report
+        end: Last release date
+
+    Returns:
+        tuple: (earnings DataFrame indexed by 'Earnings Date' in New York time, newest first,
+            as cached from yfinance; quarter end date of each release)
+    """
+    quarters = pd.period_range(start, end, freq='Q')
+    quarter_ends = quarters.end_time.normalize()
+    dates = quarter_ends + pd.to_timedelta(rng.integers(14, 45, len(quarters)), unit='D')
+    # Releases falling on a weekend move to the Monday after
+    dates = dates + pd.to_timedelta(np.select([dates.weekday == 5, dates.weekday == 6], [2, 1], 0), unit='D')
+    keep = dates <= pd.Timestamp(end)
+    dates, quarter_ends = dates[keep], quarter_ends[keep]
+
+    estimate = rng.uniform(0.5, 3.0) * np.exp(np.cumsum(rng.normal(0.0, 0.05, len(dates))))
+    reported = estimate * (1 + rng.normal(0.0, 0.15, len(dates)))
+    earnings_df = pd.DataFrame({
+        'EPS Estimate': estimate.round(2),
+        'Reported EPS': reported.round(2),
+    }, index=(dates + pd.Timedelta(hours=16)).tz_localize('America/New_York').rename('Earnings Date'))
+    earnings_df['Surprise(%)'] = ((earnings_df['Reported EPS'] - earnings_df['EPS Estimate'])
+                                  / earnings_df['EPS Estimate'].abs() * 100)
+    return earnings_df.iloc[::-1], quarter_ends[::-1]
+
+
+def synthetic_bars(rng, days, session=SESSION, releases=None):
+    """
+    5-minute OHLCV bars from a random walk, with a jump on the bar after each release.
+
+    Args:
+        rng: numpy Generator
+        days: Dates to generate bars on
+        session: (first, last) bar time of each day, 'HH:MM'
+        releases: Dict of release date -> reported surprise as a fraction
+
+    Returns:
+        DataFrame: Open/High/Low/Close/Volume indexed by bar time
+    """
+    offsets = pd.timedelta_range(pd.Timedelta(session[0] + ':00'), pd.Timedelta(session[1] + ':00'), freq='5min')
+    days = pd.DatetimeIndex(days).normalize()
+    index = pd.DatetimeIndex((days.values[:, None] + offsets.values[None, :]).ravel())
+
+    returns = rng.normal(0.0, 0.002, len(index))
+    if releases:
+        # The market reacts on the first bar at or after 16:00 on the release date
+        first_after_close = (index.normalize().isin(list(releases))
+                             & (index.hour == 16) & (index.minute == 0))
+        surprises = np.array([releases[day] for day in index.normalize()[first_after_close]])
+        returns[first_after_close] += 0.2 * surprises + rng.normal(0.0, 0.01, len(surprises))
+
+    close = rng.uniform(20, 500) * np.exp(np.cumsum(returns))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    wick = np.abs(rng.normal(0.0, 0.0005, (2, len(index))))
+    return pd.DataFrame({
+        'Open': open_.round(2),
+        'High': (np.maximum(open_, close) * (1 + wick[0])).round(2),
+        'Low': (np.minimum(open_, close) * (1 - wick[1])).round(2),
+        'Close': close.round(2),
+        'Volume': rng.integers(100, 50000, len(index)),
+    }, index=index)
+
+
+def write_bar_csv(stock, bars, data_dir):
+    # Same layout as the CSVs written by DataFetch_Module
+    frame = pd.DataFrame({
+        'ReqId': 0,
+        'ticker': stock,
+        'date': bars.index.strftime('%Y%m%d %H:%M:%S') + ' US/Eastern',
+    })
+    frame = pd.concat([frame, bars.reset_index(drop=True)], axis=1)
+    frame.to_csv(csv_path(stock, data_dir))
+
+
+def generate_dataset(data_dir, tickers=20, years=10, days='earnings', session=SESSION, seed=0,
+                     feather=False):
+    """
+    Writes synthetic bars, earnings dates and predictions for a number of tickers.
+
+    Reuses the data already in data_dir when it was generated with the same settings.
+
+    Args:
+        data_dir: Directory to write to
+        tickers: Number of tickers
+        years: Years of history up to END_DATE
+        days: 'earnings' for bars on release dates only, like the sample CSVs,
+            or 'all' for bars on every trading day
+        session: (first, last) bar time of each day, 'HH:MM'
+        seed: Random seed
+        feather: Also write the Feather copies that load_price_data prefers
+
+    Returns:
+        dict: Settings of the data, with the ticker symbols and max_earnings per ticker
+    """
+    settings = {'tickers': tickers, 'years': years, 'days': days, 'session': list(session), 'seed': seed,
+                'feather': feather, 'end': END_DATE}
+    marker = os.path.join(data_dir, DATA_MARKER)
+    if os.path.exists(marker):
+        with open(marker) as f:
+            stored = json.load(f)
+        if {key: stored.get(key) for key in settings} == settings:
+            print(f"Reusing the synthetic data in {data_dir}")
+            return stored
+
+    os.makedirs(os.path.join(data_dir, PREDICTIONS_DIR), exist_ok=True)
+    cache_path = os.path.join(data_dir, EARNINGS_CACHE)
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+    end = pd.Timestamp(END_DATE)
+    start = end - pd.DateOffset(years=years)
+    rng = np.random.default_rng(seed)
+    max_earnings = 0
+    symbols = ticker_names(tickers)
+    for stock in symbols:
+        earnings_df, quarter_ends = synthetic_earnings(rng, start, end)
+        release_days = earnings_df.index.tz_localize(None).normalize()
+        surprises = dict(zip(release_days, earnings_df['Surprise(%)'].to_numpy() / 100))
+        bar_days = release_days.sort_values() if days == 'earnings' else pd.bdate_range(start, end)
+        write_bar_csv(stock, synthetic_bars(rng, bar_days, session, surprises), data_dir)
+        if feather:
+            convert_price_csv(stock, data_dir)
+        write_cached(stock, earnings_df, len(earnings_df), cache_path)
+        reported = earnings_df['Reported EPS'].to_numpy()
+        pd.DataFrame({
+            'Symbol': stock,
+            'Earnings_Date': quarter_ends.strftime('%Y-%m-%d'),
+            'Predicted_EPS': reported * (1 + rng.normal(0.0, 0.1, len(reported))),
+            'Actual_Reported_EPS': reported,
+        }).to_csv(predictions_path(stock, data_dir), index=False)
+        max_earnings = max(max_earnings, len(earnings_df))
+
+    settings.update(symbols=symbols, max_earnings=max_earnings)
+    with open(marker, "w") as f:
+        json.dump(settings, f)
+    print(f"Generated {tickers} synthetic tickers in {data_dir}")
+    return settings
+
+
+def bench_ticker(stock, engine, data_dir, results_dir, max_earnings, output_format='csv', write_html=False,
+                 verbose=False, analyzers=DEFAULT_ANALYZERS, event_windows=False):
+    """
+    Backtests one synthetic ticker, timing every stage.
+
+    Args:
+        stock: Synthetic stock symbol
+        engine: 'backtrader' or 'vectorized'
+        data_dir: Directory written by generate_dataset
+        results_dir: Base directory for the result files
+        max_earnings: Earnings releases to load
+        output_format: 'csv' or 'json' (see save_backtest_results)
+        write_html: Also render the Plotly HTML charts
+        verbose: Keep the backtest's own output instead of discarding it
+        analyzers: Analyzer profile of the backtrader engine (see backtest.add_analyzers)
+        event_windows: Feed the backtrader engine only the bars around each earnings event
+
+    Returns:
+        dict: Stock, number of after-hours bars and trades, and the stage timings
+    """
+    timer = StageTimer(stock)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if verbose else devnull):
+        with timer.stage('load_price_data'):
+            price_df = load_price_data(stock, base_dir=data_dir)
+        with timer.stage('load_earnings_data'):
+            earnings_df = load_earnings_data(stock, max_earnings, offline=True,
+                                             cache_path=os.path.join(data_dir, EARNINGS_CACHE))
+        if price_df is None or earnings_df is None:
+            raise RuntimeError(f"Synthetic data for {stock} is missing from {data_dir}")
+        with timer.stage('load_predictions'):
+            reg_preds = load_predictions(stock, regression_file=predictions_path(stock, data_dir))
+        with timer.stage('filter_trading_hours'):
+            price_df.index = price_df.index.tz_localize(None)
+            earnings_df.index = earnings_df.index.tz_localize(None)
+            filtered_price_df = filter_trading_hours(price_df)
+
+        if engine == 'backtrader':
+            fed_price_df, flat_days = filtered_price_df, 0
+            if event_windows:
+                with timer.stage('event_windows'):
+                    fed_price_df, flat_days = slice_event_windows(filtered_price_df, earnings_df)
+            result = run_cerebro(fed_price_df, earnings_df, stock,
+                                 regression_file=predictions_path(stock, data_dir), timer=timer,
+                                 analyzers=analyzers, flat_days=flat_days)
+            trade_analysis = result.analyzers.trade_analyzer.get_analysis()
+            sharpe_ratio = strategy_sharpe_ratio(result)
+            metrics = result.analyzers.metrics.get_analysis()
+        elif engine == 'vectorized':
+            with timer.stage('simulate'):
+                result = simulate_trades(filtered_price_df, earnings_df, reg_preds)
+            trade_analysis, sharpe_ratio, metrics = result.trade_analysis, result.sharpe_ratio, result.metrics
+        else:
+            raise ValueError(f"Unknown backtest engine: {engine}")
+
+        with timer.stage('save_results'):
+            save_backtest_results(create_results_dir(stock, results_dir), trade_analysis, sharpe_ratio, result,
+                                  output_format=output_format, write_html=write_html, timer=timer,
+                                  stream_metrics=metrics)
+
+    return {
+        'stock': stock,
+        'bars': len(filtered_price_df),
+        'trades': len(result.df),
+        'timings': timer.stages,
+    }
+
+
+def phase_totals(timings):
+    """
+    Adds up the top-level stages of every ticker into PHASES.
+
+    Args:
+        timings: Dict of ticker -> StageTimer.stages
+
+    Returns:
+        dict: Phase -> summed wall seconds (stages outside PHASES count as 'other')
+    """
+    phase_of = {stage: phase for phase, stages in PHASES.items() for stage in stages}
+    totals = dict.fromkeys([*PHASES, 'other'], 0.0)
+    for stages in timings.values():
+        for s in stages:
+            if '/' not in s['stage']:
+                totals[phase_of.get(s['stage'], 'other')] += s['wall']
+    return totals
+
+
+def run_mode(symbols, engine, runner, data_dir, max_earnings, max_workers=None, output_format='csv',
+             write_html=False, verbose=False, analyzers=DEFAULT_ANALYZERS, event_windows=False):
+    """
+    Backtests every synthetic ticker with one engine and runner.
+
+    Args:
+        symbols: Synthetic stock symbols
+        engine: 'backtrader' or 'vectorized'
+        runner: 'serial' (one ticker after another in this process) or 'parallel' (process pool)
+        data_dir: Directory written by generate_dataset
+        max_earnings: Earnings releases to load per ticker
+        max_workers: Worker processes of the parallel runner (defaults to the CPU count)
+        output_format: 'csv' or 'json' (see save_backtest_results)
+        write_html: Also render the Plotly HTML charts
+        verbose: Keep the backtest's own output
+        analyzers: Analyzer profile of the backtrader engine (see backtest.add_analyzers)
+        event_windows: Feed the backtrader engine only the bars around each earnings event
+
+    Returns:
+        dict: Elapsed wall time, bar throughput, and per-phase and per-stage totals
+    """
+    results_dir = os.path.join(data_dir, "results", f"{engine}_{runner}")
+    task = partial(bench_ticker, engine=engine, data_dir=data_dir, results_dir=results_dir,
+                   max_earnings=max_earnings, output_format=output_format, write_html=write_html,
+                   verbose=verbose, analyzers=analyzers, event_windows=event_windows)
+    start = datetime.datetime.now()
+    if runner == 'serial':
+        results = [task(stock) for stock in symbols]
+    elif runner == 'parallel':
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(task, symbols))
+    else:
+        raise ValueError(f"Unknown runner: {runner}")
+    wall = (datetime.datetime.now() - start).total_seconds()
+
+    timings = {r['stock']: r['timings'] for r in results}
+    bars = sum(r['bars'] for r in results)
+    return {
+        'wall': wall,
+        'bars': bars,
+        'trades': sum(r['trades'] for r in results),
+        'bars_per_second': bars / wall if wall else None,
+        'phases': phase_totals(timings),
+        'stages': stage_totals(timings),
+    }
+
+
+def git_commit():
+    # Commit the benchmark ran on, None outside a git checkout
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                             capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def read_history(history_file=HISTORY_FILE):
+    """
+    Reads every recorded benchmark run, oldest first.
+    """
+    if not os.path.exists(history_file):
+        return []
+    with open(history_file) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def previous_run(config, history_file=HISTORY_FILE):
+    """
+    Last recorded run with the same configuration, or None.
+    """
+    matching = [run for run in read_history(history_file) if run['config'] == config]
+    return matching[-1] if matching else None
+
+
+def print_comparison(run, previous=None):
+    """
+    Prints every mode's wall time and phases, with the ratio to a previous run.
+
+    Args:
+        run: Benchmark run from run_benchmark
+        previous: Earlier run of the same configuration
+    """
+    columns = ['wall', *PHASES]
+    print(f"\n{'Mode':<24}{'Bars/s':>12}" + ''.join(f"{c:>16}" for c in columns))
+    for mode, result in run['modes'].items():
+        before = (previous or {}).get('modes', {}).get(mode)
+        cells = []
+        for column in columns:
+            value = result['wall'] if column == 'wall' else result['phases'][column]
+            cell = f"{value:.3f}"
+            if before:
+                old = before['wall'] if column == 'wall' else before['phases'].get(column, 0.0)
+                if old:
+                    ratio = value / old
+                    cell += f" x{ratio:.2f}" + ("!" if ratio > SLOWER else " ")
+            cells.append(f"{cell:>16}")
+        print(f"{mode:<24}{result['bars_per_second'] or 0:>12.0f}" + ''.join(cells))
+    if previous:
+        print(f"Ratios are to the run of {previous['run_on']} (commit {previous['commit']}); "
+              f"! marks a slowdown above {SLOWER:.0%}")
+    print("Phase times are summed over tickers, so with the parallel runner they exceed the wall time")
+
+
+def run_benchmark(tickers=20, years=10, days='earnings', engines=ENGINES, runners=RUNNERS, max_workers=None,
+                  data_dir=None, seed=0, feather=False, output_format='csv', write_html=False,
+                  history_file=HISTORY_FILE, verbose=False, analyzers=DEFAULT_ANALYZERS, event_windows=False):
+    """
+    Generates (or reuses) synthetic data and benchmarks every engine and runner on it.
+
+    Args:
+        tickers: Number of synthetic tickers
+        years: Years of history per ticker
+        days: 'earnings' or 'all' (see generate_dataset)
+        engines: Engines to benchmark
+        runners: Runners to benchmark
+        max_workers: Worker processes of the parallel runner (defaults to the CPU count)
+        data_dir: Directory for the synthetic data and results (a temporary directory,
+            removed afterwards, when None)
+        seed: Random seed of the data
+        feather: Read the bars from Feather files instead of the CSVs
+        output_format: 'csv' or 'json' (see save_backtest_results)
+        write_html: Also render the Plotly HTML charts
+        history_file: JSON lines file the run is appended to (None to not record it)
+        verbose: Keep the backtest's own output
+        analyzers: Analyzer profile of the backtrader engine (see backtest.add_analyzers)
+        event_windows: Feed the backtrader engine only the bars around each earnings event
+
+    Returns:
+        dict: The benchmark run, as recorded in the history
+    """
+    temporary = data_dir is None
+    data_dir = data_dir or tempfile.mkdtemp(prefix="pead_benchmark_")
+    try:
+        start = datetime.datetime.now()
+        data = generate_dataset(data_dir, tickers, years, days, seed=seed, feather=feather)
+        generate_seconds = (datetime.datetime.now() - start).total_seconds()
+
+        config = {'tickers': tickers, 'years': years, 'days': days, 'seed': seed, 'feather': feather,
+                  'output_format': output_format, 'write_html': write_html,
+                  'workers': max_workers or os.cpu_count(), 'analyzers': analyzers,
+                  'event_windows': event_windows}
+        modes = {}
+        for engine in engines:
+            for runner in runners:
+                print(f"Benchmarking {engine} engine, {runner} runner on {tickers} tickers...")
+                modes[f"{engine}/{runner}"] = run_mode(data['symbols'], engine, runner, data_dir,
+                                                       data['max_earnings'], max_workers, output_format,
+                                                       write_html, verbose, analyzers, event_windows)
+    finally:
+        if temporary:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    run = {
+        'run_on': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'commit': git_commit(),
+        'versions': {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__},
+        'config': config,
+        'generate_seconds': generate_seconds,
+        'modes': modes,
+    }
+    previous = previous_run(config, history_file) if history_file else None
+    print_comparison(run, previous)
+    if history_file:
+        with open(history_file, "a") as f:
+            f.write(json.dumps(run) + "\n")
+        print(f"Benchmark run appended to {history_file}")
+    return run
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the backtest engines on synthetic data.")
+    parser.add_argument('--tickers', type=int, default=20, help="Synthetic tickers (default 20)")
+    parser.add_argument('--years', type=int, default=10, help="Years of history per ticker (default 10)")
+    parser.add_argument('--days', choices=('earnings', 'all'), default='earnings',
+                        help="Bars on release dates only, like the sample CSVs, or on every trading day")
+    parser.add_argument('--engines', nargs='+', choices=ENGINES, default=list(ENGINES))
+    parser.add_argument('--runners', nargs='+', choices=RUNNERS, default=list(RUNNERS))
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes of the parallel runner (defaults to the CPU count)")
+    parser.add_argument('--data-dir', default=None,
+                        help="Keep the synthetic data here and reuse it on later runs (default: temporary)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed of the data")
+    parser.add_argument('--feather', action='store_true', help="Read the bars from Feather files")
+    parser.add_argument('--format', choices=('csv', 'json'), default='csv', dest='output_format',
+                        help="Result files to write (default csv)")
+    parser.add_argument('--html', action='store_true', help="Also render the Plotly HTML charts")
+    parser.add_argument('--analyzers', choices=tuple(ANALYZER_PROFILES), default=DEFAULT_ANALYZERS,
+                        help=f"Analyzer profile of the backtrader engine (default {DEFAULT_ANALYZERS})")
+    parser.add_argument('--event-windows', action='store_true',
+                        help="Feed the backtrader engine only the bars around each earnings event")
+    parser.add_argument('--history', default=HISTORY_FILE, help="JSON lines file runs are recorded in")
+    parser.add_argument('--no-history', action='store_true', help="Do not record or compare the run")
+    parser.add_argument('--verbose', action='store_true', help="Show the backtests' own output")
+    args = parser.parse_args(argv)
+
+    run_benchmark(args.tickers, args.years, args.days, args.engines, args.runners, args.workers,
+                  args.data_dir, args.seed, args.feather, args.output_format, args.html,
+                  None if args.no_history else args.history, args.verbose, args.analyzers,
+                  args.event_windows)
+
+
+if __name__ == "__main__":
+    main()
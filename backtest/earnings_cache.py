@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Local Cache for yfinance Earnings Dates
+
+backtest.py, DataFetch_Module.py and the Task 2 notebook cell all need
+yf.Ticker(symbol).get_earnings_dates(...). This module keeps those tables in a
+small SQLite store keyed by symbol so repeated runs read from local disk:
+
+- Cached entries younger than the TTL are returned without touching the network.
+- Stale or missing entries are refetched from yfinance and written back.
+- In offline mode (offline=True or PEAD_OFFLINE=1) the network is never used and
+  whatever is cached is returned, however old.
+
+The returned DataFrame has the same shape as yfinance's: indexed by a
+timezone-aware 'Earnings Date' in America/New_York.
+"""
+
+import os
+import time
+import sqlite3
+from contextlib import closing
+import pandas as pd
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                  "earnings_cache.sqlite")
+DEFAULT_TTL = 7 * 24 * 60 * 60  # One week, in seconds
+EARNINGS_COLUMNS = ['EPS Estimate', 'Reported EPS', 'Surprise(%)']
+
+
+def is_offline():
+    """
+    Checks whether offline mode is enabled through the PEAD_OFFLINE environment variable.
+
+    Returns:
+        bool: True if the network must not be used
+    """
+    return os.environ.get('PEAD_OFFLINE', '').lower() in ('1', 'true', 'yes')
+
+
+def _connect(cache_path):
+    conn = sqlite3.connect(cache_path, timeout=30)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS earnings_fetches (
+            symbol TEXT PRIMARY KEY,
+            fetched_at REAL NOT NULL,
+            max_earnings INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS earnings_dates (
+            symbol TEXT NOT NULL,
+            earnings_date TEXT NOT NULL,
+            eps_estimate REAL,
+            reported_eps REAL,
+            surprise_pct REAL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_earnings_symbol ON earnings_dates (symbol)")
+    return conn
+
+
+def read_cached(symbol, cache_path=None):
+    """
+    Reads a symbol's cached earnings dates.
+
+    Args:
+        symbol: Stock symbol
+        cache_path: Path to the SQLite cache (defaults to DEFAULT_CACHE_PATH)
+
+    Returns:
+        tuple: (earnings DataFrame, fetch time in epoch seconds, max_earnings fetched)
+            or (None, None, None) if the symbol is not cached
+    """
+    cache_path = cache_path or DEFAULT_CACHE_PATH
+    if not os.path.exists(cache_path):
+        return None, None, None
+
+    with closing(_connect(cache_path)) as conn, conn:
+        meta = conn.execute(
+            "SELECT fetched_at, max_earnings FROM earnings_fetches WHERE symbol = ?", (symbol,)
+        ).fetchone()
+        if meta is None:
+            return None, None, None
+        rows = conn.execute(
+            "SELECT earnings_date, eps_estimate, reported_eps, surprise_pct "
+            "FROM earnings_dates WHERE symbol = ? ORDER BY earnings_date DESC", (symbol,)
+        ).fetchall()
+
+    df = pd.DataFrame(rows, columns=['Earnings Date'] + EARNINGS_COLUMNS)
+    df['Earnings Date'] = pd.to_datetime(df['Earnings Date'], utc=True).dt.tz_convert('America/New_York')
+    df = df.set_index('Earnings Date')
+    return df, meta[0], meta[1]
+
+
+def write_cached(symbol, earnings_df, max_earnings, cache_path=None):
+    """
+    Replaces a symbol's cached earnings dates.
+
+    Args:
+        symbol: Stock symbol
+        earnings_df: DataFrame returned by yfinance's get_earnings_dates
+        max_earnings: Number of earnings releases that were requested
+        cache_path: Path to the SQLite cache (defaults to DEFAULT_CACHE_PATH)
+    """
+    cache_path = cache_path or DEFAULT_CACHE_PATH
+    dates = earnings_df.index.tz_convert('UTC').strftime('%Y-%m-%dT%H:%M:%S+00:00')
+    values = earnings_df.reindex(columns=EARNINGS_COLUMNS).astype(float)
+    rows = [
+        (symbol, date, *[None if pd.isna(v) else v for v in row])
+        for date, row in zip(dates, values.itertuples(index=False, name=None))
+    ]
+
+    with closing(_connect(cache_path)) as conn, conn:
+        conn.execute("DELETE FROM earnings_dates WHERE symbol = ?", (symbol,))
+        conn.executemany("INSERT INTO earnings_dates VALUES (?, ?, ?, ?, ?)", rows)
+        conn.execute(
+            "INSERT OR REPLACE INTO earnings_fetches VALUES (?, ?, ?)",
+            (symbol, time.time(), max_earnings)
+        )
+
+
+def fetch_earnings_dates(symbol, max_earnings=64):
+    """
+    Fetches earnings dates from yfinance over the network.
+
+    Args:
+        symbol: Stock symbol
+        max_earnings: Maximum number of earnings releases to fetch
+
+    Returns:
+        DataFrame: Earnings data as returned by yfinance, or None
+    """
+    import yfinance as yf
+    return yf.Ticker(symbol).get_earnings_dates(max_earnings)
+
+
+def get_earnings_dates(symbol, max_earnings=64, ttl=DEFAULT_TTL, offline=None, cache_path=None):
+    """
+    Gets a symbol's earnings dates, from the local cache when possible.
+
+    Args:
+        symbol: Stock symbol
+        max_earnings: Maximum number of earnings releases to fetch
+        ttl: Age in seconds after which a cached entry is refreshed
+        offline: Never use the network (defaults to the PEAD_OFFLINE environment variable)
+        cache_path: Path to the SQLite cache (defaults to DEFAULT_CACHE_PATH)
+
+    Returns:
+        DataFrame: Earnings data indexed by 'Earnings Date', or None if unavailable
+    """
+    if offline is None:
+        offline = is_offline()
+
+    cached_df, fetched_at, cached_max = read_cached(symbol, cache_path)
+    if cached_df is not None:
+        fresh = time.time() - fetched_at <= ttl and cached_max >= max_earnings
+        if fresh or offline:
+            return cached_df.head(max_earnings)
+    elif offline:
+        print(f"No cached earnings data for {symbol} and offline mode is enabled")
+        return None
+
+    try:
+        earnings_df = fetch_earnings_dates(symbol, max_earnings)
+    except Exception as e:
+        if cached_df is not None:
+            print(f"Error fetching earnings data for {symbol}, using stale cache: {e}")
+            return cached_df.head(max_earnings)
+        raise
+
+    if earnings_df is not None:
+        write_cached(symbol, earnings_df, max_earnings, cache_path)
+    return earnings_df
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Equity Curve Recording and Downsampling
+
+The strategies sample the portfolio value on every bar where a filled position
+is managed. EquityCurve records those samples against their bar timestamps in
+arrays preallocated to the number of bars of the run, instead of growing a list.
+
+For plotting and shipping, long curves are reduced to a fixed number of points:
+
+- 'lttb' (Largest-Triangle-Three-Buckets) keeps the points that preserve the
+  visual shape of the curve.
+- 'minmax' keeps the lowest and highest value of every bucket, so no drawdown
+  or peak is lost.
+
+Both always keep the first and last point and treat the samples as evenly
+spaced, so the months between earnings releases do not dominate the buckets.
+
+StreamingMetrics accumulates the Sharpe ratio, drawdown and win rate of a run
+in one pass over its per-bar portfolio values and closed trades, without
+keeping the per-bar series.
+"""
+
+import math
+import numpy as np
+
+EQUITY_RESOLUTIONS = (500, 2000)  # Points of the downsampled curves written next to the full one
+DOWNSAMPLE_METHOD = 'lttb'
+DAYS_FACTOR = 252  # Matches backtrader's SharpeRatio defaults for TimeFrame.Days
+
+
+class EquityCurve:
+    """
+    Portfolio values recorded against bar timestamps, in preallocated arrays.
+
+    Args:
+        capacity: Number of samples to allocate for (the arrays double if it is exceeded)
+    """
+
+    def __init__(self, capacity=0):
+        self._times = np.empty(max(int(capacity), 1), dtype='datetime64[ns]')
+        self._values = np.empty(max(int(capacity), 1), dtype=float)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, timestamp, value):
+        if self._size == len(self._values):
+            self._times = np.concatenate((self._times, np.empty_like(self._times)))
+            self._values = np.concatenate((self._values, np.empty_like(self._values)))
+        self._times[self._size] = np.datetime64(timestamp, 'ns')
+        self._values[self._size] = value
+        self._size += 1
+
+    @property
+    def times(self):
+        return self._times[:self._size]
+
+    @property
+    def values(self):
+        return self._values[:self._size]
+
+
+class StreamingMetrics:
+    """
+    Sharpe ratio, drawdown and win rate accumulated in one pass over the equity stream.
+
+    Fed the portfolio value of every bar and the net PnL of every closed trade,
+    it keeps only the running peak, the return of each finished day and the
+    trade counts. The results equal those of backtrader's
+    SharpeRatio(timeframe=Days, annualize=True), DrawDown and TradeAnalyzer
+    (a trade is won when its net PnL is not negative).
+
+    Args:
+        start_value: Portfolio value before the first bar
+        riskfreerate: Annual risk-free rate of the Sharpe ratio
+    """
+
+    def __init__(self, start_value, riskfreerate=0.03):
+        self.riskfreerate = riskfreerate
+        self.returns = []   # Return of each finished day over the previous day's close
+        self._day = None
+        self._value = None
+        self._previous_close = float(start_value)
+        self.peak = float('-inf')
+        self.max_drawdown = 0.0
+        self.max_moneydown = 0.0
+        self.won = 0
+        self.lost = 0
+
+    def update(self, day, value):
+        """
+        Adds the portfolio value at the end of one bar.
+
+        Args:
+            day: Calendar day of the bar (bars arrive in time order)
+            value: Portfolio value
+        """
+        if self._day is not None and day != self._day:
+            self.returns.append(self._value / self._previous_close - 1.0)
+            self._previous_close = self._value
+        self._day = day
+        self._value = value
+        self.peak = max(self.peak, value)
+        moneydown = self.peak - value
+        self.max_moneydown = max(self.max_moneydown, moneydown)
+        self.max_drawdown = max(self.max_drawdown, 100.0 * moneydown / self.peak)
+
+    def update_many(self, days, values):
+        """
+        Adds the portfolio values of consecutive bars at once.
+
+        Equivalent to calling update for every bar; the first bars can continue
+        the day of the previous call.
+
+        Args:
+            days: Calendar day of each bar (sorted)
+            values: Portfolio value at each bar
+        """
+        days = np.asarray(days)
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return
+        new_day = np.append(self._day is None or bool(days[0] != self._day), days[1:] != days[:-1])
+        starts = np.flatnonzero(new_day)
+        # Closes of the days the new bars finish, including a day left open by the previous call
+        closes = values[starts[starts > 0] - 1]
+        if self._day is not None and new_day[0]:
+            closes = np.concatenate(([self._value], closes))
+        if len(closes):
+            previous = np.concatenate(([self._previous_close], closes[:-1]))
+            self.returns.extend((closes / previous - 1.0).tolist())
+            self._previous_close = float(closes[-1])
+        self._day = days[-1]
+        self._value = float(values[-1])
+
+        peaks = np.maximum.accumulate(np.concatenate(([self.peak], values)))[1:]
+        moneydown = peaks - values
+        self.peak = float(peaks[-1])
+        self.max_moneydown = max(self.max_moneydown, float(moneydown.max()))
+        self.max_drawdown = max(self.max_drawdown, float((100.0 * moneydown / peaks).max()))
+
+    def add_flat_days(self, days):
+        """
+        Counts days on which the portfolio value did not change and no bars were fed.
+
+        Each adds a zero daily return, as for the days skipped between event windows
+        (see backtest.slice_event_windows).
+        """
+        self.returns.extend([0.0] * int(days))
+
+    def add_trade(self, pnlcomm):
+        """
+        Counts one closed trade by its net PnL.
+        """
+        if pnlcomm >= 0.0:
+            self.won += 1
+        else:
+            self.lost += 1
+
+    def add_trades(self, pnlcomm):
+        """
+        Counts several closed trades by their net PnL.
+        """
+        won = int((np.asarray(pnlcomm, dtype=float) >= 0.0).sum())
+        self.won += won
+        self.lost += len(pnlcomm) - won
+
+    def sharpe_ratio(self):
+        """
+        Annualized Sharpe ratio of the daily returns so far, counting the current day.
+
+        Returns:
+            dict: {'sharperatio': value or None}, like SharpeRatio.get_analysis()
+        """
+        if self._day is None:
+            return {'sharperatio': None}
+        returns = self.returns + [self._value / self._previous_close - 1.0]
+        rate = pow(1.0 + self.riskfreerate, 1.0 / DAYS_FACTOR) - 1.0
+        ret_free = [r - rate for r in returns]
+        ret_free_avg = math.fsum(ret_free) / len(ret_free)
+        retdev = math.sqrt(math.fsum([pow(r - ret_free_avg, 2.0) for r in ret_free]) / len(ret_free))
+        try:
+            ratio = math.sqrt(DAYS_FACTOR) * (ret_free_avg / retdev)
+        except ZeroDivisionError:
+            ratio = None
+        return {'sharperatio': ratio}
+
+    def results(self):
+        """
+        Returns:
+            dict: sharperatio, max_drawdown (%), max_moneydown, won, lost and win_rate (%, None without trades)
+        """
+        closed = self.won + self.lost
+        return {
+            **self.sharpe_ratio(),
+            'max_drawdown': self.max_drawdown,
+            'max_moneydown': self.max_moneydown,
+            'won': self.won,
+            'lost': self.lost,
+            'win_rate': self.won / closed * 100 if closed else None,
+        }
+
+
+def lttb_indices(values, max_points):
+    """
+    Positions of the points Largest-Triangle-Three-Buckets keeps.
+
+    Args:
+        values: Series values
+        max_points: Maximum number of points to keep
+
+    Returns:
+        ndarray: Sorted positions, including the first and last
+    """
+    y = np.asarray(values, dtype=float)
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    if max_points < 3:
+        return np.array([0, n - 1][:max_points])
+
+    # max_points - 2 buckets between the fixed first and last point
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    keep = np.empty(max_points, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = (next_lo + next_hi - 1) / 2.0
+        avg_y = y[next_lo:next_hi].mean()
+        xs = np.arange(lo, hi)
+        # Twice the area of the triangle (a, candidate, next bucket average)
+        area = np.abs((a - avg_x) * (y[lo:hi] - y[a]) - (a - xs) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def minmax_indices(values, max_points):
+    """
+    Positions of the lowest and highest value in each of max_points / 2 buckets.
+
+    Args:
+        values: Series values
+        max_points: Maximum number of points to keep
+
+    Returns:
+        ndarray: Sorted positions, including the first and last
+    """
+    y = np.asarray(values, dtype=float)
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    if max_points < 4:
+        return np.array([0, n - 1][:max_points])
+    buckets = max_points // 2 - 1
+    edges = np.linspace(0, n, buckets + 1).astype(int)
+    keep = [0, n - 1]
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        keep.append(lo + int(np.argmin(y[lo:hi])))
+        keep.append(lo + int(np.argmax(y[lo:hi])))
+    return np.unique(keep)
+
+
+DOWNSAMPLERS = {
+    'lttb': lttb_indices,
+    'minmax': minmax_indices,
+}
+
+
+def downsample_equity(times, values, max_points, method=DOWNSAMPLE_METHOD):
+    """
+    Reduces an equity curve to at most max_points points.
+
+    Args:
+        times: Sample timestamps
+        values: Portfolio values
+        max_points: Maximum number of points to keep
+        method: 'lttb' or 'minmax'
+
+    Returns:
+        tuple: (times, values) of the kept points
+    """
+    if method not in DOWNSAMPLERS:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    keep = DOWNSAMPLERS[method](values, max_points)
+    return np.asarray(times)[keep], np.asarray(values, dtype=float)[keep]
@@ -0,0 +1,574 @@
+#!/usr/bin/env python3
+"""
+Feature Pipeline for the Earnings Regression
+
+Tasks 1-3 of CleanPEADReg.ipynb as importable stages, run per symbol:
+
+    clean       financial_statements/{SYMBOL}_{income_statement,balance_sheet,cash_flow}.csv
+                -> merged_financials/{SYMBOL}_merged_financials.csv
+                -> merged_financials_cleaned/{SYMBOL}_merged_financials_cleaned.csv
+    earnings    cleaned financials + earnings dates (earnings_cache)
+                -> final_finance_data/{SYMBOL}_final_finance_data.csv
+    regression  correlation and VIF feature selection, EPS shifted by a quarter
+                -> regression_data/{SYMBOL}_regression_data.csv
+
+Each stage of each symbol is cached: the SHA-256 of its input files (and of the
+earnings table), its parameters and the hashes of its outputs are recorded in
+feature_pipeline_cache.json, and the stage is skipped while they all match. A
+stage's outputs are the next stage's inputs, so changing one symbol's
+statements recomputes only that symbol's downstream stages, and a rerun that
+reproduces identical bytes stops the recomputation there. Symbols are processed
+in parallel worker processes.
+
+    python feature_pipeline.py                       # every symbol in financial_statements
+    python feature_pipeline.py NVDA GS --force       # selected symbols, ignoring the cache
+    python feature_pipeline.py --stages regression   # only the last stage
+"""
+
+import os
+import glob
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+
+from earnings_cache import get_earnings_dates
+from manifest import frame_fingerprint
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_FILE = "feature_pipeline_cache.json"
+STAGES = ('clean', 'earnings', 'regression')
+
+MISSING_CUTOFF = 0.10   # Statement columns with more missing values are dropped
+N_EARNINGS = 64         # Earnings dates to fetch per symbol
+THRESHOLD_CORR = 0.10   # Min absolute correlation with the target to keep a feature
+VIF_THRESHOLD = 10.0    # Max variance inflation factor of a kept feature
+TARGET_COLUMN = 'Surprise(%)'
+
+STAGE_PARAMS = {
+    'clean': {'missing_cutoff': MISSING_CUTOFF},
+    'earnings': {'n_earnings': N_EARNINGS},
+    'regression': {'threshold_corr': THRESHOLD_CORR, 'vif_threshold': VIF_THRESHOLD, 'target': TARGET_COLUMN},
+}
+
+
+def stage_paths(symbol, base_dir=BASE_DIR):
+    """
+    Input and output files of every stage for a symbol.
+
+    Args:
+        symbol: Stock symbol
+        base_dir: Repository root holding the data folders
+
+    Returns:
+        dict: File paths by name
+    """
+    return {
+        'income': os.path.join(base_dir, "financial_statements", f"{symbol}_income_statement.csv"),
+        'balance': os.path.join(base_dir, "financial_statements", f"{symbol}_balance_sheet.csv"),
+        'cash_flow': os.path.join(base_dir, "financial_statements", f"{symbol}_cash_flow.csv"),
+        'merged': os.path.join(base_dir, "merged_financials", f"{symbol}_merged_financials.csv"),
+        'cleaned': os.path.join(base_dir, "merged_financials_cleaned", f"{symbol}_merged_financials_cleaned.csv"),
+        'final': os.path.join(base_dir, "final_finance_data", f"{symbol}_final_finance_data.csv"),
+        'regression': os.path.join(base_dir, "regression_data", f"{symbol}_regression_data.csv"),
+    }
+
+
+def list_symbols(base_dir=BASE_DIR):
+    """
+    Symbols that have an income statement in financial_statements.
+
+    Returns:
+        list: Sorted stock symbols
+    """
+    pattern = os.path.join(base_dir, "financial_statements", "*_income_statement.csv")
+    return sorted(os.path.basename(path)[:-len("_income_statement.csv")] for path in glob.glob(pattern))
+
+
+def file_hash(path):
+    """
+    SHA-256 of a file's contents.
+
+    Args:
+        path: File path
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# TASK 1: cleaning and merging the financial statements
+
+def clean_individual_df(df, cutoff=MISSING_CUTOFF):
+    """
+    Cleans a statement DataFrame by:
+      - Dropping columns with > cutoff missing values (except the fiscal date column).
+      - Converting the fiscal date column (if present) to datetime and renaming it to "date".
+      - Forward-filling missing values.
+      - Converting numeric columns (excluding "date") to int64 where every value is a finite number.
+    """
+    missing_prcnt = df.isnull().mean()
+    cols_to_drop = [col for col in missing_prcnt[missing_prcnt > cutoff].index if col != 'fiscalDateEnding']
+    df = df.drop(columns=cols_to_drop)
+
+    if 'fiscalDateEnding' in df.columns:
+        df['date'] = pd.to_datetime(df['fiscalDateEnding'])
+        df = df.drop(columns=['fiscalDateEnding'])
+    elif 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'])
+
+    df = df.ffill()
+
+    # Columns that convert without error; the others stay as they are
+    value_cols = [col for col in df.columns if col != 'date']
+    numeric = df[value_cols].apply(pd.to_numeric, errors='coerce')
+    convertible = np.isfinite(numeric.astype(float)).all()
+    int_cols = convertible[convertible].index
+    df[int_cols] = numeric[int_cols].astype('int64')
+    return df
+
+
+def merge_statements(income_df, balance_df, cashflow_df):
+    """
+    Inner-joins the cleaned balance sheet, income statement and cash flow on "date".
+
+    Columns present in several statements are kept once (the balance sheet's copy).
+    """
+    merged_df = pd.merge(pd.merge(balance_df, income_df, on="date", how="inner"),
+                         cashflow_df, on="date", how="inner")
+
+    # Remove duplicate columns created during the merge (with _x and _y suffixes)
+    for col in list(merged_df.columns):
+        if '_x' in col:
+            base_col = col.replace('_x', '')
+            if base_col + '_y' in merged_df.columns:
+                merged_df = merged_df.drop(columns=[base_col + '_y'])
+            merged_df = merged_df.rename(columns={col: base_col})
+    return merged_df
+
+
+def final_cleaning(df):
+    """
+    Final cleaning: Convert all columns (except "date") to numeric and fill any remaining NaNs.
+    """
+    value_cols = [col for col in df.columns if col != 'date']
+    df = df.copy()
+    df[value_cols] = df[value_cols].apply(pd.to_numeric, errors='coerce')
+    df = df.ffill().bfill()
+    if df.isnull().sum().sum() > 0:
+        print("Warning: There are still missing values after final cleaning!")
+    return df
+
+
+def run_clean(symbol, paths, missing_cutoff=MISSING_CUTOFF):
+    """
+    TASK 1 for one symbol: writes the merged and the cleaned financials.
+
+    Returns:
+        list: Output file paths
+    """
+    drop_cols = ['Unnamed: 0', 'reportedCurrency']
+    statements = [clean_individual_df(pd.read_csv(paths[name]).drop(columns=drop_cols, errors='ignore'), missing_cutoff)
+                  for name in ('income', 'balance', 'cash_flow')]
+    merged_df = merge_statements(*statements)
+
+    os.makedirs(os.path.dirname(paths['merged']), exist_ok=True)
+    os.makedirs(os.path.dirname(paths['cleaned']), exist_ok=True)
+    merged_df.to_csv(paths['merged'], index=False)
+    final_cleaning(merged_df).to_csv(paths['cleaned'], index=False)
+    print(f"{symbol}: Merged file saved to {paths['merged']}")
+    print(f"{symbol}: Final cleaned file saved to {paths['cleaned']}")
+    return [paths['merged'], paths['cleaned']]
+
+
+# TASK 2: attaching earnings dates, EPS estimates, reported EPS and surprise %
+
+def load_past_earnings(symbol, n_earnings=N_EARNINGS):
+    """
+    Earnings dates up to today, with a timezone-naive "date" column.
+
+    Returns:
+        DataFrame: Earnings dates, or None if none could be fetched (an offline
+            cache miss or a yfinance failure)
+    """
+    earnings_df = get_earnings_dates(symbol, n_earnings)
+    if earnings_df is None:
+        print(f"{symbol}: no earnings dates available")
+        return None
+    today = pd.Timestamp.now(tz='America/New_York').normalize()
+    earnings_df = earnings_df[earnings_df.index <= today].reset_index()
+    earnings_df = earnings_df.rename(columns={earnings_df.columns[0]: 'date'})
+    earnings_df['date'] = pd.to_datetime(earnings_df['date']).dt.tz_localize(None)
+    return earnings_df
+
+
+def merge_earnings(finance_df, earnings_df):
+    """
+    Attaches to every quarter the first earnings release on or after its end date.
+    """
+    finance_df = finance_df.copy()
+    finance_df['date'] = pd.to_datetime(finance_df['date']).dt.tz_localize(None)
+    return pd.merge_asof(finance_df.sort_values(by='date'), earnings_df.sort_values(by='date'),
+                         on='date', direction='forward')
+
+
+def run_earnings(symbol, paths, n_earnings=N_EARNINGS, earnings_df=None):
+    """
+    TASK 2 for one symbol: writes the final finance data.
+
+    Returns:
+        list: Output file paths, empty if there are no earnings dates
+    """
+    if earnings_df is None:
+        earnings_df = load_past_earnings(symbol, n_earnings)
+    if earnings_df is None:
+        return []
+    final_df = merge_earnings(pd.read_csv(paths['cleaned']), earnings_df)
+    os.makedirs(os.path.dirname(paths['final']), exist_ok=True)
+    final_df.to_csv(paths['final'], index=False)
+    print(f"{symbol}: Final merged file saved to {paths['final']}")
+    return [paths['final']]
+
+
+# TASK 3: feature selection and the shifted EPS target
+
+def _vif_design(df, features):
+    # Features as floats, with inf and NaN replaced by the column mean
+    X = df[features].apply(pd.to_numeric, errors='coerce')
+    X = X.replace([np.inf, -np.inf], np.nan)
+    return X.fillna(X.mean()).to_numpy(dtype=float)
+
+
+def correlation_matrix(X):
+    """
+    Correlation matrix of the columns of X that vary.
+
+    Args:
+        X: 2-D array of observations x features
+
+    Returns:
+        tuple: (correlation matrix, boolean mask of the varying columns)
+    """
+    varying = X.std(axis=0) > 0
+    return np.atleast_2d(np.corrcoef(X[:, varying], rowvar=False)), varying
+
+
+def _eigen(corr):
+    # Eigendecomposition plus the mask of (numerically) zero eigenvalues
+    eigvals, eigvecs = np.linalg.eigh(corr)
+    return eigvals, eigvecs, eigvals <= eigvals.max() * len(corr) * np.finfo(float).eps
+
+
+def correlation_vif(corr):
+    """
+    VIFs from a correlation matrix: the diagonal of its inverse.
+
+    Features that are an exact linear combination of others (a zero eigenvalue
+    of corr) get an infinite VIF, as their R^2 is 1.
+
+    Args:
+        corr: Correlation matrix of the features
+
+    Returns:
+        ndarray: VIF per feature
+    """
+    eigvals, eigvecs, null = _eigen(corr)
+    vif = (eigvecs[:, ~null] ** 2) @ (1.0 / eigvals[~null])
+    collinear = (eigvecs[:, null] ** 2).sum(axis=1) > np.sqrt(np.finfo(float).eps)
+    vif[collinear] = np.inf
+    return vif
+
+
+def full_rank_inverse(corr):
+    """
+    Inverse of a correlation matrix, or None if it is singular.
+    """
+    eigvals, eigvecs, null = _eigen(corr)
+    if null.any():
+        return None
+    return (eigvecs / eigvals) @ eigvecs.T
+
+
+def drop_from_inverse(inv, k):
+    """
+    Inverse correlation matrix after removing feature k, from the one before.
+
+    Removing a row and column from a symmetric matrix changes its inverse by a
+    rank-one update of the remaining block, so this costs O(p^2) instead of a
+    new O(p^3) inversion.
+
+    Args:
+        inv: Inverse correlation matrix
+        k: Position of the feature to remove
+
+    Returns:
+        ndarray: Inverse correlation matrix of the remaining features
+    """
+    keep = np.arange(len(inv)) != k
+    return inv[np.ix_(keep, keep)] - np.outer(inv[keep, k], inv[k, keep]) / inv[k, k]
+
+
+def calculate_vif(df, features):
+    """
+    Calculate VIF for a set of features in df.
+
+    The VIF of a feature is 1 / (1 - R^2) of its regression on the other features
+    and a constant, which is the feature's diagonal entry of the inverse
+    correlation matrix, so every VIF comes from one decomposition. Features with
+    no variance get NaN.
+    """
+    vif = np.full(len(features), np.nan)
+    if features:
+        corr, varying = correlation_matrix(_vif_design(df, features))
+        vif[varying] = correlation_vif(corr)
+    return pd.Series(vif, index=features)
+
+
+def reduce_multicollinearity(df, features, vif_threshold=VIF_THRESHOLD):
+    """
+    Iteratively remove the feature with the highest VIF until all features are below vif_threshold.
+
+    The correlation matrix is decomposed once; while it is singular the exactly
+    collinear features (infinite VIF) are dropped first, after which its inverse
+    is updated in place of a new inversion for every dropped feature.
+    """
+    features = features.copy()
+    if not features:
+        return features, calculate_vif(df, features)
+    corr, varying = correlation_matrix(_vif_design(df, features))
+    names = [f for f, v in zip(features, varying) if v]
+    inv = full_rank_inverse(corr)
+    while names:
+        vif = np.diag(inv) if inv is not None else correlation_vif(corr)
+        i = int(np.argmax(vif))
+        if not vif[i] > vif_threshold:
+            break
+        print(f"   Dropping '{names[i]}' with VIF = {vif[i]:.2f}")
+        features.remove(names.pop(i))
+        keep = np.arange(len(corr)) != i
+        corr = corr[np.ix_(keep, keep)]
+        inv = drop_from_inverse(inv, i) if inv is not None else full_rank_inverse(corr)
+    return features, calculate_vif(df, features)
+
+
+def build_regression_data(finance_df, symbol, threshold_corr=THRESHOLD_CORR, vif_threshold=VIF_THRESHOLD,
+                          target_column=TARGET_COLUMN):
+    """
+    Selects the regression features for one symbol and adds the next quarter's reported EPS.
+
+    Returns:
+        DataFrame: Regression data, or None if it cannot be built
+    """
+    # Newest quarter first, without the date
+    if 'date' in finance_df.columns:
+        finance_df = finance_df.assign(date=pd.to_datetime(finance_df['date']))
+        finance_df = finance_df.sort_values(by='date', ascending=False).drop(columns=['date'])
+    else:
+        print(f"Warning: No date column found for {symbol}")
+
+    try:
+        correlations = finance_df.corr()[target_column].drop(target_column)
+    except Exception as e:
+        print(f"Error computing correlations for {symbol}: {e}")
+        return None
+
+    sorted_corr = correlations.abs().sort_values(ascending=False)
+    top_labels = sorted_corr[sorted_corr > threshold_corr].index.tolist()
+
+    # Fallback: if fewer than 3 features remain, use all available numeric columns (exclude target, Reported EPS)
+    if len(top_labels) < 3:
+        print(f"{symbol}: Only {len(top_labels)} features passed correlation filter. Using fallback features.")
+        numeric_cols = finance_df.select_dtypes(include=[np.number]).columns.tolist()
+        top_labels = [col for col in numeric_cols if col not in [target_column, 'Reported EPS']]
+
+    print(f"{symbol}: Features correlated with target (>|{threshold_corr}|): {top_labels}")
+
+    if 'Reported EPS' not in finance_df.columns:
+        print(f"   'Reported EPS' column not found for {symbol}. Skipping.")
+        return None
+    selected_columns = list(dict.fromkeys([target_column] + top_labels + ['Reported EPS']))
+    reduced_data = finance_df[selected_columns].copy()
+
+    candidate_features = [f for f in top_labels if f != 'Reported EPS']
+    final_features, vif_series = reduce_multicollinearity(reduced_data, candidate_features, vif_threshold)
+    print(f"   Final independent features after VIF filtering: {final_features}")
+
+    reduced_data = reduced_data[[target_column] + final_features + ['Reported EPS']].copy()
+    reduced_data['Reported EPS'] = reduced_data['Reported EPS'].ffill().bfill()
+
+    # Target: the reported EPS of the following quarter (the row above, newest first)
+    reduced_data['Shift_Reported_EPS'] = reduced_data['Reported EPS'].shift(1)
+    reduced_data = reduced_data.drop(index=reduced_data.index[0])
+    if reduced_data['Shift_Reported_EPS'].isnull().any():
+        print(f"Warning: {symbol} still has NaN in Shift_Reported_EPS after shifting.")
+    return reduced_data.drop(columns=['Reported EPS'])
+
+
+def run_regression(symbol, paths, threshold_corr=THRESHOLD_CORR, vif_threshold=VIF_THRESHOLD,
+                   target=TARGET_COLUMN):
+    """
+    TASK 3 for one symbol: writes the regression data.
+
+    Returns:
+        list: Output file paths, empty if the data could not be built
+    """
+    reduced_data = build_regression_data(pd.read_csv(paths['final']), symbol, threshold_corr, vif_threshold, target)
+    if reduced_data is None:
+        return []
+    os.makedirs(os.path.dirname(paths['regression']), exist_ok=True)
+    reduced_data.to_csv(paths['regression'], index=False)
+    print(f"   Regression data for {symbol} saved to {paths['regression']}")
+    return [paths['regression']]
+
+
+def _stage_inputs(stage, symbol, paths):
+    # Fingerprints of a stage's inputs, plus whatever the stage needs that is not a file
+    if stage == 'clean':
+        return {name: file_hash(paths[name]) for name in ('income', 'balance', 'cash_flow')}, {}
+    if stage == 'earnings':
+        earnings_df = load_past_earnings(symbol, STAGE_PARAMS['earnings']['n_earnings'])
+        if earnings_df is None:
+            return None, {}
+        inputs = {'cleaned': file_hash(paths['cleaned']), 'earnings': frame_fingerprint(earnings_df)}
+        return inputs, {'earnings_df': earnings_df}
+    return {'final': file_hash(paths['final'])}, {}
+
+
+def _is_cached(entry, inputs, params, base_dir):
+    if entry is None or entry.get('inputs') != inputs or entry.get('params') != params:
+        return False
+    for rel_path, digest in entry.get('outputs', {}).items():
+        path = os.path.join(base_dir, rel_path)
+        if not os.path.exists(path) or file_hash(path) != digest:
+            return False
+    return bool(entry.get('outputs'))
+
+
+def run_symbol(symbol, base_dir=BASE_DIR, stages=STAGES, cache=None, force=False):
+    """
+    Runs the pipeline stages for one symbol, skipping stages whose inputs are unchanged.
+
+    Args:
+        symbol: Stock symbol
+        base_dir: Repository root holding the data folders
+        stages: Stages to run, in pipeline order
+        cache: Cache entries from previous runs (see run_pipeline)
+        force: Rerun every stage regardless of the cache
+
+    Returns:
+        dict: Updated cache entries of the stages that ran
+    """
+    cache = cache or {}
+    paths = stage_paths(symbol, base_dir)
+    runners = {'clean': run_clean, 'earnings': run_earnings, 'regression': run_regression}
+    updated = {}
+    for stage in (s for s in STAGES if s in stages):
+        key = f"{stage}/{symbol}"
+        params = STAGE_PARAMS[stage]
+        try:
+            inputs, extra = _stage_inputs(stage, symbol, paths)
+            if inputs is None:
+                print(f"{symbol}: skipping {stage} and later stages")
+                break
+            if not force and _is_cached(cache.get(key), inputs, params, base_dir):
+                print(f"{symbol}: {stage} is up to date")
+                continue
+            outputs = runners[stage](symbol, paths, **params, **extra)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"{symbol}: {stage} failed: {e}")
+            break
+        if not outputs:
+            break
+        updated[key] = {
+            'inputs': inputs,
+            'params': params,
+            'outputs': {os.path.relpath(path, base_dir): file_hash(path) for path in outputs},
+        }
+    return updated
+
+
+def read_cache(base_dir=BASE_DIR):
+    """
+    Reads the pipeline cache.
+
+    Returns:
+        dict: Cache entries keyed by 'stage/SYMBOL'
+    """
+    path = os.path.join(base_dir, CACHE_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable pipeline cache {path}: {e}")
+        return {}
+
+
+def run_pipeline(symbols=None, base_dir=BASE_DIR, stages=STAGES, max_workers=None, force=False):
+    """
+    Runs the pipeline for several symbols in parallel.
+
+    Args:
+        symbols: Stock symbols (defaults to every symbol in financial_statements)
+        base_dir: Repository root holding the data folders
+        stages: Stages to run, in pipeline order
+        max_workers: Number of worker processes (defaults to the CPU count)
+        force: Rerun every stage regardless of the cache
+
+    Returns:
+        dict: Cache entries of the stages that ran
+    """
+    symbols = symbols or list_symbols(base_dir)
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown pipeline stages: {sorted(unknown)}")
+    cache = read_cache(base_dir)
+
+    updated = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(run_symbol, symbol, base_dir, stages,
+                                   {k: v for k, v in cache.items() if k.endswith(f"/{symbol}")}, force): symbol
+                   for symbol in symbols}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                updated.update(future.result())
+            except Exception as e:
+                print(f"Error running the pipeline for {symbol}: {e}")
+
+    # Written by the parent only, so workers never race on the file
+    cache.update(updated)
+    with open(os.path.join(base_dir, CACHE_FILE), "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    print(f"Pipeline finished: {len(updated)} stage runs for {len(symbols)} symbols")
+    return updated
+
+
+def main(argv=None):
+    """
+    Runs the feature pipeline from the command line.
+
+    Args:
+        argv: Command line arguments (defaults to sys.argv)
+    """
+    parser = argparse.ArgumentParser(description="Clean statements, attach earnings and build regression data.")
+    parser.add_argument('symbols', nargs='*', help="Stock symbols (defaults to every symbol in financial_statements)")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES), help="Stages to run")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (defaults to the CPU count)")
+    parser.add_argument('--force', action='store_true', help="Ignore the cache and rerun every stage")
+    parser.add_argument('--base-dir', default=BASE_DIR, help="Repository root holding the data folders")
+    args = parser.parse_args(argv)
+
+    run_pipeline(args.symbols, args.base_dir, args.stages, args.workers, args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -34,15 +34,23 @@ function getColorForSharpe(sharpe) {
     return '#f87171';
 }
 
+// Equity curve x values are 'YYYY-MM-DD HH:MM:SS' bar timestamps (bar numbers in older results)
+function parseEquityX(x) {
+    return /^\d+$/.test(String(x)) ? parseInt(x) : Date.parse(String(x).replace(' ', 'T'));
+}
+
 async function loadequityCSV(path) {
     const res = await fetch(path);
+    if (!res.ok) {
+        throw new Error(`${path}: ${res.status}`);
+    }
     const text = await res.text();
 
     // Skip header and split each line into [timestamp, value]
     const rows = text.trim().split('\n').slice(1); // remove header
     return rows.map(row => {
         const [x, y] = row.split(',');
-        return { x: parseInt(x), y: parseFloat(y) };
+        return { x: parseEquityX(x), y: parseFloat(y) };
     });
 }
 
@@ -80,8 +88,82 @@ function parseSummaryFile(content) {
     return data;
 }
 
-// Function to load stock data from summary files
+// Load the run index (results/index.json.gz or results/index.json) written by backtest.py
+async function loadResultsIndex() {
+    if (typeof DecompressionStream !== 'undefined') {
+        try {
+            const response = await fetch('results/index.json.gz');
+            if (response.ok) {
+                const bytes = new Uint8Array(await response.arrayBuffer());
+                // Servers that send Content-Encoding: gzip hand us the decompressed JSON already
+                if (bytes[0] === 0x1f && bytes[1] === 0x8b) {
+                    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+                    return JSON.parse(await new Response(stream).text());
+                }
+                return JSON.parse(new TextDecoder().decode(bytes));
+            }
+        } catch (error) {
+            console.warn('Could not load results/index.json.gz, trying results/index.json:', error);
+        }
+    }
+    try {
+        const response = await fetch('results/index.json');
+        if (response.ok) {
+            return await response.json();
+        }
+    } catch (error) {
+        console.warn('Could not load results/index.json:', error);
+    }
+    return null;
+}
+
+// Build one stockData entry from a ticker's results in the index
+function stockFromIndexEntry(ticker, entry) {
+    const summary = entry.summary;
+    const columns = entry.trades.columns;
+    const trades = entry.trades.data.map(row => {
+        const trade = {};
+        columns.forEach((column, i) => { trade[column] = row[i]; });
+        return trade;
+    });
+
+    return {
+        name: ticker,
+        ticker: ticker,
+        fromIndex: true,
+        sharpe: summary.sharpe_ratio || 0,
+        totalTrades: summary.total_trades || 0,
+        winRate: summary.win_rate || 0,
+        netPnL: summary.net_pnl || 0,
+        wonTrades: summary.won_trades || 0,
+        lostTrades: summary.lost_trades || 0,
+        streaks: {
+            currentWin: summary.won_streak_current || 0,
+            longestWin: summary.won_streak_longest || 0,
+            currentLoss: summary.lost_streak_current || 0,
+            longestLoss: summary.lost_streak_longest || 0
+        },
+        equity: entry.equity_curve.map(([x, y]) => ({ x: parseEquityX(x), y: y })),
+
+        trades: trades
+    };
+}
+
+// Function to load stock data, from the run index when there is one
 async function loadStockData() {
+    const index = await loadResultsIndex();
+    if (index) {
+        const stockData = {};
+        for (const ticker of index.tickers) {
+            stockData[ticker] = stockFromIndexEntry(ticker, index.results[ticker]);
+        }
+        return stockData;
+    }
+    return loadStockDataFromFiles();
+}
+
+// Function to load stock data from summary files
+async function loadStockDataFromFiles() {
     const tickers = ['NVDA', 'GOOGL', 'GS', 'GME', 'MSFT'];
     const stockData = {};
 
@@ -145,17 +227,28 @@ function parseTradeEntriesCSV(csvText) {
 async function initDashboard() {
     
     window.stockData = await loadStockData();
+    addStockOptions();
     
     // Then initialize the rest of the dashboard
     updateOverviewCards();
     createSharpeComparisonChart();
     await createWinLossChart();
-    updateStockDetails('NVDA');
+    updateStockDetails(stockSelect.value in window.stockData ? stockSelect.value : Object.keys(window.stockData)[0]);
     updateComparisonTable();
     createComparisonChart('sharpe');
     addEventListeners();
 }
 
+// Add select options for tickers in the results that the page does not list
+function addStockOptions() {
+    const listed = new Set(Array.from(stockSelect.options).map(option => option.value));
+    Object.keys(window.stockData).forEach(ticker => {
+        if (!listed.has(ticker)) {
+            stockSelect.add(new Option(ticker, ticker));
+        }
+    });
+}
+
 
 function updateOverviewCards() {
     
@@ -310,6 +403,12 @@ function createSharpeComparisonChart() {
 
 // Load trade outcomes from CSV
 async function loadTradeOutcomes(ticker) {
+    const stock = window.stockData[ticker];
+    if (stock && stock.fromIndex) {
+        const total = stock.wonTrades + stock.lostTrades;
+        const winRate = total > 0 ? (stock.wonTrades / total) * 100 : 0;
+        return { winRate: winRate, lossRate: 100 - winRate };
+    }
     try {
         const response = await fetch(`results/${ticker}/${ticker}_backtest_results/trade_outcomes.csv`);
         const text = await response.text();
@@ -412,7 +511,16 @@ async function createWinLossChart() {
 
 // Equity Chart Function 
 async function createNewEquityChart(ticker){
-    const data = await loadequityCSV(`results/${ticker}/${ticker}_backtest_results/equity_curve.csv`);
+    const stock = window.stockData[ticker];
+    // Without the index, prefer the 500-point downsampled curve over the full one
+    let data = stock && stock.equity;
+    if (!data) {
+        const base = `results/${ticker}/${ticker}_backtest_results`;
+        data = await loadequityCSV(`${base}/equity_curve_500.csv`)
+            .catch(() => loadequityCSV(`${base}/equity_curve.csv`));
+    }
+    // Bar numbers are small integers, timestamps are epoch milliseconds
+    const timestamped = data.length > 0 && data[0].x > 1e11;
     // Dynamically color based on trend
     const start = data[0].y;
     const end = data[data.length - 1].y;
@@ -446,7 +554,7 @@ async function createNewEquityChart(ticker){
             enabled: false 
         },
         xaxis: {
-            type: 'numeric',
+            type: timestamped ? 'datetime' : 'numeric',
             title: { text: 'Date' }
         },
         yaxis: {
@@ -473,20 +581,25 @@ async function createNewEquityChart(ticker){
 // Create Trade Outcomes chart
 async function createTradeOutcomesChart(ticker) {
     try {
-        
-        const response = await fetch(`results/${ticker}/${ticker}_backtest_results/trade_outcomes.csv`);
-        const text = await response.text();
-        const rows = text.trim().split('\n').slice(1); // Skip header
-        
+        const stock = window.stockData[ticker];
         let wonTrades = 0;
         let lostTrades = 0;
         
-        // Parse CSV data
-        rows.forEach(row => {
-            const [outcome, count] = row.split(',');
-            if (outcome === 'Won') wonTrades = parseFloat(count) || 0;
-            if (outcome === 'Lost') lostTrades = parseFloat(count) || 0;
-        });
+        if (stock && stock.fromIndex) {
+            wonTrades = stock.wonTrades;
+            lostTrades = stock.lostTrades;
+        } else {
+            const response = await fetch(`results/${ticker}/${ticker}_backtest_results/trade_outcomes.csv`);
+            const text = await response.text();
+            const rows = text.trim().split('\n').slice(1); // Skip header
+            
+            // Parse CSV data
+            rows.forEach(row => {
+                const [outcome, count] = row.split(',');
+                if (outcome === 'Won') wonTrades = parseFloat(count) || 0;
+                if (outcome === 'Lost') lostTrades = parseFloat(count) || 0;
+            });
+        }
 
         const options = {
             series: [wonTrades, lostTrades],
@@ -532,6 +645,10 @@ async function createTradeOutcomesChart(ticker) {
 
 // Load streaks data from CSV
 async function loadStreaksData(ticker) {
+    const stock = window.stockData[ticker];
+    if (stock && stock.fromIndex) {
+        return stock.streaks;
+    }
     try {
         const response = await fetch(`results/${ticker}/${ticker}_backtest_results/streaks_data.csv`);
         const text = await response.text();
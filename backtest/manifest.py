@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Results Manifest for Incremental Backtests
+
+Every backtest run records, next to a ticker's results directory, a manifest.json
+holding fingerprints of its inputs (price bars, earnings data, regression
+predictions and strategy parameters) and of the requested outputs (result
+format, HTML charts), and a backtest_state.pkl holding what is
+needed to return or extend the results without replaying the history:
+
+- If every fingerprint matches, the ticker is skipped and the stored results are
+  returned as they are.
+- If only bars and earnings events after the last simulated bar were added (and
+  the previous run ended flat), the vectorized engine simulates just the new bars
+  and appends them to the stored state.
+
+Fingerprints are SHA-256 digests of pandas' per-row hashes, so they do not
+depend on whether the bars came from the CSV, Feather file or dataset.
+"""
+
+import os
+import json
+import hashlib
+import pandas as pd
+
+MANIFEST_FILE = "manifest.json"
+STATE_FILE = "backtest_state.pkl"
+
+
+def frame_fingerprint(df):
+    """
+    Fingerprints the contents of a DataFrame, including its index and column names.
+
+    Args:
+        df: DataFrame (or None)
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    if df is not None:
+        digest.update(','.join(map(str, df.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def params_fingerprint(params):
+    """
+    Fingerprints a dict of strategy parameters.
+
+    Args:
+        params: JSON-serializable parameter dict
+
+    Returns:
+        str: Hex digest
+    """
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def input_fingerprints(price_df, earnings_df, reg_preds, params, outputs=None):
+    """
+    Fingerprints every input of a backtest.
+
+    Args:
+        price_df: Filtered price data
+        earnings_df: Earnings data
+        reg_preds: Regression predictions for the stock
+        params: Strategy and broker parameters, including the engine name
+        outputs: Options deciding which result files are written (output_format,
+            write_html), so a run asking for other files is not skipped
+
+    Returns:
+        dict: Fingerprint per input
+    """
+    fingerprints = {
+        'price': frame_fingerprint(price_df),
+        'earnings': frame_fingerprint(earnings_df),
+        'predictions': frame_fingerprint(reg_preds.reset_index(drop=True)),
+        'params': params_fingerprint(params),
+    }
+    if outputs is not None:
+        fingerprints['outputs'] = params_fingerprint(outputs)
+    return fingerprints
+
+
+def _stock_dir(results_dir):
+    return os.path.dirname(os.path.normpath(results_dir))
+
+
+def read_manifest(results_dir):
+    """
+    Reads the manifest of a ticker's previous run.
+
+    Args:
+        results_dir: Results directory returned by create_results_dir
+
+    Returns:
+        dict: Manifest, or None if there is none
+    """
+    path = os.path.join(_stock_dir(results_dir), MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable manifest {path}: {e}")
+        return None
+
+
+def read_state(results_dir):
+    """
+    Reads the stored state of a ticker's previous run.
+
+    Args:
+        results_dir: Results directory returned by create_results_dir
+
+    Returns:
+        dict: State written by write_manifest, or None if it cannot be read
+    """
+    path = os.path.join(_stock_dir(results_dir), STATE_FILE)
+    try:
+        return pd.read_pickle(path)
+    except Exception as e:
+        print(f"Ignoring unreadable backtest state {path}: {e}")
+        return None
+
+
+def write_manifest(results_dir, manifest, state):
+    """
+    Writes a ticker's manifest and state after a run.
+
+    Args:
+        results_dir: Results directory returned by create_results_dir
+        manifest: JSON-serializable manifest (fingerprints and run metadata)
+        state: Picklable results state
+    """
+    stock_dir = _stock_dir(results_dir)
+    pd.to_pickle(state, os.path.join(stock_dir, STATE_FILE))
+    # Written last, so a manifest never points at a missing or older state
+    with open(os.path.join(stock_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def is_unchanged(manifest, fingerprints, results_dir, output_files=("summary.txt",)):
+    """
+    Checks whether a ticker's results are up to date with its inputs.
+
+    Args:
+        manifest: Manifest from read_manifest (or None)
+        fingerprints: Current input_fingerprints
+        results_dir: Results directory returned by create_results_dir
+        output_files: Result files that must exist in results_dir
+
+    Returns:
+        bool: True if the stored results can be reused as they are
+    """
+    return (
+        manifest is not None
+        and manifest.get('fingerprints') == fingerprints
+        and all(os.path.exists(os.path.join(results_dir, name)) for name in output_files)
+        and os.path.exists(os.path.join(_stock_dir(results_dir), STATE_FILE))
+    )
+
+
+def stored_result(stock, results_dir, state):
+    """
+    Builds a run_backtest-style result dict from stored state.
+
+    Args:
+        stock: Stock symbol
+        results_dir: Results directory returned by create_results_dir
+        state: State from read_state
+
+    Returns:
+        dict: Results of the backtest
+    """
+    return {
+        'stock': stock,
+        'sharpe_ratio': state['sharpe_ratio']['sharperatio'],
+        'trade_analysis': state['trade_analysis'],
+        'results_dir': results_dir,
+        'trade_entries': state['df'],
+    }
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Portfolio-Level Earnings Announcement Backtest
+
+backtest.py runs every stock in its own Cerebro with its own $10,000, which hides
+capital contention, correlated drawdowns and portfolio-level risk. This module
+adds all stocks' after-hours feeds to one Cerebro with a single shared broker:
+
+- PortfolioEarningsStrategy keeps the entry/exit state of EarningsTradingStrategy
+  per data feed, so positions in several stocks can be open at the same time.
+  Both strategies take their parameters and entry/exit rules from strategy.py.
+- Each feed gets its own earnings and regression prediction index, built once.
+- Orders the shared broker cannot fund are logged as REJECTED and the stock's
+  slot is freed for its next earnings release.
+
+The combined trade log, equity curve and analyzers are written with
+save_backtest_results to frontend/results/PORTFOLIO/PORTFOLIO_backtest_results.
+"""
+
+import datetime
+import pandas as pd
+
+from backtest import (
+    build_earnings_index,
+    build_prediction_index,
+    create_results_dir,
+    filter_date_range,
+    filter_trading_hours,
+    load_earnings_data,
+    load_price_data,
+    lookup_closest_prediction,
+    save_backtest_results,
+)
+from equity import EquityCurve
+from regression_models import load_predictions
+
+PORTFOLIO_NAME = "PORTFOLIO"
+_STRATEGY = None  # PortfolioEarningsStrategy, once portfolio_strategy has defined it
+
+
+def portfolio_strategy():
+    """
+    Returns PortfolioEarningsStrategy, defining it on first use.
+
+    backtrader is imported here rather than at module level, as in strategy.py,
+    so importing this module does not load it.
+    """
+    global _STRATEGY
+    if _STRATEGY is not None:
+        return _STRATEGY
+    import backtrader as bt
+    from strategy import TRADE_PARAMS, blended_surprise, entry_direction, exit_reason, position_size
+
+    class PortfolioEarningsStrategy(bt.Strategy):
+        """
+        EarningsTradingStrategy applied to every data feed of a shared-broker Cerebro.
+
+        Each feed must be named after its stock; earnings_data maps stock symbols
+        to their earnings DataFrames and reg_preds holds the regression predictions
+        of all stocks.
+        """
+
+        params = TRADE_PARAMS + (
+            ('earnings_data', None),  # Dict of stock symbol -> earnings DataFrame
+            ('reg_preds', None),      # Regression predictions for all stocks
+        )
+
+        def __init__(self):
+            # next() runs at most once per bar of any feed
+            self.equity = EquityCurve(sum(data.buflen() for data in self.datas))
+            self.records = []
+            self.state = {}
+            for data in self.datas:
+                stock = data._name
+                reg_preds = self.p.reg_preds
+                if reg_preds is not None:
+                    reg_preds = reg_preds[reg_preds['Symbol'] == stock]
+                pred_dates, pred_values = build_prediction_index(reg_preds)
+                self.state[data] = {
+                    'stock': stock,
+                    'earnings_by_date': build_earnings_index((self.p.earnings_data or {}).get(stock)),
+                    'pred_dates': pred_dates,
+                    'pred_values': pred_values,
+                    'seen': 0,          # Bars of this feed processed so far
+                    'order': None,      # Entry order of the open position
+                    'entry_price': None,
+                    'bar_count': 0,
+                    'is_long': None,
+                }
+
+        @property
+        def df(self):
+            """
+            Trade log in the same shape as EarningsTradingStrategy.df, plus the stock.
+            """
+            return pd.DataFrame(self.records, columns=['datetime', 'ticker', 'price', 'signal', 'closed'])
+
+        @property
+        def portfolio_value(self):
+            return self.equity.values
+
+        @property
+        def equity_times(self):
+            return self.equity.times
+
+        def _record(self, data, price, state, closed):
+            current_dt = datetime.datetime.combine(data.datetime.date(), data.datetime.time())
+            signal = 'BUY' if state['is_long'] else 'SELL'
+            self.records.append((current_dt, state['stock'], price, signal, closed))
+
+        def notify_order(self, order):
+            state = self.state[order.data]
+            # Notifications carry a copy of the order, so match on its reference
+            entry_order = state['order']
+            if entry_order is not None and order.ref == entry_order.ref and order.status in (order.Canceled, order.Margin, order.Rejected):
+                print(f"{state['stock']}: entry order {order.getstatusname()}")
+                self._record(order.data, state['entry_price'], state, 'REJECTED')
+                state['order'] = None
+
+        def prenext(self):
+            # Feeds start at different dates; without this, no bar is processed before the latest-starting feed's first bar
+            self.next()
+
+        def next(self):
+            holding = False
+            for data in self.datas:
+                state = self.state[data]
+                # With several feeds, next() also runs for bars of the other feeds
+                if len(data) > state['seen']:
+                    state['seen'] = len(data)
+                    holding = self._next_for_data(data, state) or holding
+
+            # Sampled on bars where a filled position is managed, as in EarningsTradingStrategy
+            if holding:
+                self.equity.append(self.datetime.datetime(0), self.broker.getvalue())
+
+        def _next_for_data(self, data, state):
+            """
+            Runs the entry and exit rules for one feed's new bar.
+
+            Returns:
+                bool: True if a filled position in this stock was managed on the bar
+            """
+            current_time = data.datetime.time()
+            current_date = data.datetime.date()
+
+            if datetime.time(16, 0) <= current_time <= datetime.time(16, 10) and not state['order']:
+                earnings = state['earnings_by_date'].get(current_date)
+                if earnings is not None:
+                    predicted_eps_value = lookup_closest_prediction(state['pred_dates'], state['pred_values'],
+                                                                    pd.Timestamp(current_date))
+                    estimated_eps, reported_eps = earnings
+                    surprise = blended_surprise(estimated_eps, reported_eps, predicted_eps_value,
+                                                self.p.regression_weight)
+
+                    # Calculate position size based on $1,000 trade limit
+                    current_price = data.close[0]
+                    size = position_size(current_price, self.p.max_trade_value)
+                    if size <= 0:
+                        print(f"Skipping {state['stock']} trade on {current_date}: Position size is zero or negative.")
+                        return False
+
+                    is_long = entry_direction(surprise, self.p.surprise_threshold)
+                    if is_long is not None:
+                        # Set before the order so a rejection notification can record the entry
+                        state['is_long'] = is_long
+                        state['entry_price'] = current_price
+                        state['bar_count'] = 0
+                        print(f"{state['stock']}: {'LONG' if is_long else 'SHORT'} ENTRY at {current_price:.2f} on {current_date}")
+                        self._record(data, current_price, state, 'OPENED')
+                        state['order'] = (self.buy if is_long else self.sell)(data=data, size=size)
+
+            order = state['order']
+            if order and order.status == bt.Order.Completed:
+                state['bar_count'] += 1
+                price = data.close[0]
+                closed = exit_reason(state['is_long'], state['entry_price'], price, state['bar_count'], self.p)
+                if closed is None:
+                    return True
+
+                print(f"{state['stock']}: closing {'Long' if state['is_long'] else 'Short'} ({closed})")
+                self._record(data, price, state, closed)
+                self.close(data=data)
+                state['order'] = None
+                return True
+            return False
+
+    _STRATEGY = PortfolioEarningsStrategy
+    return _STRATEGY
+
+
+def __getattr__(name):
+    # PortfolioEarningsStrategy is defined on first use, so backtrader is only loaded by a portfolio run
+    if name == 'PortfolioEarningsStrategy':
+        return portfolio_strategy()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def run_portfolio_backtest(stocks, cash=10000.0, commission=0.001, output_format='csv', write_html=True,
+                           predictions='full', start=None, end=None, **strategy_params):
+    """
+    Run one backtest over several stocks sharing a single broker.
+
+    Args:
+        stocks: List of stock symbols
+        cash: Starting cash of the shared broker
+        commission: Commission as a fraction of traded value
+        output_format: 'csv' or 'json' (see save_backtest_results)
+        write_html: Also render the Plotly HTML charts
+        predictions: Regression prediction set, 'full' or walk-forward (see regression_models)
+        start: First date to trade (defaults to each stock's first bar)
+        end: Last date to trade (defaults to each stock's last bar)
+        **strategy_params: Overrides for PortfolioEarningsStrategy parameters
+
+    Returns:
+        dict: Results of the backtest, in the same shape as run_backtest plus
+            the stocks that were included and the drawdown analysis
+    """
+    print(f"Running portfolio backtest for {', '.join(stocks)}...")
+    import backtrader as bt
+    import backtrader.analyzers as btanalyzers
+
+    cerebro = bt.Cerebro()
+    earnings_data = {}
+    for stock in stocks:
+        price_df = load_price_data(stock)
+        earnings_df = load_earnings_data(stock)
+        if price_df is None or earnings_df is None:
+            print(f"Leaving {stock} out of the portfolio due to missing data.")
+            continue
+        price_df.index = price_df.index.tz_localize(None)
+        earnings_df.index = earnings_df.index.tz_localize(None)
+        filtered_price_df = filter_date_range(filter_trading_hours(price_df), start, end)
+        if len(filtered_price_df) == 0:
+            print(f"Leaving {stock} out of the portfolio: no bars in the date range.")
+            continue
+        earnings_data[stock] = earnings_df
+        cerebro.adddata(bt.feeds.PandasData(dataname=filtered_price_df, datetime=None), name=stock)
+
+    if not earnings_data:
+        print("Cannot run portfolio backtest: no stock has both price and earnings data.")
+        return None
+
+    reg_preds = load_predictions(predictions=predictions)
+    cerebro.addstrategy(portfolio_strategy(), earnings_data=earnings_data, reg_preds=reg_preds,
+                        **strategy_params)
+
+    # One broker for every stock
+    cerebro.broker.setcash(cash)
+    cerebro.broker.setcommission(commission=commission)
+
+    cerebro.addanalyzer(btanalyzers.SharpeRatio, _name='mysharpe', riskfreerate=0.03, timeframe=bt.TimeFrame.Days, annualize=True)
+    cerebro.addanalyzer(btanalyzers.DrawDown, _name='drawdown')
+    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name='trade_analyzer')
+
+    thestrat = cerebro.run()[0]
+
+    sharpe_ratio = thestrat.analyzers.mysharpe.get_analysis()
+    trade_analysis = thestrat.analyzers.trade_analyzer.get_analysis()
+    drawdown = thestrat.analyzers.drawdown.get_analysis()
+
+    print(f"Portfolio Sharpe Ratio:", sharpe_ratio['sharperatio'])
+    print(f"Portfolio Max Drawdown: {drawdown['max']['drawdown']:.2f}%")
+
+    results_dir = create_results_dir(PORTFOLIO_NAME)
+    save_backtest_results(results_dir, trade_analysis, sharpe_ratio, thestrat,
+                          output_format=output_format, write_html=write_html)
+
+    return {
+        'stock': PORTFOLIO_NAME,
+        'stocks': list(earnings_data),
+        'sharpe_ratio': sharpe_ratio['sharperatio'],
+        'trade_analysis': trade_analysis,
+        'drawdown': drawdown,
+        'results_dir': results_dir,
+        'trade_entries': thestrat.df
+    }
+
+
+if __name__ == "__main__":
+    run_portfolio_backtest(['NVDA', 'GOOGL', 'GS', 'GME', 'MSFT'])
@@ -0,0 +1,676 @@
+#!/usr/bin/env python3
+"""
+Batched Earnings Regression Models
+
+Task 4 of CleanPEADReg.ipynb: one OLS model per symbol regressing the next
+quarter's reported EPS (Shift_Reported_EPS in regression_data) on the symbol's
+selected features, scored on every earnings date in final_finance_data.
+
+All symbols are fitted in one stacked least-squares pass: each symbol's design
+matrix (intercept first, then its features) is zero-padded to a common shape,
+the columns are scaled to unit norm and the pseudo-inverses of the whole stack
+are computed by a single batched call. Padded columns get a zero coefficient,
+so every symbol gets its own OLS fit: for a full-rank design it is the fit
+statsmodels' OLS computes, and for a rank-deficient one it is the minimum-norm
+solution of the unit-norm-scaled problem, which is not statsmodels' pinv
+solution. Predictions for all symbols are then one stacked product.
+
+Coefficients, the feature names, the training means used to fill missing
+predictors and the scored predictions are saved to regression_models.npz.
+The backtest reads predictions from there with load_predictions, which keeps
+the store in memory for the life of the process, instead of rereading
+regression_predictions_new.csv on every run. The store is a generated cache:
+load_predictions fits it when it is missing, and the CSV is used only when
+there is no data to fit it from.
+
+Those 'full' predictions come from models fitted on the whole history, so a
+backtest blending them into the surprise sees the future. The store also holds
+walk-forward predictions made point in time: the model used on an earnings
+date is fitted only on quarters whose target EPS was reported by that date,
+either all of them ('walk_forward') or the most recent N ('walk_forward_N').
+The coefficients are carried from one date to the next with rank-one recursive
+least-squares updates (and downdates for the quarter leaving a rolling window),
+with a pseudo-inverse refit whenever a window is too ill-conditioned to invert.
+Dates with fewer prior quarters than coefficients get no prediction (NaN).
+The features themselves are still those Task 3 selected on the full history.
+
+    python regression_models.py                 # every symbol in regression_data
+    python regression_models.py NVDA GS         # selected symbols
+    python regression_models.py --windows 0 20  # expanding and 20-quarter walk-forward sets
+"""
+
+import os
+import glob
+import argparse
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+from shared_data import attach_frames
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_STORE = "regression_models.npz"
+PREDICTIONS_CSV = "regression_predictions_new.csv"
+
+TARGET = 'Shift_Reported_EPS'
+EXCLUDED_PREDICTORS = ('Surprise(%)',)  # Not known before the release being predicted
+PREDICTION_COLUMNS = ['Symbol', 'Earnings_Date', 'Predicted_EPS', 'Actual_Reported_EPS']
+RCOND = 1e-15  # Relative singular value cutoff, as statsmodels' pinv uses
+
+FULL_HISTORY = 'full'
+WALK_FORWARD_WINDOWS = (None, 24, 40)  # Quarters per walk-forward fit, None for every prior quarter
+WALK_FORWARD_METHOD = 'rls'
+RLS_RCOND = 1e-5  # Smallest relative singular value of a window carried by the recursion
+
+
+def list_model_symbols(base_dir=BASE_DIR):
+    """
+    Symbols that have regression data.
+
+    Returns:
+        list: Sorted stock symbols
+    """
+    pattern = os.path.join(base_dir, "regression_data", "*_regression_data.csv")
+    return sorted(os.path.basename(path)[:-len("_regression_data.csv")] for path in glob.glob(pattern))
+
+
+def load_training_data(symbol, base_dir=BASE_DIR):
+    """
+    Loads a symbol's predictors and target from regression_data.
+
+    Args:
+        symbol: Stock symbol
+        base_dir: Repository root holding the data folders
+
+    Returns:
+        tuple: (predictor DataFrame, target Series), or None if unavailable
+    """
+    path = os.path.join(base_dir, "regression_data", f"{symbol}_regression_data.csv")
+    try:
+        reg_data = pd.read_csv(path)
+    except Exception as e:
+        print(f"Error reading regression file for {symbol}: {e}")
+        return None
+    if TARGET not in reg_data.columns:
+        print(f"{symbol}: '{TARGET}' not found. Skipping.")
+        return None
+    X = reg_data.drop(columns=[TARGET])
+    X = X.drop(columns=[col for col in EXCLUDED_PREDICTORS if col in X.columns])
+    return X, reg_data[TARGET]
+
+
+def load_scoring_data(symbol, base_dir=BASE_DIR):
+    """
+    Loads a symbol's earnings-date rows from final_finance_data, oldest first.
+
+    Args:
+        symbol: Stock symbol
+        base_dir: Repository root holding the data folders
+
+    Returns:
+        DataFrame: Rows with a parsed 'date' column, or None if unavailable
+    """
+    path = os.path.join(base_dir, "final_finance_data", f"{symbol}_final_finance_data.csv")
+    try:
+        final_df = pd.read_csv(path)
+    except Exception as e:
+        print(f"Error reading final finance file for {symbol}: {e}")
+        return None
+    if "date" not in final_df.columns:
+        print(f"Warning: 'date' column not found for {symbol} in final finance data.")
+        return None
+    final_df["date"] = pd.to_datetime(final_df["date"], errors='coerce')
+    return final_df.sort_values(by="date", ascending=True)
+
+
+def numeric_columns(frame, names):
+    """
+    Columns of a DataFrame as a float array, NaN where a column is missing or a value is not numeric.
+
+    Args:
+        frame: DataFrame
+        names: Column names
+
+    Returns:
+        ndarray: (rows, len(names)) values
+    """
+    X = frame.reindex(columns=names)
+    text = [name for name, dtype in X.dtypes.items() if dtype == object]
+    if text:
+        X[text] = X[text].apply(pd.to_numeric, errors='coerce')
+    return X.to_numpy(dtype=float)
+
+
+def batched_lstsq(X, y, rcond=RCOND):
+    """
+    Least-squares solutions of a stack of problems in one pass.
+
+    The columns are scaled to unit norm before the pseudo-inverse is taken, so a
+    full-rank problem gets its OLS solution and a rank-deficient one the
+    minimum-norm solution in the scaled coordinates (not of the raw design).
+
+    Args:
+        X: (problems, rows, columns) design matrices, zero-padded
+        y: (problems, rows) targets, zero where X is padded
+        rcond: Relative cutoff for small singular values
+
+    Returns:
+        ndarray: (problems, columns) coefficients
+    """
+    # Unit-norm columns make the raw statements (billions) and per-share figures comparable
+    scale = np.sqrt(np.einsum('snk,snk->sk', X, X))
+    scale[scale == 0] = 1.0
+    pinv = np.linalg.pinv(X / scale[:, None, :], rcond=rcond)
+    return np.einsum('skn,sn->sk', pinv, y) / scale
+
+
+def prediction_set_name(window=None):
+    """
+    Name of a walk-forward prediction set.
+
+    Args:
+        window: Quarters per fit, None for every prior quarter
+
+    Returns:
+        str: 'walk_forward' or 'walk_forward_<window>'
+    """
+    return 'walk_forward' if window is None else f'walk_forward_{int(window)}'
+
+
+def _rls_start(Z, y):
+    # Pseudo-inverse fit of a window, with the inverse Gram matrix when it is well enough conditioned
+    scale = np.sqrt(np.einsum('nk,nk->k', Z, Z))
+    scale[scale == 0] = 1.0
+    u, s, vt = np.linalg.svd(Z / scale, full_matrices=False)
+    keep = s > RCOND * s[0]
+    # Solved with the window's own unit-norm columns, like batched_lstsq, so a singular
+    # window gets the same minimum-norm solution as a refit
+    beta = vt[keep].T @ ((u[:, keep].T @ y) / s[keep]) / scale
+    if len(s) < Z.shape[1] or s[-1] <= RLS_RCOND * s[0]:
+        return beta, None
+    vt = vt / scale
+    return beta, (vt.T / s**2) @ vt
+
+
+def _rls_update(P, beta, x, y, sign):
+    # Adds (sign=1) or removes (sign=-1) one row; None if removing it leaves the window singular
+    Px = P @ x
+    denominator = 1.0 + sign * (x @ Px)
+    if denominator <= RLS_RCOND:
+        return None, beta
+    P = P - sign * np.outer(Px, Px) / denominator
+    return P, beta + sign * (P @ x) * (y - x @ beta)
+
+
+def walk_forward_coefficients(X, y, window=None, min_obs=None, method=WALK_FORWARD_METHOD):
+    """
+    Point-in-time OLS coefficients for every step of an expanding or rolling window.
+
+    Step i is fitted on rows [i - window, i) (every row before i when window is
+    None), so it only sees rows that precede it.
+
+    Args:
+        X: (rows, columns) design matrix in time order, intercept included
+        y: (rows,) targets
+        window: Number of most recent rows per fit, None for every prior row
+        min_obs: Fewest rows to fit on (defaults to, and is at least, the number of columns)
+        method: 'rls' for recursive least-squares updates or 'refit' for a pseudo-inverse fit per step
+
+    Returns:
+        ndarray: (rows + 1, columns) coefficients, NaN for steps with fewer than min_obs rows
+    """
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n, k = X.shape
+    min_obs = max(min_obs or k, k)
+    lows = np.zeros(n + 1, dtype=int) if window is None else np.maximum(np.arange(n + 1) - window, 0)
+    steps = [i for i in range(n + 1) if i - lows[i] >= min_obs]
+    coef = np.full((n + 1, k), np.nan)
+    if not steps:
+        return coef
+
+    if method == 'refit':
+        rows = max(i - lows[i] for i in steps)
+        design = np.zeros((len(steps), rows, k))
+        target = np.zeros((len(steps), rows))
+        for s, i in enumerate(steps):
+            design[s, :i - lows[i]] = X[lows[i]:i]
+            target[s, :i - lows[i]] = y[lows[i]:i]
+        coef[steps] = batched_lstsq(design, target)
+        return coef
+    if method != 'rls':
+        raise ValueError(f"Unknown walk-forward method: {method}")
+
+    # Columns scaled by their size in the first window, which is known when the recursion starts
+    first = steps[0]
+    scale = np.sqrt(np.mean(X[lows[first]:first] ** 2, axis=0))
+    scale[scale == 0] = 1.0
+    Z = X / scale
+    P, beta = None, None
+    for i in range(first, n + 1):
+        lo = lows[i]
+        if P is not None:
+            P, beta = _rls_update(P, beta, Z[i - 1], y[i - 1], 1)
+        if P is not None and lo > lows[i - 1]:
+            P, beta = _rls_update(P, beta, Z[lo - 1], y[lo - 1], -1)
+        if P is None:
+            beta, P = _rls_start(Z[lo:i], y[lo:i])
+        coef[i] = beta / scale
+    return coef
+
+
+def walk_forward_predictions(datasets, frames, window=None, min_obs=None, method=WALK_FORWARD_METHOD):
+    """
+    Point-in-time predictions for every earnings date of several symbols.
+
+    The model used on an earnings date is fitted only on the quarters before
+    it, whose next-quarter EPS (the target) has been reported by that date.
+    Missing predictors are filled with the mean of the same quarters.
+
+    Args:
+        datasets: Dict of symbol -> (predictor DataFrame, target Series), newest quarter first
+        frames: Dict of symbol -> final finance DataFrame (with 'date', oldest first)
+        window: Quarters per fit, None for every prior quarter
+        min_obs: Fewest quarters to fit on (defaults to the number of coefficients)
+        method: 'rls' or 'refit' (see walk_forward_coefficients)
+
+    Returns:
+        DataFrame: Predictions with PREDICTION_COLUMNS, NaN where there is no model yet
+    """
+    symbols, dates, predictions, actuals = [], [], [], []
+    for symbol, (X, y) in datasets.items():
+        final_df = frames.get(symbol)
+        if final_df is None:
+            continue
+        # Task 3 drops the newest quarter, which has no next-quarter EPS yet
+        if len(final_df) != len(X) + 1 or final_df['date'].isna().any():
+            print(f"{symbol}: regression data does not line up with the final finance data dates. Skipping.")
+            continue
+        n, features = len(X), list(X.columns)
+        train = X.iloc[::-1].to_numpy(dtype=float)
+        design = np.column_stack([np.ones(n), train])
+        coef = walk_forward_coefficients(design, y.iloc[::-1].to_numpy(dtype=float), window, min_obs, method)
+
+        # Mean of the quarters each step is fitted on, for filling missing predictors
+        lows = np.zeros(n + 1, dtype=int) if window is None else np.maximum(np.arange(n + 1) - window, 0)
+        sums = np.vstack([np.zeros(len(features)), np.cumsum(train, axis=0)])
+        counts = np.maximum(np.arange(n + 1) - lows, 1)[:, None]
+        means = (sums - sums[lows]) / counts
+
+        scoring = numeric_columns(final_df, features)
+        scoring = np.where(np.isnan(scoring), means, scoring)
+        symbols.append(np.full(n + 1, symbol, dtype=object))
+        dates.append(final_df['date'].to_numpy(dtype='datetime64[ns]'))
+        predictions.append(coef[:, 0] + np.einsum('ik,ik->i', scoring, coef[:, 1:]))
+        actuals.append(numeric_columns(final_df, ['Reported EPS'])[:, 0])
+    if not symbols:
+        return pd.DataFrame(columns=PREDICTION_COLUMNS)
+    return pd.DataFrame({
+        'Symbol': np.concatenate(symbols),
+        'Earnings_Date': np.concatenate(dates),
+        'Predicted_EPS': np.concatenate(predictions),
+        'Actual_Reported_EPS': np.concatenate(actuals),
+    })
+
+
+class ModelStore:
+    """
+    Per-symbol regression coefficients and their scored predictions.
+
+    Coefficients are kept against the union of all symbols' features, with a
+    zero coefficient (and fill value) for features a symbol does not use.
+
+    Args:
+        symbols: Stock symbols, one model each
+        features: Names of all features used by any model
+        intercept: (symbols,) intercepts
+        coef: (symbols, features) coefficients
+        fill: (symbols, features) training means substituted for missing predictors
+        used: (symbols, features) whether a model uses a feature
+        prediction_sets: Dict of set name ('full', 'walk_forward', ...) -> DataFrame with PREDICTION_COLUMNS
+    """
+
+    def __init__(self, symbols, features, intercept, coef, fill, used, prediction_sets=None):
+        self.symbols = list(symbols)
+        self.features = list(features)
+        self.intercept = np.asarray(intercept, dtype=float)
+        self.coef = np.asarray(coef, dtype=float)
+        self.fill = np.asarray(fill, dtype=float)
+        self.used = np.asarray(used, dtype=bool)
+        self.prediction_sets = dict(prediction_sets or {})
+        self._row = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self._by_symbol = {}
+
+    @property
+    def predictions(self):
+        """Predictions of the full-history models, None before scoring."""
+        return self.prediction_sets.get(FULL_HISTORY)
+
+    @classmethod
+    def fit(cls, datasets):
+        """
+        Fits every symbol's OLS model in one stacked least-squares pass.
+
+        Args:
+            datasets: Dict of symbol -> (predictor DataFrame, target Series)
+
+        Returns:
+            ModelStore: The fitted models
+        """
+        symbols = list(datasets)
+        features = sorted(set().union(*(X.columns for X, _ in datasets.values())))
+        position = {name: j for j, name in enumerate(features)}
+        rows = max(len(X) for X, _ in datasets.values())
+        width = max(X.shape[1] for X, _ in datasets.values()) + 1
+
+        # Each symbol's columns are left-aligned in the stack: intercept, then its features
+        design = np.zeros((len(symbols), rows, width))
+        target = np.zeros((len(symbols), rows))
+        for i, symbol in enumerate(symbols):
+            X, y = datasets[symbol]
+            design[i, :len(X), 0] = 1.0
+            design[i, :len(X), 1:X.shape[1] + 1] = X.to_numpy(dtype=float)
+            target[i, :len(X)] = y.to_numpy(dtype=float)
+        solution = batched_lstsq(design, target)
+
+        coef = np.zeros((len(symbols), len(features)))
+        fill = np.zeros((len(symbols), len(features)))
+        used = np.zeros((len(symbols), len(features)), dtype=bool)
+        for i, symbol in enumerate(symbols):
+            X, _ = datasets[symbol]
+            cols = [position[name] for name in X.columns]
+            coef[i, cols] = solution[i, 1:X.shape[1] + 1]
+            fill[i, cols] = X.mean().to_numpy(dtype=float)
+            used[i, cols] = True
+        return cls(symbols, features, solution[:, 0], coef, fill, used)
+
+    def _design(self, symbol, frame):
+        # Union-space predictors of a symbol's rows, missing ones filled with the training mean
+        i = self._row[symbol]
+        names = [name for name, use in zip(self.features, self.used[i]) if use]
+        X = numeric_columns(frame, names)
+        design = np.zeros((len(frame), len(self.features)))
+        design[:, self.used[i]] = np.where(np.isnan(X), self.fill[i, self.used[i]], X)
+        return design
+
+    def predict(self, symbol, frame):
+        """
+        Predicts EPS for rows of a symbol's finance data.
+
+        Args:
+            symbol: Stock symbol with a fitted model
+            frame: DataFrame holding the model's predictors (missing ones are filled)
+
+        Returns:
+            ndarray: Predicted EPS per row
+        """
+        i = self._row[symbol]
+        return self.intercept[i] + self._design(symbol, frame) @ self.coef[i]
+
+    def score(self, frames):
+        """
+        Predicts EPS for every row of several symbols in one stacked product.
+
+        Args:
+            frames: Dict of symbol -> final finance DataFrame (with 'date', oldest first)
+
+        Returns:
+            DataFrame: Predictions with PREDICTION_COLUMNS, also kept as the 'full' set
+        """
+        frames = {symbol: frame for symbol, frame in frames.items() if symbol in self._row}
+        if not frames:
+            return self.add_predictions(FULL_HISTORY, pd.DataFrame(columns=PREDICTION_COLUMNS))
+        rows = np.concatenate([np.full(len(frame), self._row[symbol]) for symbol, frame in frames.items()])
+        design = np.concatenate([self._design(symbol, frame) for symbol, frame in frames.items()])
+        predicted = self.intercept[rows] + np.einsum('pk,pk->p', design, self.coef[rows])
+
+        return self.add_predictions(FULL_HISTORY, pd.DataFrame({
+            'Symbol': [self.symbols[i] for i in rows],
+            'Earnings_Date': np.concatenate([frame['date'].to_numpy(dtype='datetime64[ns]')
+                                             for frame in frames.values()]),
+            'Predicted_EPS': predicted,
+            'Actual_Reported_EPS': np.concatenate([
+                frame['Reported EPS'].to_numpy(dtype=float) if 'Reported EPS' in frame.columns
+                else np.full(len(frame), np.nan) for frame in frames.values()]),
+        }))
+
+    def add_predictions(self, name, predictions):
+        """
+        Stores a set of predictions under a name, replacing any set of that name.
+
+        Args:
+            name: Set name, 'full' or a prediction_set_name
+            predictions: DataFrame with PREDICTION_COLUMNS
+
+        Returns:
+            DataFrame: The predictions
+        """
+        self.prediction_sets[name] = predictions
+        self._by_symbol.pop(name, None)
+        return predictions
+
+    def symbol_predictions(self, symbol, name=FULL_HISTORY):
+        """
+        One symbol's predictions from a set.
+
+        Args:
+            symbol: Stock symbol
+            name: Set name, 'full' or a prediction_set_name
+
+        Returns:
+            DataFrame: Predictions with PREDICTION_COLUMNS (empty if the symbol has none)
+        """
+        if name not in self.prediction_sets:
+            raise ValueError(f"No '{name}' predictions in the model store")
+        predictions = self.prediction_sets[name]
+        if name not in self._by_symbol:
+            self._by_symbol[name] = {symbol: group for symbol, group in predictions.groupby('Symbol', sort=False)}
+        group = self._by_symbol[name].get(symbol)
+        if group is None:
+            return predictions.iloc[:0].copy()
+        return group.copy()
+
+    def save(self, path):
+        """
+        Writes the models and predictions to a compressed .npz file.
+
+        Args:
+            path: Output file
+        """
+        names = list(self.prediction_sets)
+        predictions = pd.concat([self.prediction_sets[name] for name in names] or
+                                [pd.DataFrame(columns=PREDICTION_COLUMNS)], ignore_index=True)
+        # Written next to the target and renamed over it, so no reader sees a partial store
+        partial = f"{path}.{os.getpid()}.partial"
+        with open(partial, "wb") as f:
+            np.savez_compressed(
+                f,
+                symbols=np.array(self.symbols, dtype=str),
+                features=np.array(self.features, dtype=str),
+                intercept=self.intercept,
+                coef=self.coef,
+                fill=self.fill,
+                used=self.used,
+                set_names=np.array(names, dtype=str),
+                pred_set=np.repeat(np.arange(len(names), dtype=np.int32),
+                                   [len(self.prediction_sets[name]) for name in names]),
+                pred_symbol=np.array([self._row[s] for s in predictions['Symbol']], dtype=np.int32),
+                pred_date=predictions['Earnings_Date'].to_numpy(dtype='datetime64[ns]'),
+                pred_eps=predictions['Predicted_EPS'].to_numpy(dtype=float),
+                actual_eps=predictions['Actual_Reported_EPS'].to_numpy(dtype=float),
+            )
+        os.replace(partial, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a model store written by save.
+
+        Args:
+            path: .npz file
+
+        Returns:
+            ModelStore: The stored models and predictions
+        """
+        with np.load(path, allow_pickle=False) as f:
+            symbols = f['symbols'].tolist()
+            predictions = pd.DataFrame({
+                'Symbol': np.array(symbols, dtype=object)[f['pred_symbol']],
+                'Earnings_Date': f['pred_date'],
+                'Predicted_EPS': f['pred_eps'],
+                'Actual_Reported_EPS': f['actual_eps'],
+            })
+            # Stores written before walk-forward sets hold only the full-history predictions
+            names = f['set_names'].tolist() if 'set_names' in f.files else [FULL_HISTORY]
+            sets = f['pred_set'] if 'pred_set' in f.files else np.zeros(len(predictions), dtype=int)
+            prediction_sets = {name: predictions[sets == i].reset_index(drop=True) for i, name in enumerate(names)}
+            return cls(symbols, f['features'].tolist(), f['intercept'], f['coef'], f['fill'], f['used'],
+                       prediction_sets)
+
+
+@lru_cache(maxsize=4)
+def _read_store(path, stamp):
+    # stamp (mtime, size) is part of the key so a refitted store is reread
+    return ModelStore.load(path)
+
+
+def get_model_store(path=None):
+    """
+    The model store, read once per process and reread when the file changes.
+
+    Args:
+        path: .npz file (defaults to regression_models.npz at the repository root)
+
+    Returns:
+        ModelStore: The stored models, or None if there is no readable store
+    """
+    path = path or os.path.join(BASE_DIR, MODEL_STORE)
+    try:
+        stat = os.stat(path)
+        return _read_store(path, (stat.st_mtime_ns, stat.st_size))
+    except Exception as e:
+        if os.path.exists(path):
+            print(f"Error reading model store {path}: {e}")
+        return None
+
+
+# Prediction sets attached from shared memory in worker processes, by set name
+_SHARED_PREDICTIONS = {}
+
+
+def attach_predictions(handle):
+    """
+    Serves load_predictions from prediction sets published with shared_data.SharedFrames.
+
+    Used as a process pool initializer, so workers share one copy of the
+    prediction table instead of each reading the model store.
+
+    Args:
+        handle: SharedFrames.handle of frames keyed by prediction set name
+    """
+    _SHARED_PREDICTIONS.update(attach_frames(handle))
+
+
+def load_predictions(symbol=None, regression_file=None, store_path=None, predictions=FULL_HISTORY):
+    """
+    Regression predictions for the backtest.
+
+    Served from the in-memory model store, which is fitted first if the default
+    store file is missing; read from a CSV when regression_file is given or no
+    store can be fitted.
+
+    Args:
+        symbol: Stock symbol (defaults to every symbol)
+        regression_file: Predictions CSV to read instead of the model store
+        store_path: Model store file (defaults to regression_models.npz at the repository root)
+        predictions: 'full' for the full-history models, or a walk-forward set
+            ('walk_forward', 'walk_forward_<N>') from the model store
+
+    Returns:
+        DataFrame: Predictions with PREDICTION_COLUMNS
+    """
+    shared = None if regression_file or store_path else _SHARED_PREDICTIONS.get(predictions)
+    if shared is not None:
+        return shared if symbol is None else shared[shared['Symbol'] == symbol].copy()
+    store = None if regression_file else get_model_store(store_path)
+    if store is None and not regression_file and store_path is None \
+            and not os.path.exists(os.path.join(BASE_DIR, MODEL_STORE)):
+        print(f"No {MODEL_STORE} yet, fitting the regression models...")
+        if run_models(write_csv=False) is not None:
+            store = get_model_store()
+    if store is None:
+        if predictions != FULL_HISTORY and not regression_file:
+            raise ValueError(f"'{predictions}' predictions need a model store; run regression_models.py first")
+        reg_preds = pd.read_csv(regression_file or os.path.join(BASE_DIR, PREDICTIONS_CSV))
+        return reg_preds if symbol is None else reg_preds[reg_preds['Symbol'] == symbol].copy()
+    if symbol is None:
+        if predictions not in store.prediction_sets:
+            raise ValueError(f"No '{predictions}' predictions in the model store")
+        return store.prediction_sets[predictions].copy()
+    return store.symbol_predictions(symbol, predictions)
+
+
+def run_models(symbols=None, base_dir=BASE_DIR, write_csv=True, windows=WALK_FORWARD_WINDOWS,
+               method=WALK_FORWARD_METHOD):
+    """
+    Fits and scores the models of several symbols and saves the model store.
+
+    Args:
+        symbols: Stock symbols (defaults to every symbol in regression_data)
+        base_dir: Repository root holding the data folders
+        write_csv: Also write regression_predictions_new.csv
+        windows: Walk-forward window lengths in quarters (None for every prior quarter)
+        method: Walk-forward method, 'rls' or 'refit'
+
+    Returns:
+        DataFrame: Full-history predictions with PREDICTION_COLUMNS
+    """
+    symbols = symbols or list_model_symbols(base_dir)
+    datasets, frames = {}, {}
+    for symbol in symbols:
+        training = load_training_data(symbol, base_dir)
+        final_df = load_scoring_data(symbol, base_dir)
+        if training is None or final_df is None:
+            continue
+        datasets[symbol], frames[symbol] = training, final_df
+    if not datasets:
+        print("No symbol has both regression data and final finance data.")
+        return None
+
+    store = ModelStore.fit(datasets)
+    predictions = store.score(frames)
+    for window in windows:
+        store.add_predictions(prediction_set_name(window),
+                              walk_forward_predictions(datasets, frames, window, method=method))
+    store.save(os.path.join(base_dir, MODEL_STORE))
+    if write_csv:
+        predictions.to_csv(os.path.join(base_dir, PREDICTIONS_CSV), index=False)
+    print(f"Fitted {len(datasets)} models and saved {len(predictions)} predictions "
+          f"({len(store.prediction_sets)} sets) to {MODEL_STORE}")
+    return predictions
+
+
+def main(argv=None):
+    """
+    Fits and scores the regression models from the command line.
+
+    Args:
+        argv: Command line arguments (defaults to sys.argv)
+    """
+    parser = argparse.ArgumentParser(description="Fit the per-symbol EPS regressions and score every earnings date.")
+    parser.add_argument('symbols', nargs='*', help="Stock symbols (defaults to every symbol in regression_data)")
+    parser.add_argument('--base-dir', default=BASE_DIR, help="Repository root holding the data folders")
+    parser.add_argument('--no-csv', action='store_true', help=f"Do not write {PREDICTIONS_CSV}")
+    parser.add_argument('--windows', type=int, nargs='*', default=None,
+                        help="Walk-forward window lengths in quarters, 0 for every prior quarter "
+                             "(default: 0 24 40)")
+    parser.add_argument('--method', choices=('rls', 'refit'), default=WALK_FORWARD_METHOD,
+                        help="Walk-forward fitting: recursive updates (rls) or a refit per date")
+    args = parser.parse_args(argv)
+
+    windows = WALK_FORWARD_WINDOWS if args.windows is None else [window or None for window in args.windows]
+    run_models(args.symbols, args.base_dir, write_csv=not args.no_csv, windows=windows, method=args.method)
+
+
+if __name__ == "__main__":
+    main()
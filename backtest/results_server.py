@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Local Results Server
+
+Serves the dashboard and a small JSON API over the backtest results in
+frontend/results, using only the standard library:
+
+    GET /api/index                      run index (index.json, or built from the tickers' dashboard.json)
+    GET /api/tickers                    tickers that have results
+    GET /api/<TICKER>/summary           summary metrics
+    GET /api/<TICKER>/trades            trade log as {columns, data}
+    GET /api/<TICKER>/equity            equity curve as {total, data: [[x, value], ...]}
+        ?start=&end=                    only points with start <= x <= end
+        ?points=N                       at most N evenly spaced points of the (ranged) curve
+    GET /<path>                         static files under frontend/
+
+Responses are built from the result files on first use and kept in an LRU
+cache keyed by the files' modification times, so a rerun of the backtest is
+picked up without restarting the server. Every response carries an ETag and
+requests with a matching If-None-Match get a 304 with no body.
+
+    python results_server.py --port 8000
+"""
+
+import os
+import csv
+import json
+import hashlib
+import argparse
+import mimetypes
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend")
+RESULTS_DIR = os.path.join(FRONTEND_DIR, "results")
+CACHE_SIZE = 256
+
+# Mirrors the file names written by backtest.save_backtest_results and build_results_index
+DASHBOARD_FILE = "dashboard.json"
+RESULTS_BUNDLE = "results.json"
+INDEX_FILE = "index.json"
+
+
+class NotFound(Exception):
+    pass
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _file_stamp(path):
+    # (mtime, size) of a file, None if it does not exist; part of every cache key
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _json_body(obj):
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+
+class ResultsStore:
+    """
+    Reads result files and builds API response bodies, with an LRU cache.
+
+    Args:
+        results_dir: Directory holding the per-ticker results
+        cache_size: Maximum number of cached responses
+    """
+
+    def __init__(self, results_dir=RESULTS_DIR, cache_size=CACHE_SIZE):
+        self.results_dir = results_dir
+        self._cached = lru_cache(maxsize=cache_size)(self._build)
+
+    def ticker_dir(self, ticker):
+        if not ticker.isalnum():
+            raise NotFound(ticker)
+        return os.path.join(self.results_dir, ticker, f"{ticker}_backtest_results")
+
+    def tickers(self):
+        if not os.path.isdir(self.results_dir):
+            return []
+        return sorted(name for name in os.listdir(self.results_dir)
+                      if name.isalnum() and os.path.exists(os.path.join(self.ticker_dir(name), DASHBOARD_FILE)))
+
+    def get(self, kind, ticker=None, **query):
+        """
+        Returns (body, etag) of an API response, from the cache when its source files are unchanged.
+
+        Args:
+            kind: 'index', 'tickers', 'summary', 'trades' or 'equity'
+            ticker: Stock symbol for per-ticker responses
+            **query: start, end and points for equity curves
+        """
+        if ticker is None:
+            stamps = tuple((name, _file_stamp(os.path.join(self.ticker_dir(name), DASHBOARD_FILE)))
+                           for name in self.tickers())
+            stamps += (_file_stamp(os.path.join(self.results_dir, INDEX_FILE)),)
+        else:
+            directory = self.ticker_dir(ticker)
+            stamps = tuple(_file_stamp(os.path.join(directory, name))
+                           for name in (DASHBOARD_FILE, "equity_curve.csv", RESULTS_BUNDLE))
+            if stamps[0] is None:
+                raise NotFound(ticker)
+        return self._cached(kind, ticker, tuple(sorted(query.items())), stamps)
+
+    def _build(self, kind, ticker, query, stamps):
+        if kind == 'index':
+            body = self._index()
+        elif kind == 'tickers':
+            body = self.tickers()
+        elif kind in ('summary', 'trades'):
+            body = self._dashboard(ticker)[kind]
+        elif kind == 'equity':
+            body = self._equity(ticker, **dict(query))
+        else:
+            raise NotFound(kind)
+        data = _json_body(body)
+        return data, '"' + hashlib.sha1(data).hexdigest() + '"'
+
+    def _dashboard(self, ticker):
+        with open(os.path.join(self.ticker_dir(ticker), DASHBOARD_FILE)) as f:
+            return json.load(f)
+
+    def _index(self):
+        path = os.path.join(self.results_dir, INDEX_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+        results = {ticker: self._dashboard(ticker) for ticker in self.tickers()}
+        return {'generated_on': None, 'tickers': list(results), 'results': results}
+
+    def _full_equity(self, ticker):
+        # Full-resolution curve as ([x, ...], [value, ...])
+        directory = self.ticker_dir(ticker)
+        csv_file = os.path.join(directory, "equity_curve.csv")
+        if os.path.exists(csv_file):
+            with open(csv_file, newline='') as f:
+                rows = list(csv.reader(f))[1:]
+            return [_parse_x(x) for x, _ in rows], [float(v) for _, v in rows]
+        bundle_file = os.path.join(directory, RESULTS_BUNDLE)
+        if os.path.exists(bundle_file):
+            with open(bundle_file) as f:
+                points = json.load(f)['equity_curve']
+            return [x for x, _ in points], [v for _, v in points]
+        # Only the dashboard's downsampled copy is available
+        points = self._dashboard(ticker)['equity_curve']
+        return [x for x, _ in points], [v for _, v in points]
+
+    def _equity(self, ticker, start=None, end=None, points=None):
+        xs, values = self._full_equity(ticker)
+        lo = 0 if start is None else bisect_left(xs, _parse_x(start))
+        hi = len(xs) if end is None else bisect_right(xs, _parse_x(end))
+        positions = range(lo, hi)
+        if points is not None:
+            positions = [lo + i for i in sample_positions(hi - lo, int(points))]
+        return {
+            'ticker': ticker,
+            'total': len(xs),
+            'data': [[xs[i], values[i]] for i in positions],
+        }
+
+
+def _parse_x(value):
+    # Bar numbers compare as numbers; timestamps as ISO strings, which sort chronologically
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def sample_positions(n, max_points):
+    """
+    Evenly spaced positions of at most max_points samples, always keeping the first and last.
+
+    Args:
+        n: Length of the series
+        max_points: Maximum number of samples
+
+    Returns:
+        list: Sorted sample positions
+    """
+    if n <= max_points:
+        return list(range(n))
+    if max_points == 1:
+        return [0]
+    step = (n - 1) / (max_points - 1)
+    return sorted({round(i * step) for i in range(max_points)})
+
+
+class ResultsHandler(BaseHTTPRequestHandler):
+    """
+    Request handler for the results API and the dashboard's static files.
+    """
+
+    store = None
+    static_dir = FRONTEND_DIR
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = [unquote(p) for p in url.path.split('/') if p]
+        try:
+            if parts[:1] == ['api']:
+                body, etag = self._api(parts[1:], parse_qs(url.query))
+                self._send(body, etag, "application/json")
+            else:
+                self._static(parts)
+        except NotFound:
+            self.send_error(HTTPStatus.NOT_FOUND)
+        except BadRequest as e:
+            self.send_error(HTTPStatus.BAD_REQUEST, str(e))
+
+    def _api(self, parts, params):
+        if parts == ['index'] or parts == ['tickers']:
+            return self.store.get(parts[0])
+        if len(parts) != 2 or parts[1] not in ('summary', 'trades', 'equity'):
+            raise NotFound(self.path)
+        ticker, kind = parts
+        query = {}
+        if kind == 'equity':
+            for key in ('start', 'end', 'points'):
+                if key in params:
+                    query[key] = params[key][0]
+            if 'points' in query:
+                if not query['points'].isdigit() or int(query['points']) < 1:
+                    raise BadRequest("points must be a positive integer")
+                query['points'] = int(query['points'])
+        return self.store.get(kind, ticker.upper(), **query)
+
+    def _static(self, parts):
+        # results/ may live outside the frontend directory (--results-dir)
+        if parts[:1] == ['results']:
+            root, parts = self.store.results_dir, parts[1:]
+        else:
+            root = self.static_dir
+        root = os.path.realpath(root)
+        path = os.path.realpath(os.path.join(root, *parts))
+        if os.path.isdir(path):
+            path = os.path.join(path, "index.html")
+        if not (path == root or path.startswith(root + os.sep)) or not os.path.isfile(path):
+            raise NotFound(self.path)
+        stamp = _file_stamp(path)
+        etag = '"%x-%x"' % stamp
+        if self._not_modified(etag):
+            return
+        with open(path, "rb") as f:
+            body = f.read()
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self._send(body, etag, content_type)
+
+    def _not_modified(self, etag):
+        if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return True
+        return False
+
+    def _send(self, body, etag, content_type):
+        if self._not_modified(etag):
+            return
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        # Cached by the browser, but revalidated with If-None-Match on every use
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def make_server(host="127.0.0.1", port=8000, results_dir=RESULTS_DIR, cache_size=CACHE_SIZE):
+    """
+    Creates the results server (call serve_forever() on it to start serving).
+
+    Args:
+        host: Interface to bind
+        port: Port to listen on (0 picks a free port)
+        results_dir: Directory holding the per-ticker results
+        cache_size: Maximum number of cached API responses
+
+    Returns:
+        ThreadingHTTPServer: The server
+    """
+    handler = type('Handler', (ResultsHandler,), {'store': ResultsStore(results_dir, cache_size)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None):
+    """
+    Serves the dashboard and the results API until interrupted.
+
+    Args:
+        argv: Command line arguments (defaults to sys.argv)
+    """
+    parser = argparse.ArgumentParser(description="Serve the dashboard and backtest results.")
+    parser.add_argument('--host', default="127.0.0.1", help="Interface to bind (default 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8000, help="Port to listen on (default 8000)")
+    parser.add_argument('--results-dir', default=RESULTS_DIR, help="Results directory to serve")
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help="Cached API responses")
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, args.results_dir, args.cache_size)
+    print(f"Serving the dashboard on http://{args.host}:{server.server_port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
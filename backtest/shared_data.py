@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Read-only DataFrames Shared with Worker Processes
+
+Handing DataFrames to a process pool pickles them, so every worker holds its
+own full copy. SharedFrames instead writes each column once as a .npy file in
+a scratch directory (in /dev/shm when it has room, so the files live in
+memory) and hands the workers a small picklable handle. attach_frames
+memory-maps the files read-only and rebuilds the DataFrames around them
+without copying, so the operating system keeps one copy of the data however
+many workers attach.
+
+Numeric and datetime columns and indexes are shared. Timezone-aware datetimes
+are stored as int64 UTC nanoseconds with their timezone, and text columns as
+category codes; both are rebuilt in each worker. Other object columns raise
+TypeError rather than coming back as a different type.
+
+    with SharedFrames({'GS': price_df}) as shared:
+        with ProcessPoolExecutor(initializer=init, initargs=(shared.handle,)) as executor:
+            ...
+
+    def init(handle):
+        frames = attach_frames(handle)   # {'GS': read-only price_df}
+"""
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+SHM_DIR = "/dev/shm"
+
+# Frames attached in this process, by scratch directory, so a handle is mapped only once
+_ATTACHED = {}
+
+
+def _scratch_dir(nbytes, directory=None):
+    # In-memory filesystem when it has room for the data, else the temp directory
+    if directory is None and os.path.isdir(SHM_DIR):
+        try:
+            if shutil.disk_usage(SHM_DIR).free > 2 * nbytes:
+                directory = SHM_DIR
+        except OSError:
+            pass
+    return tempfile.mkdtemp(prefix="pead_shared_", dir=directory)
+
+
+def _column_arrays(values, name):
+    # (stored arrays, how to rebuild) for one column (Series) or index
+    if isinstance(values.dtype, pd.DatetimeTZDtype):
+        utc = pd.DatetimeIndex(values).tz_convert(None).as_unit('ns')
+        return [np.ascontiguousarray(utc.asi8)], f"datetimetz:{values.dtype.tz}"
+    if isinstance(values.dtype, pd.StringDtype) or (
+            values.dtype == object and pd.api.types.infer_dtype(values, skipna=True) in ('string', 'empty')):
+        codes, categories = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=True)
+        return [codes.astype(np.int32), np.asarray(categories, dtype=str)], 'category'
+    array = np.asarray(values)
+    if array.dtype == object:
+        raise TypeError(f"cannot share {name!r} of dtype {values.dtype}: "
+                        f"only numeric, datetime and string data is supported")
+    return [np.ascontiguousarray(array)], 'array'
+
+
+class SharedFrames:
+    """
+    DataFrames published once as memory-mapped column files for worker processes.
+
+    Args:
+        frames: Dict of key -> DataFrame (keys can be any picklable value)
+        directory: Directory to create the scratch directory in (defaults to
+            /dev/shm when it has room, else the system temp directory)
+    """
+
+    def __init__(self, frames, directory=None):
+        layout = []
+        arrays = []
+        for key, df in frames.items():
+            columns = []
+            for name in df.columns:
+                stored, kind = _column_arrays(df[name], name)
+                columns.append((name, kind, list(range(len(arrays), len(arrays) + len(stored)))))
+                arrays.extend(stored)
+            stored, kind = _column_arrays(df.index, df.index.name)
+            index = (df.index.name, kind, list(range(len(arrays), len(arrays) + len(stored))))
+            arrays.extend(stored)
+            layout.append((key, index, columns))
+
+        self.directory = _scratch_dir(sum(a.nbytes for a in arrays), directory)
+        for i, array in enumerate(arrays):
+            np.save(os.path.join(self.directory, f"{i}.npy"), array, allow_pickle=False)
+        self.handle = {'directory': self.directory, 'layout': layout}
+
+    def close(self):
+        """Removes the scratch directory (workers that still map it keep their views)."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def _rebuild(directory, kind, files):
+    arrays = [np.load(os.path.join(directory, f"{i}.npy"), mmap_mode='r', allow_pickle=False) for i in files]
+    if kind == 'category':
+        codes, categories = arrays
+        return pd.Categorical.from_codes(codes, categories=np.asarray(categories, dtype=object)).astype(object)
+    if kind.startswith('datetimetz:'):
+        utc = pd.DatetimeIndex(arrays[0].view('datetime64[ns]'), copy=False)
+        return utc.tz_localize('UTC').tz_convert(kind.split(':', 1)[1])
+    return arrays[0]
+
+
+def attach_frames(handle):
+    """
+    Attaches to frames published by SharedFrames, without copying their numeric data.
+
+    Args:
+        handle: SharedFrames.handle
+
+    Returns:
+        dict: Key -> read-only DataFrame, in publishing order
+    """
+    directory = handle['directory']
+    if directory in _ATTACHED:
+        return _ATTACHED[directory]
+    frames = {}
+    for key, (index_name, index_kind, index_files), columns in handle['layout']:
+        index = pd.Index(_rebuild(directory, index_kind, index_files), name=index_name, copy=False)
+        data = {name: _rebuild(directory, kind, files) for name, kind, files in columns}
+        # copy=False keeps one block per column, each a view of its memory-mapped file
+        frames[key] = pd.DataFrame(data, index=index, columns=[name for name, _, _ in columns], copy=False)
+    _ATTACHED[directory] = frames
+    return frames
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Earnings Trading Strategy for backtrader
+
+EarningsTradingStrategy is the bar-by-bar strategy run by backtest.run_backtest.
+It lives apart from backtest.py so that backtrader is only imported when the
+backtrader engine actually runs: the vectorized engine, the sweeps, worker
+processes and the command line's --help and --summary never load it.
+backtest.EarningsTradingStrategy still resolves to this class.
+
+The entry and exit rules (TRADE_PARAMS, blended_surprise, entry_direction,
+position_size and exit_reason) are shared with portfolio.PortfolioEarningsStrategy,
+so single-stock and portfolio runs trade on the same rules.
+
+StreamingMetricsAnalyzer is the cheap analyzer every analyzer profile of
+run_cerebro attaches (see backtest.ANALYZER_PROFILES).
+"""
+
+import datetime
+import pandas as pd
+import backtrader as bt
+
+from backtest import build_earnings_index, build_prediction_index, lookup_closest_prediction
+from equity import EquityCurve, StreamingMetrics
+from regression_models import load_predictions
+
+# Parameters of the entry and exit rules, shared by every earnings strategy
+TRADE_PARAMS = (
+    ('take_profit', 0.015),   # 1.5% Take Profit
+    ('stop_loss', 0.015),     # 1.5% Stop Loss
+    ('holding_period', 24),   # Max holding period in 5-min bars
+    ('max_trade_value', 1000), # $1,000 max per trade
+    ('surprise_threshold', 0.1),  # Min absolute blended surprise to enter
+    ('regression_weight', 0.1),   # Weight of regression vs analyst-estimate surprise
+)
+
+
+def blended_surprise(estimated_eps, reported_eps, predicted_eps, regression_weight):
+    """
+    Earnings surprise blending the analyst-estimate and regression-prediction surprises.
+
+    Args:
+        estimated_eps: Analysts' EPS estimate
+        reported_eps: Reported EPS
+        predicted_eps: EPS predicted by the regression models
+        regression_weight: Weight of the regression surprise (the estimate surprise gets the rest)
+
+    Returns:
+        float: Blended relative surprise
+    """
+    estimated_surprise = (reported_eps - estimated_eps) / estimated_eps
+    regression_surprise = (reported_eps - predicted_eps) / predicted_eps
+    return regression_weight*regression_surprise + (1 - regression_weight)*estimated_surprise
+
+
+def entry_direction(surprise, surprise_threshold):
+    """
+    Direction of the position to open for a surprise.
+
+    Returns:
+        bool: True to go long, False to go short, None to stay out
+    """
+    if surprise >= surprise_threshold:
+        return True
+    if surprise <= -surprise_threshold:
+        return False
+    return None
+
+
+def position_size(price, max_trade_value):
+    """
+    Whole shares bought for at most max_trade_value at price.
+    """
+    return int(max_trade_value / price)
+
+
+def exit_reason(is_long, entry_price, price, bars, params):
+    """
+    Exit rule of an open position.
+
+    Args:
+        is_long: True for a long position, False for a short one
+        entry_price: Price the position was opened at
+        price: Current price
+        bars: Bars the position has been held
+        params: Strategy params with take_profit, stop_loss and holding_period
+
+    Returns:
+        str: 'TOOK PROFIT', 'STOPPED OUT' or 'EXITED' (holding period reached),
+            or None to keep the position
+    """
+    if is_long:
+        price_change = (price - entry_price) / entry_price
+    else:  # Short position
+        price_change = (entry_price - price) / entry_price
+    if price_change >= params.take_profit:
+        return 'TOOK PROFIT'
+    if price_change <= -params.stop_loss:
+        return 'STOPPED OUT'
+    if bars >= params.holding_period:
+        return 'EXITED'
+    return None
+
+
+class StreamingMetricsAnalyzer(bt.Analyzer):
+    """
+    Sharpe ratio, drawdown and win rate of a run, in one pass over the broker value.
+
+    Replaces TimeReturn, SharpeRatio, DrawDown and PyFolio when only their
+    summary numbers are read: get_analysis() returns StreamingMetrics.results().
+    """
+
+    params = (
+        ('riskfreerate', 0.03),
+        ('flat_days', 0),   # Days left out of the data with a flat portfolio (see StreamingMetrics.add_flat_days)
+    )
+
+    def start(self):
+        self.metrics = StreamingMetrics(self.strategy.broker.getvalue(), self.p.riskfreerate)
+        self.metrics.add_flat_days(self.p.flat_days)
+
+    def next(self):
+        self.metrics.update(self.data.datetime.date(0), self.strategy.broker.getvalue())
+
+    def notify_trade(self, trade):
+        if trade.isclosed:
+            self.metrics.add_trade(trade.pnlcomm)
+
+    def get_analysis(self):
+        return self.metrics.results()
+
+
+class EarningsTradingStrategy(bt.Strategy):
+    """
+    A trading strategy that trades based on earnings surprises.
+    
+    The strategy enters long positions for positive earnings surprises and
+    short positions for negative earnings surprises. Positions are managed
+    with take-profit, stop-loss, and maximum holding period rules.
+    """
+    
+    params = TRADE_PARAMS + (
+        ('stock', None),  #To get the stock_symbol
+        ('regression_file', None),  # Predictions CSV to use instead of the model store
+        ('predictions', 'full')     # Model store prediction set: 'full' or walk-forward (see regression_models)
+    )
+
+    def __init__(self):
+        self.order = None
+        self.entry_price = None
+        self.bar_count = 0
+        self.trade_outcomes = []
+        self._closed_by_tp = False
+        self._closed_by_sl = False
+        self.is_long = None  # Track position type: True=Long, False=Short
+        # Portfolio value on every bar a filled position is managed, preallocated for every bar
+        self.equity = EquityCurve(self.data.buflen())
+        self.symbol = self.p.stock
+        self.reg_preds = load_predictions(self.symbol, self.p.regression_file, predictions=self.p.predictions)
+        # Build the per-symbol event index once instead of rescanning on every bar
+        self.pred_dates, self.pred_values = build_prediction_index(self.reg_preds)
+        self.earnings_by_date = build_earnings_index(getattr(self, 'earnings_data', None))
+        # Trade entries and exits as (datetime, price, signal, closed) tuples
+        self.records = []
+
+    @property
+    def df(self):
+        """
+        Trade log built from the recorded entries and exits.
+        """
+        return pd.DataFrame(self.records, columns=['datetime', 'price', 'signal', 'closed'])
+
+    @property
+    def portfolio_value(self):
+        return self.equity.values
+
+    @property
+    def equity_times(self):
+        return self.equity.times
+
+    def notify_trade(self, trade):
+        if trade.isclosed:
+            outcome = 'timeout'
+            if self._closed_by_tp:
+                outcome = 'tp'
+            elif self._closed_by_sl:
+                outcome = 'sl'
+            self.trade_outcomes.append((outcome, 'long' if self.is_long else 'short'))
+            print(f"Trade closed by {outcome} ({'Long' if self.is_long else 'Short'})")
+
+    def notify_order(self, order):
+        # Notifications carry a copy of the order, so match on its reference
+        if self.order is not None and order.ref == self.order.ref and order.status in (order.Canceled, order.Margin, order.Rejected):
+            print(f"Entry order {order.getstatusname()}")
+            current_dt = datetime.datetime.combine(self.data.datetime.date(), self.data.datetime.time())
+            self.records.append((current_dt, self.entry_price, 'BUY' if self.is_long else 'SELL', 'REJECTED'))
+            self.order = None
+
+    def next(self):
+        current_time = self.datas[0].datetime.time()
+        current_date = self.datas[0].datetime.date()
+        current_ts = pd.Timestamp(current_date)
+        current_dt = datetime.datetime.combine(current_date, current_time)
+
+        if datetime.time(16, 0) <= current_time <= datetime.time(16, 10) and not self.order:
+            earnings = self._get_earnings_for_date(current_date)
+            if earnings is not None:
+                predicted_eps_value = self._get_closest_prediction(current_ts)
+                estimated_eps, reported_eps = earnings
+                surprise = blended_surprise(estimated_eps, reported_eps, predicted_eps_value, self.p.regression_weight)
+
+                # Calculate position size based on $1,000 trade limit
+                current_price = self.data.close[0]
+                size = position_size(current_price, self.p.max_trade_value)
+
+                print(f"Date: {current_date}, Price: {current_price:.2f}, Position Size: {size}")
+
+                if size <= 0:
+                    print(f"Skipping trade on {current_date}: Position size is zero or negative.")
+                    return
+
+                is_long = entry_direction(surprise, self.p.surprise_threshold)
+                if is_long is not None:
+                    # Set before the order so a rejection notification can record the entry
+                    self.is_long = is_long
+                    self.entry_price = current_price
+                    self.bar_count = 0
+                    print(f"{'LONG' if is_long else 'SHORT'} ENTRY at {current_price:.2f} on {current_date}")
+                    # Record trade entry
+                    self.records.append((current_dt, current_price, 'BUY' if is_long else 'SELL', 'OPENED'))
+                    self.order = self.buy(size=size) if is_long else self.sell(size=size)
+
+        if self.order and self.order.status == bt.Order.Completed:
+            self.bar_count += 1
+            price = self.data.close[0]
+            closed = exit_reason(self.is_long, self.entry_price, price, self.bar_count, self.p)
+            if closed is not None:
+                print(f"Closing {'Long' if self.is_long else 'Short'} ({closed})")
+                # Record trade exit
+                self.records.append((current_dt, price, 'BUY' if self.is_long else 'SELL', closed))
+                self._closed_by_tp = closed == 'TOOK PROFIT'
+                self._closed_by_sl = closed == 'STOPPED OUT'
+                self.close()
+                self.order = None
+        
+            self.equity.append(current_dt, self.broker.getvalue())
+
+    def _get_earnings_for_date(self, date):
+        """
+        Helper method to get earnings data for a specific date.
+        
+        Args:
+            date: The date to check for earnings data
+            
+        Returns:
+            tuple: (EPS Estimate, Reported EPS) for the specified date or None
+        """
+        return self.earnings_by_date.get(date)
+
+    def _get_closest_prediction(self, ts):
+        """
+        Helper method to get the regression prediction closest to a date.
+        
+        Args:
+            ts: Timestamp of the current bar's date
+            
+        Returns:
+            float: Predicted EPS of the nearest earnings date
+        """
+        return lookup_closest_prediction(self.pred_dates, self.pred_values, ts)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Parameter Sweep for the Earnings Trading Strategy
+
+This module grid-searches take_profit, stop_loss, holding_period, the surprise
+threshold and the regression/estimate blend weight across all stocks using the
+vectorized engine. Price, earnings and regression data are loaded once per stock
+and published once as shared memory-mapped arrays (shared_data.SharedFrames) that
+every worker process attaches to without copying, so every combination reuses them
+instead of rereading CSVs or refetching earnings from yfinance, and memory does not
+grow with the number of workers.
+"""
+
+import os
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from shared_data import SharedFrames, attach_frames
+from vectorized import load_backtest_inputs, simulate_trades
+
+# Default grid, centred on the strategy's current parameters
+DEFAULT_GRID = {
+    'take_profit': [0.01, 0.015, 0.02, 0.03],
+    'stop_loss': [0.01, 0.015, 0.02, 0.03],
+    'holding_period': [12, 24, 36],
+    'surprise_threshold': [0.05, 0.1, 0.2],
+    'regression_weight': [0.0, 0.1, 0.25, 0.5],
+}
+
+# Loaded stock data, set once per worker process by _init_worker
+_SWEEP_DATA = None
+
+
+def param_grid(grid):
+    """
+    Expands a dict of parameter lists into every combination.
+    
+    Args:
+        grid: Dict mapping simulate_trades parameter names to lists of values
+    
+    Returns:
+        list: One dict of parameters per combination
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def load_sweep_data(stocks, predictions='full'):
+    """
+    Loads the backtest inputs for every stock once.
+    
+    Args:
+        stocks: List of stock symbols
+        predictions: Regression prediction set, 'full' or walk-forward (see regression_models)
+    
+    Returns:
+        dict: Stock symbol -> (price DataFrame, earnings DataFrame, regression predictions)
+    """
+    data = {}
+    for stock in stocks:
+        inputs = load_backtest_inputs(stock, predictions)
+        if inputs is not None:
+            data[stock] = inputs
+    return data
+
+
+def share_sweep_data(data):
+    """
+    Publishes loaded stock data for worker processes to attach to with _init_worker.
+    
+    Args:
+        data: Stock data from load_sweep_data
+    
+    Returns:
+        SharedFrames: The published data (close it when the workers are done)
+    """
+    return SharedFrames({(stock, part): frame for stock, frames in data.items()
+                         for part, frame in zip(('price', 'earnings', 'predictions'), frames)})
+
+
+def _init_worker(handle):
+    global _SWEEP_DATA
+    frames = attach_frames(handle)
+    stocks = dict.fromkeys(stock for stock, _ in frames)
+    _SWEEP_DATA = {stock: tuple(frames[(stock, part)] for part in ('price', 'earnings', 'predictions'))
+                   for stock in stocks}
+
+
+def evaluate_params(params, data=None):
+    """
+    Runs one parameter combination across all loaded stocks.
+    
+    Args:
+        params: Dict of simulate_trades parameters
+        data: Stock data from load_sweep_data (defaults to the worker's copy)
+    
+    Returns:
+        dict: The parameters plus aggregate Sharpe, PnL and win rate
+    """
+    if data is None:
+        data = _SWEEP_DATA
+
+    sharpes = []
+    net_pnl = 0.0
+    total_trades = 0
+    won_trades = 0
+    for price_df, earnings_df, reg_preds in data.values():
+        result = simulate_trades(price_df, earnings_df, reg_preds, **params)
+        if result.sharpe_ratio['sharperatio'] is not None:
+            sharpes.append(result.sharpe_ratio['sharperatio'])
+        closed = result.trades.dropna(subset=['pnlcomm'])
+        net_pnl += closed['pnlcomm'].sum()
+        total_trades += len(closed)
+        won_trades += int((closed['pnlcomm'] >= 0).sum())
+
+    row = dict(params)
+    row['sharpe_ratio'] = float(np.mean(sharpes)) if sharpes else np.nan
+    row['net_pnl'] = float(net_pnl)
+    row['total_trades'] = total_trades
+    row['win_rate'] = won_trades / total_trades * 100 if total_trades else np.nan
+    return row
+
+
+def run_sweep(stocks, grid=None, max_workers=None, data=None):
+    """
+    Evaluates every combination of a parameter grid across stocks in parallel.
+    
+    Args:
+        stocks: List of stock symbols
+        grid: Dict of parameter lists (defaults to DEFAULT_GRID)
+        max_workers: Number of worker processes (defaults to the CPU count)
+        data: Pre-loaded stock data from load_sweep_data (loaded if not given)
+    
+    Returns:
+        DataFrame: One row per combination, ranked by Sharpe ratio then net PnL
+    """
+    if grid is None:
+        grid = DEFAULT_GRID
+    if data is None:
+        data = load_sweep_data(stocks)
+    combinations = param_grid(grid)
+    print(f"Evaluating {len(combinations)} parameter combinations across {len(data)} stocks...")
+
+    if max_workers == 1:
+        rows = [evaluate_params(params, data) for params in combinations]
+    else:
+        with share_sweep_data(data) as shared, \
+                ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                    initargs=(shared.handle,)) as executor:
+            chunksize = max(1, len(combinations) // ((max_workers or os.cpu_count() or 1) * 4))
+            rows = list(executor.map(evaluate_params, combinations, chunksize=chunksize))
+
+    results = pd.DataFrame(rows)
+    results = results.sort_values(by=['sharpe_ratio', 'net_pnl'], ascending=False, na_position='last')
+    results.insert(0, 'rank', range(1, len(results) + 1))
+    return results.reset_index(drop=True)
+
+
+def main(max_workers=None):
+    """
+    Main function to sweep the default grid over all stocks.
+    
+    Args:
+        max_workers: Number of worker processes (defaults to the CPU count)
+    """
+    stocks = ['NVDA', 'GOOGL', 'GS', 'GME', 'MSFT']
+    
+    results = run_sweep(stocks, max_workers=max_workers)
+    
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    output_file = os.path.join(script_dir, "frontend", "results", "sweep_results.csv")
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    results.to_csv(output_file, index=False)
+    print(results.head(20))
+    print(f"Sweep results saved to {output_file}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
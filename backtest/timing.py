@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Per-Stage Timing and Profiling of Backtest Runs
+
+StageTimer records the wall time, CPU time and memory of named stages of a
+backtest (loading bars, fetching earnings, running Cerebro, writing results,
+...), one timer per ticker:
+
+    timer = StageTimer('GS')
+    with timer.stage('load_price_data'):
+        price_df = load_price_data('GS')
+    timer.stages   # [{'stage': 'load_price_data', 'wall': 0.21, 'cpu': 0.20, ...}]
+
+Stages can be nested; a nested stage is recorded as 'outer/inner'. Memory is
+the process's peak resident set size at the end of the stage, which includes
+earlier stages and earlier tickers run in the same worker. When tracemalloc
+is tracing (python -X tracemalloc, or PYTHONTRACEMALLOC=1, which worker
+processes inherit) the peak of Python allocations within each stage is
+recorded too.
+
+write_timing_report combines the timings of a run into timing.json next to
+the results and prints the stages that took the longest. profile_call runs a
+backtest under cProfile and writes its stats into the ticker's results
+directory (profile.prof for pstats/snakeviz, profile.txt as text).
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import cProfile
+import pstats
+import datetime
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:   # Not available on Windows
+    resource = None
+
+TIMING_FILE = "timing.json"
+PROFILE_FILE = "profile.prof"
+PROFILE_TEXT = "profile.txt"
+PROFILE_LINES = 40   # Functions listed in profile.txt
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far, in MB (None where unsupported).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+class StageTimer:
+    """
+    Records wall time, CPU time and peak memory of the stages of one backtest.
+
+    Args:
+        label: Name the timings are reported under (usually the ticker)
+    """
+
+    def __init__(self, label=None):
+        self.label = label
+        self.stages = []
+        self._open = []
+        self._peaks = []   # [allocated at start, highest peak seen] of each open stage, when tracing
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times the enclosed block as one stage.
+
+        Args:
+            name: Stage name
+        """
+        self._open.append(name)
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            # The peak is reset for every stage, so hand the peak so far to the enclosing stages first
+            current, peak = tracemalloc.get_traced_memory()
+            for open_peak in self._peaks:
+                open_peak[1] = max(open_peak[1], peak)
+            self._peaks.append([current, current])
+            tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            record = {
+                'stage': '/'.join(self._open),
+                'wall': time.perf_counter() - wall,
+                'cpu': time.process_time() - cpu,
+                'peak_rss_mb': peak_rss_mb(),
+            }
+            if tracing:
+                _, peak = tracemalloc.get_traced_memory()
+                base, highest = self._peaks.pop()
+                record['peak_alloc_mb'] = max(max(highest, peak) - base, 0) / 2**20
+                for open_peak in self._peaks:
+                    open_peak[1] = max(open_peak[1], highest)
+            self.stages.append(record)
+            self._open.pop()
+
+    def total(self):
+        """
+        Wall time of the top-level stages, in seconds.
+        """
+        return sum(s['wall'] for s in self.stages if '/' not in s['stage'])
+
+
+def stage_totals(timings):
+    """
+    Adds up the stages of several tickers.
+
+    Args:
+        timings: Dict of ticker -> StageTimer.stages
+
+    Returns:
+        list: One dict per stage name (wall, cpu, calls, max peak_rss_mb), slowest first
+    """
+    totals = {}
+    for stages in timings.values():
+        for s in stages:
+            total = totals.setdefault(s['stage'], {'stage': s['stage'], 'wall': 0.0, 'cpu': 0.0, 'calls': 0,
+                                                   'peak_rss_mb': None})
+            total['wall'] += s['wall']
+            total['cpu'] += s['cpu']
+            total['calls'] += 1
+            if s['peak_rss_mb'] is not None:
+                total['peak_rss_mb'] = max(total['peak_rss_mb'] or 0.0, s['peak_rss_mb'])
+    return sorted(totals.values(), key=lambda t: t['wall'], reverse=True)
+
+
+def write_timing_report(timings, base_path, run_info=None, top=10):
+    """
+    Writes the stage timings of a run to timing.json and prints the slowest stages.
+
+    Args:
+        timings: Dict of ticker -> StageTimer.stages (the run itself can be one more entry)
+        base_path: Directory to write timing.json to
+        run_info: Extra fields recorded in the report (engine, workers, ...)
+        top: Number of stages printed
+
+    Returns:
+        str: Path of the written report
+    """
+    totals = stage_totals(timings)
+    report = {
+        'generated_on': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        **(run_info or {}),
+        'stages': totals,
+        'tickers': timings,
+    }
+    path = os.path.join(base_path, TIMING_FILE)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=1)
+
+    print(f"{'Stage':<32}{'Calls':>6}{'Wall (s)':>10}{'CPU (s)':>10}{'Peak RSS (MB)':>15}")
+    for t in totals[:top]:
+        rss = '-' if t['peak_rss_mb'] is None else f"{t['peak_rss_mb']:.0f}"
+        print(f"{t['stage']:<32}{t['calls']:>6}{t['wall']:>10.3f}{t['cpu']:>10.3f}{rss:>15}")
+    print(f"Timing report saved to {path}")
+    return path
+
+
+def profile_call(func, stock, **kwargs):
+    """
+    Runs a per-ticker backtest function under cProfile and saves the stats in its results directory.
+
+    Args:
+        func: Backtest function returning a result dict with 'results_dir' (or None)
+        stock: Stock symbol
+        **kwargs: Arguments for func
+
+    Returns:
+        dict: What func returned
+    """
+    profiler = cProfile.Profile()
+    result = profiler.runcall(func, stock, **kwargs)
+    if result:
+        results_dir = result['results_dir']
+        profiler.dump_stats(os.path.join(results_dir, PROFILE_FILE))
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        with open(os.path.join(results_dir, PROFILE_TEXT), "w") as f:
+            f.write(text.getvalue())
+        print(f"Profile for {stock} saved to {results_dir}")
+    return result
@@ -0,0 +1,729 @@
+#!/usr/bin/env python3
+"""
+Vectorized Earnings Announcement Backtest Engine
+
+This module is a pure NumPy/pandas alternative to running EarningsTradingStrategy
+through backtrader. All candidate entries are found with array masks, every
+candidate's take-profit / stop-loss / timeout exit is resolved at once over a
+(events x holding_period) price matrix, and only the final pass that drops
+entries overlapping an open position walks the (small) list of events.
+
+It reproduces backtrader's fill model for the strategy: market orders placed on
+a bar are filled at the next bar's open, the entry reference price is the
+signal bar's close, and commission is charged as a percentage of traded value.
+The outputs (trade_entries.csv, equity_curve.csv, summary.txt, ...) are written
+with the same save_backtest_results used by the backtrader runner.
+"""
+
+import sys
+import hashlib
+import inspect
+import numpy as np
+import pandas as pd
+
+from backtest import (
+    build_earnings_index,
+    build_prediction_index,
+    create_results_dir,
+    filter_date_range,
+    filter_trading_hours,
+    load_earnings_data,
+    load_price_data,
+    result_files,
+    save_backtest_results,
+)
+from equity import StreamingMetrics
+from manifest import (
+    frame_fingerprint,
+    input_fingerprints,
+    is_unchanged,
+    read_manifest,
+    read_state,
+    stored_result,
+    write_manifest,
+)
+from regression_models import load_predictions
+from timing import StageTimer
+
+MAXINT = sys.maxsize
+
+
+class VectorizedResult:
+    """
+    Container for the output of simulate_trades.
+
+    Exposes the same `df`, `portfolio_value` and `equity_times` attributes
+    that save_backtest_results reads from a finished EarningsTradingStrategy.
+    """
+
+    def __init__(self, df, portfolio_value, trade_analysis, sharpe_ratio, trades,
+                 values=None, days=None, final_cash=None, equity_times=None, metrics=None):
+        self.df = df
+        self.portfolio_value = portfolio_value
+        self.equity_times = equity_times
+        self.trade_analysis = trade_analysis
+        self.sharpe_ratio = sharpe_ratio
+        self.trades = trades
+        # Per-bar portfolio value and day, and the cash left after the last bar
+        self.values = values
+        self.days = days
+        self.final_cash = final_cash
+        # Sharpe ratio, drawdown and win rate from StreamingMetrics.results()
+        self.metrics = metrics
+
+
+def closest_predictions(pred_dates, pred_values, days):
+    """
+    Vectorized version of lookup_closest_prediction.
+
+    Args:
+        pred_dates: Sorted datetime64 array from build_prediction_index
+        pred_values: Predicted EPS values aligned with pred_dates
+        days: datetime64 array of dates to look up
+
+    Returns:
+        ndarray: Predicted EPS of the nearest earnings date for each day
+    """
+    if len(pred_dates) == 0:
+        return np.full(len(days), np.nan)
+
+    days = days.astype('datetime64[ns]')
+    n = len(pred_dates)
+    i = np.searchsorted(pred_dates, days, side='left')
+    left = pred_dates[np.clip(i - 1, 0, n - 1)]
+    right = pred_dates[np.clip(i, 0, n - 1)]
+    use_left = (i == n) | ((i > 0) & (days - left <= right - days))
+    i = np.where(use_left, i - 1, i)
+    # Snap to the first of any duplicate dates, like idxmin
+    i = np.searchsorted(pred_dates, pred_dates[i], side='left')
+    return pred_values[i]
+
+
+def compute_surprises(days, earnings_by_date, pred_dates, pred_values,
+                      regression_weight=0.1):
+    """
+    Computes the blended earnings surprise for each bar date.
+
+    Args:
+        days: Array of datetime.date objects, one per candidate bar
+        earnings_by_date: Map from build_earnings_index
+        pred_dates: Sorted datetime64 array from build_prediction_index
+        pred_values: Predicted EPS values aligned with pred_dates
+        regression_weight: Weight of the regression surprise in the blend
+
+    Returns:
+        ndarray: Blended surprise per bar, NaN where there is no earnings release
+    """
+    estimated = np.full(len(days), np.nan)
+    reported = np.full(len(days), np.nan)
+    has_earnings = np.zeros(len(days), dtype=bool)
+    for k, day in enumerate(days):
+        earnings = earnings_by_date.get(day)
+        if earnings is not None:
+            has_earnings[k] = True
+            estimated[k], reported[k] = earnings
+
+    predicted = closest_predictions(pred_dates, pred_values, np.array(days, dtype='datetime64[D]'))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        estimated_surprise = (reported - estimated) / estimated
+        regression_surprise = (reported - predicted) / predicted
+        surprise = regression_weight*regression_surprise + (1 - regression_weight)*estimated_surprise
+    surprise[~has_earnings] = np.nan
+    return surprise
+
+
+def window_surprises(index, earnings_df, reg_preds, regression_weight=0.1):
+    """
+    Finds the bars inside the 16:00-16:10 entry window and their blended surprise.
+
+    Args:
+        index: Timezone-naive DatetimeIndex of the filtered price data
+        earnings_df: Earnings data indexed by timezone-naive timestamps
+        reg_preds: Regression predictions for the stock
+        regression_weight: Weight of the regression surprise in the blend
+
+    Returns:
+        tuple: (positions of the window bars, blended surprise per window bar)
+    """
+    time_of_day = index - index.normalize()
+    in_window = (time_of_day >= pd.Timedelta(hours=16)) & (time_of_day <= pd.Timedelta(hours=16, minutes=10))
+    window_bars = np.flatnonzero(in_window)
+
+    pred_dates, pred_values = build_prediction_index(reg_preds)
+    earnings_by_date = build_earnings_index(earnings_df)
+    surprise = compute_surprises(index.date[window_bars], earnings_by_date, pred_dates, pred_values,
+                                 regression_weight=regression_weight)
+    return window_bars, surprise
+
+
+def surprise_fingerprint(index, earnings_df, reg_preds, regression_weight=0.1):
+    """
+    Fingerprints the entry-window surprises, i.e. everything the strategy reads
+    from the earnings data and regression predictions.
+
+    Args:
+        index: Timezone-naive DatetimeIndex of the filtered price data
+        earnings_df: Earnings data indexed by timezone-naive timestamps
+        reg_preds: Regression predictions for the stock
+        regression_weight: Weight of the regression surprise in the blend
+
+    Returns:
+        str: Hex digest
+    """
+    window_bars, surprise = window_surprises(index, earnings_df, reg_preds, regression_weight)
+    digest = hashlib.sha256(index[window_bars].asi8.tobytes())
+    digest.update(surprise.tobytes())
+    return digest.hexdigest()
+
+
+def analyze_trades(pnl, pnlcomm, is_long, barlen, n_open):
+    """
+    Builds a trade analysis dict with the same layout as backtrader's TradeAnalyzer.
+
+    Args:
+        pnl: Gross PnL of each closed trade, in close order
+        pnlcomm: Net PnL (after commission) of each closed trade
+        is_long: Whether each closed trade was long
+        barlen: Number of bars each closed trade was held
+        n_open: Number of trades still open at the end of the data
+
+    Returns:
+        dict: Nested trade statistics keyed like TradeAnalyzer.get_analysis()
+    """
+    n_closed = len(pnl)
+    if n_closed + n_open == 0:
+        return {'total': {'total': 0}}
+
+    trades = {'total': {'total': n_closed + n_open, 'open': n_open}}
+    if n_closed == 0:
+        return trades
+    trades['total']['closed'] = n_closed
+
+    streak = {'won': {'current': 0, 'longest': 0}, 'lost': {'current': 0, 'longest': 0}}
+    pnl_stats = {'gross': {'total': 0.0, 'average': 0.0}, 'net': {'total': 0.0, 'average': 0.0}}
+    wl_stats = {wl: {'total': 0, 'pnl': {'total': 0.0, 'average': 0.0, 'max': 0.0}} for wl in ('won', 'lost')}
+    ls_stats = {
+        ls: {
+            'total': 0,
+            'pnl': {'total': 0.0, 'average': 0.0,
+                    'won': {'total': 0.0, 'average': 0.0, 'max': 0.0},
+                    'lost': {'total': 0.0, 'average': 0.0, 'max': 0.0}},
+            'won': 0,
+            'lost': 0,
+        }
+        for ls in ('long', 'short')
+    }
+    len_stats = {
+        'total': 0, 'average': 0.0, 'max': 0, 'min': MAXINT,
+        'won': {'total': 0, 'average': 0.0, 'max': 0},
+        'lost': {'total': 0, 'average': 0.0, 'max': 0},
+    }
+    for ls in ('long', 'short'):
+        len_stats[ls] = {
+            'total': 0, 'average': 0.0, 'max': 0, 'min': MAXINT,
+            'won': {'total': 0, 'average': 0.0, 'max': 0, 'min': MAXINT},
+            'lost': {'total': 0, 'average': 0.0, 'max': 0, 'min': MAXINT},
+        }
+
+    for k in range(n_closed):
+        trade_pnl = float(pnl[k])
+        trade_pnlcomm = float(pnlcomm[k])
+        length = int(barlen[k])
+        closed = k + 1
+        res = {'won': int(trade_pnlcomm >= 0.0)}
+        res['lost'] = int(not res['won'])
+        res['long'] = int(bool(is_long[k]))
+        res['short'] = int(not res['long'])
+
+        for wlname in ('won', 'lost'):
+            wl = res[wlname]
+            streak[wlname]['current'] = streak[wlname]['current']*wl + wl
+            streak[wlname]['longest'] = max(streak[wlname]['longest'], streak[wlname]['current'])
+
+        pnl_stats['gross']['total'] += trade_pnl
+        pnl_stats['gross']['average'] = pnl_stats['gross']['total'] / closed
+        pnl_stats['net']['total'] += trade_pnlcomm
+        pnl_stats['net']['average'] = pnl_stats['net']['total'] / closed
+
+        for wlname in ('won', 'lost'):
+            wl = res[wlname]
+            trwl = wl_stats[wlname]
+            trwl['total'] += wl
+            value = trade_pnlcomm * wl
+            trwl['pnl']['total'] += value
+            trwl['pnl']['average'] = trwl['pnl']['total'] / (trwl['total'] or 1.0)
+            func = max if wlname == 'won' else min
+            trwl['pnl']['max'] = func(trwl['pnl']['max'], value)
+
+        for lsname in ('long', 'short'):
+            ls = res[lsname]
+            trls = ls_stats[lsname]
+            trls['total'] += ls
+            trls['pnl']['total'] += trade_pnlcomm * ls
+            trls['pnl']['average'] = trls['pnl']['total'] / (trls['total'] or 1.0)
+            for wlname in ('won', 'lost'):
+                wl = res[wlname]
+                value = trade_pnlcomm * wl * ls
+                trls[wlname] += wl * ls
+                trls['pnl'][wlname]['total'] += value
+                trls['pnl'][wlname]['average'] = trls['pnl'][wlname]['total'] / (trls[wlname] or 1.0)
+                func = max if wlname == 'won' else min
+                trls['pnl'][wlname]['max'] = func(trls['pnl'][wlname]['max'], value)
+
+        len_stats['total'] += length
+        len_stats['average'] = len_stats['total'] / closed
+        len_stats['max'] = max(len_stats['max'], length)
+        len_stats['min'] = min(len_stats['min'], length)
+
+        for wlname in ('won', 'lost'):
+            wl = res[wlname]
+            trwl = len_stats[wlname]
+            trwl['total'] += length * wl
+            trwl['average'] = trwl['total'] / (wl_stats[wlname]['total'] or 1.0)
+            trwl['max'] = max(trwl['max'], length * wl)
+            if length * wl:
+                trwl['min'] = min(trwl.get('min') or MAXINT, length * wl)
+
+        for lsname in ('long', 'short'):
+            ls = res[lsname]
+            trls = len_stats[lsname]
+            ls_len = length * ls
+            trls['total'] += ls_len
+            trls['average'] = trls['total'] / (ls_stats[lsname]['total'] or 1.0)
+            trls['max'] = max(trls['max'], ls_len)
+            trls['min'] = min(trls['min'], ls_len or trls['min'])
+            for wlname in ('won', 'lost'):
+                wl = res[wlname]
+                wl_len = length * ls * wl
+                trls_wl = trls[wlname]
+                trls_wl['total'] += wl_len
+                trls_wl['average'] = trls_wl['total'] / (ls_stats[lsname][wlname] or 1.0)
+                trls_wl['max'] = max(trls_wl['max'], wl_len)
+                trls_wl['min'] = min(trls_wl['min'], wl_len or trls_wl['min'])
+
+    trades['streak'] = streak
+    trades['pnl'] = pnl_stats
+    trades['won'] = wl_stats['won']
+    trades['lost'] = wl_stats['lost']
+    trades['long'] = ls_stats['long']
+    trades['short'] = ls_stats['short']
+    trades['len'] = len_stats
+    return trades
+
+
+def daily_sharpe_ratio(values, days, start_value, riskfreerate=0.03):
+    """
+    Annualized Sharpe ratio of daily portfolio returns.
+
+    Mirrors backtrader's SharpeRatio(timeframe=Days, annualize=True): the
+    return of each day is its closing portfolio value over the previous
+    day's closing value, and the annual risk-free rate is converted to a
+    daily rate before it is subtracted.
+
+    Args:
+        values: Portfolio value at each bar
+        days: Calendar day of each bar (sorted)
+        start_value: Portfolio value before the first bar
+        riskfreerate: Annual risk-free rate
+
+    Returns:
+        dict: {'sharperatio': value or None}
+    """
+    metrics = StreamingMetrics(start_value, riskfreerate)
+    metrics.update_many(days, values)
+    return metrics.sharpe_ratio()
+
+
+def simulate_trades(price_df, earnings_df, reg_preds, take_profit=0.015, stop_loss=0.015,
+                    holding_period=24, max_trade_value=1000, surprise_threshold=0.1,
+                    regression_weight=0.1, cash=10000.0, commission=0.001):
+    """
+    Runs the earnings strategy over a filtered price frame using array operations.
+
+    Args:
+        price_df: After-hours price data indexed by timezone-naive timestamps
+        earnings_df: Earnings data indexed by timezone-naive timestamps
+        reg_preds: Regression predictions for the stock
+        take_profit: Take-profit threshold as a fraction of the entry price
+        stop_loss: Stop-loss threshold as a fraction of the entry price
+        holding_period: Max holding period in 5-min bars
+        max_trade_value: Max dollar value per trade
+        surprise_threshold: Minimum absolute surprise to enter a trade
+        regression_weight: Weight of the regression surprise in the blend
+        cash: Starting cash
+        commission: Commission as a fraction of traded value
+
+    Returns:
+        VectorizedResult: Trade log, equity curve, trade analysis and Sharpe ratio
+    """
+    index = price_df.index
+    opens = price_df['Open'].to_numpy(dtype=float)
+    closes = price_df['Close'].to_numpy(dtype=float)
+    n = len(closes)
+
+    # 1. Candidate entry bars: inside 16:00-16:10 on an earnings date with a strong surprise
+    window_bars, surprise = window_surprises(index, earnings_df, reg_preds, regression_weight)
+
+    signal_close = closes[window_bars]
+    sizes = (max_trade_value / signal_close).astype(int)
+    direction = np.where(surprise >= surprise_threshold, 1, np.where(surprise <= -surprise_threshold, -1, 0))
+    candidate = (direction != 0) & (sizes > 0)
+    entries = window_bars[candidate]
+    direction = direction[candidate]
+    sizes = sizes[candidate]
+    entry_price = signal_close[candidate]
+
+    # 2. Exit bar for every candidate at once over an (events x holding_period) matrix
+    offsets = np.arange(1, holding_period + 1)
+    path_idx = entries[:, None] + offsets[None, :]
+    valid = path_idx < n
+    path = closes[np.minimum(path_idx, n - 1)]
+    change = direction[:, None] * (path - entry_price[:, None]) / entry_price[:, None]
+    tp_hit = (change >= take_profit) & valid
+    sl_hit = (change <= -stop_loss) & valid
+    hit = tp_hit | sl_hit
+    any_hit = hit.any(axis=1)
+    first_hit = hit.argmax(axis=1)
+    exit_offset = np.where(any_hit, first_hit, holding_period - 1)
+    exits = entries + exit_offset + 1
+    rows = np.arange(len(entries))
+    reason = np.where(any_hit & tp_hit[rows, exit_offset], 'TOOK PROFIT',
+                      np.where(any_hit, 'STOPPED OUT', 'EXITED'))
+
+    # 3. Drop candidates that arrive while an earlier position is still open
+    taken = np.zeros(len(entries), dtype=bool)
+    last_exit = -1
+    for k in range(len(entries)):
+        if entries[k] <= last_exit:
+            continue
+        taken[k] = True
+        last_exit = exits[k]
+        if exits[k] >= n:
+            break
+    entries, exits, direction, sizes, reason = (
+        entries[taken], exits[taken], direction[taken], sizes[taken], reason[taken]
+    )
+
+    # 4. Trade log in the same shape as EarningsTradingStrategy.df
+    signal = np.where(direction > 0, 'BUY', 'SELL')
+    exit_logged = exits < n
+    log_bars = np.concatenate((entries, exits[exit_logged]))
+    log_order = np.concatenate((2 * np.arange(len(entries)), 2 * np.flatnonzero(exit_logged) + 1))
+    order = np.argsort(log_order, kind='stable')
+    df = pd.DataFrame({
+        'datetime': index[log_bars[order]].to_pydatetime(),
+        'price': closes[log_bars[order]],
+        'signal': np.concatenate((signal, signal[exit_logged]))[order],
+        'closed': np.concatenate((np.full(len(entries), 'OPENED'), reason[exit_logged]))[order],
+    }, columns=['datetime', 'price', 'signal', 'closed'])
+
+    # An order placed on the very last bar is never filled
+    filled = entries + 1 < n
+    entries, exits, direction, sizes, reason = (
+        entries[filled], exits[filled], direction[filled], sizes[filled], reason[filled]
+    )
+
+    # 5. Fills, PnL and the per-bar portfolio value, using the same arithmetic
+    # as backtrader's broker so the numbers agree to the last digit
+    entry_fill = entries + 1
+    exit_fill = exits + 1
+    signed_size = direction * sizes
+    closed = exit_fill < n
+    fill_in_price = opens[entry_fill]
+    fill_out_price = opens[np.minimum(exit_fill, n - 1)]
+    comm_in = np.abs(signed_size) * commission * fill_in_price
+    comm_out = np.abs(signed_size) * commission * fill_out_price
+    # Trade.update averages the price in as (size * price) / size, which can round
+    trade_price = (signed_size * fill_in_price) / signed_size
+    gross = signed_size * (fill_out_price - trade_price)
+    net = gross - (comm_in + comm_out)
+
+    # Cash is a running balance, so it is carried trade by trade
+    cash_open = np.empty(len(entries))
+    cash_close = np.empty(len(entries))
+    running = cash
+    for k in range(len(entries)):
+        running -= signed_size[k] * fill_in_price[k]
+        running -= comm_in[k]
+        cash_open[k] = running
+        if closed[k]:
+            running += signed_size[k] * fill_in_price[k] + signed_size[k] * (fill_out_price[k] - fill_in_price[k])
+            running -= comm_out[k]
+        cash_close[k] = running
+
+    change_bars = np.concatenate((entry_fill, exit_fill[closed]))
+    change_order = np.argsort(change_bars, kind='stable')
+    change_bars = change_bars[change_order]
+    cash_levels = np.concatenate((cash_open, cash_close[closed]))[change_order]
+    size_levels = np.concatenate((signed_size, np.zeros(closed.sum(), dtype=int)))[change_order]
+    price_levels = np.concatenate((fill_in_price, np.full(closed.sum(), np.nan)))[change_order]
+    segment = np.searchsorted(change_bars, np.arange(n), side='right') - 1
+    in_segment = segment >= 0
+    bar_cash = np.where(in_segment, cash_levels[segment], cash)
+    bar_size = np.where(in_segment, size_levels[segment], 0)
+    bar_entry = np.where(in_segment, price_levels[segment], np.nan)
+    position_value = bar_size * closes
+    unrealized = bar_size * (closes - bar_entry)
+    # Long positions are valued as (value - unrealized) + unrealized, as in BackBroker._get_value
+    position_value = np.where(bar_size > 0, (position_value - unrealized) + unrealized, position_value)
+    values = bar_cash + position_value
+
+    # Equity curve is sampled while a position is held, from the fill bar to the exit signal bar
+    held = np.zeros(n + 1, dtype=int)
+    np.add.at(held, entry_fill, 1)
+    np.add.at(held, np.minimum(exits + 1, n), -1)
+    sampled = np.cumsum(held[:n]) > 0
+    portfolio_value = values[sampled].tolist()
+
+    trade_analysis = analyze_trades(gross[closed], net[closed], direction[closed] > 0,
+                                    exits[closed] - entries[closed], int((~closed).sum()))
+    days = index.normalize().to_numpy()
+    metrics = StreamingMetrics(cash)
+    metrics.update_many(days, values)
+    metrics.add_trades(net[closed])
+    sharpe_ratio = metrics.sharpe_ratio()
+
+    trades = pd.DataFrame({
+        'entry_time': index[entries],
+        'exit_time': index[np.minimum(exit_fill, n - 1)].where(closed),
+        'direction': direction,
+        'size': sizes,
+        'entry_price': fill_in_price,
+        'exit_price': np.where(closed, fill_out_price, np.nan),
+        'pnl': np.where(closed, gross, np.nan),
+        'pnlcomm': np.where(closed, net, np.nan),
+        'reason': reason,
+        'bars': exits - entries,
+    })
+    return VectorizedResult(df, portfolio_value, trade_analysis, sharpe_ratio, trades,
+                            values=values, days=days, final_cash=running,
+                            equity_times=index[sampled].to_numpy(), metrics=metrics.results())
+
+
+def extend_result(previous, result, start_cash):
+    """
+    Appends a simulation of newly added bars to the state of an earlier run.
+
+    The earlier run must have ended flat, and result must be simulated over the
+    bars after its last bar starting from its final cash, so the combined trade
+    log, equity curve, trade analysis and Sharpe ratio equal a full replay.
+
+    Args:
+        previous: VectorizedResult of the earlier run
+        result: VectorizedResult for the new bars
+        start_cash: Starting cash of the earlier run
+
+    Returns:
+        VectorizedResult: Results over the whole history
+    """
+    df = pd.concat([previous.df, result.df], ignore_index=True)
+    trades = pd.concat([previous.trades, result.trades], ignore_index=True)
+    values = np.concatenate((previous.values, result.values))
+    days = np.concatenate((previous.days, result.days))
+
+    closed = trades['pnlcomm'].notna().to_numpy()
+    trade_analysis = analyze_trades(trades['pnl'].to_numpy()[closed], trades['pnlcomm'].to_numpy()[closed],
+                                    trades['direction'].to_numpy()[closed] > 0,
+                                    trades['bars'].to_numpy()[closed], int((~closed).sum()))
+    metrics = StreamingMetrics(start_cash)
+    metrics.update_many(days, values)
+    metrics.add_trades(trades['pnlcomm'].to_numpy()[closed])
+    return VectorizedResult(df, previous.portfolio_value + result.portfolio_value, trade_analysis,
+                            metrics.sharpe_ratio(), trades, values=values, days=days,
+                            final_cash=result.final_cash,
+                            equity_times=np.concatenate((previous.equity_times, result.equity_times)),
+                            metrics=metrics.results())
+
+
+def ended_flat(result):
+    """
+    Checks that a run left no open position or unfilled order behind.
+
+    Args:
+        result: VectorizedResult
+
+    Returns:
+        bool: True if later bars can be simulated independently
+    """
+    opened = int((result.df['closed'] == 'OPENED').sum())
+    return opened == len(result.trades) and bool(result.trades['pnlcomm'].notna().all())
+
+
+def load_backtest_inputs(stock, predictions='full', start=None, end=None, timer=None):
+    """
+    Load and prepare everything simulate_trades needs for one stock.
+
+    Args:
+        stock: Stock symbol
+        predictions: Regression prediction set, 'full' or walk-forward (see regression_models)
+        start: First date to trade (defaults to the first bar)
+        end: Last date to trade (defaults to the last bar)
+        timer: StageTimer to record the loading stages in (see timing)
+
+    Returns:
+        tuple: (after-hours price DataFrame, earnings DataFrame, regression predictions)
+            or None if price or earnings data is missing
+    """
+    timer = timer or StageTimer()
+    with timer.stage('load_price_data'):
+        price_df = load_price_data(stock)
+    if price_df is None:
+        print(f"Cannot run backtest for {stock} due to missing price data.")
+        return None
+
+    with timer.stage('load_earnings_data'):
+        earnings_df = load_earnings_data(stock)
+    if earnings_df is None:
+        print(f"Cannot run backtest for {stock} due to missing earnings data.")
+        return None
+
+    with timer.stage('filter_trading_hours'):
+        price_df.index = price_df.index.tz_localize(None)
+        earnings_df.index = earnings_df.index.tz_localize(None)
+        filtered_price_df = filter_date_range(filter_trading_hours(price_df), start, end)
+
+    with timer.stage('load_predictions'):
+        reg_preds = load_predictions(stock, predictions=predictions)
+
+    return filtered_price_df, earnings_df, reg_preds
+
+
+def simulation_params(**strategy_params):
+    """
+    simulate_trades parameters with defaults filled in, as recorded in the manifest.
+
+    Args:
+        **strategy_params: Overrides for simulate_trades parameters
+
+    Returns:
+        dict: Every simulate_trades keyword parameter
+    """
+    defaults = {
+        name: param.default
+        for name, param in inspect.signature(simulate_trades).parameters.items()
+        if param.default is not inspect.Parameter.empty
+    }
+    unknown = set(strategy_params) - set(defaults)
+    if unknown:
+        raise TypeError(f"Unknown strategy parameters: {sorted(unknown)}")
+    return {**defaults, **strategy_params}
+
+
+def resume_simulation(manifest, state, fingerprints, filtered_price_df, earnings_df, reg_preds, params):
+    """
+    Simulates only the bars added since a previous run, if its results still hold.
+
+    Args:
+        manifest: Manifest of the previous run
+        state: State of the previous run
+        fingerprints: input_fingerprints of the current inputs
+        filtered_price_df: After-hours price data
+        earnings_df: Earnings data
+        reg_preds: Regression predictions for the stock
+        params: Resolved simulate_trades parameters
+
+    Returns:
+        VectorizedResult: Results over the whole history, or None if a full run is needed
+    """
+    previous = state.get('result') if state else None
+    # States written before equity timestamps were recorded cannot be extended
+    if previous is None or manifest.get('last_bar') is None or getattr(previous, 'equity_times', None) is None:
+        return None
+    if manifest['fingerprints']['params'] != fingerprints['params'] or not ended_flat(previous):
+        return None
+
+    # Bars and surprises up to the last simulated bar must be exactly what was simulated
+    last_bar = pd.Timestamp(manifest['last_bar'])
+    prefix = filtered_price_df[filtered_price_df.index <= last_bar]
+    if frame_fingerprint(prefix) != manifest['fingerprints']['price']:
+        return None
+    if surprise_fingerprint(prefix.index, earnings_df, reg_preds,
+                            params['regression_weight']) != manifest['surprises']:
+        return None
+
+    new_bars = filtered_price_df[filtered_price_df.index > last_bar]
+    if len(new_bars) == 0:
+        return previous
+    print(f"Resuming from {last_bar}: simulating {len(new_bars)} new bars")
+    result = simulate_trades(new_bars, earnings_df, reg_preds, **{**params, 'cash': previous.final_cash})
+    return extend_result(previous, result, params['cash'])
+
+
+def run_vectorized_backtest(stock, incremental=False, output_format='csv', write_html=True, predictions='full',
+                            start=None, end=None, **strategy_params):
+    """
+    Run a backtest for a specific stock with the vectorized engine.
+
+    Args:
+        stock: Stock symbol
+        incremental: Skip the stock if its inputs are unchanged since the last run,
+            and only simulate new bars if only later bars and events were added
+        output_format: 'csv' or 'json' (see save_backtest_results)
+        write_html: Also render the Plotly HTML charts
+        predictions: Regression prediction set, 'full' or walk-forward (see regression_models)
+        start: First date to trade (defaults to the first bar)
+        end: Last date to trade (defaults to the last bar)
+        **strategy_params: Overrides for simulate_trades parameters
+
+    Returns:
+        dict: Results of the backtest, in the same shape as run_backtest
+    """
+    print(f"Running vectorized backtest for {stock}...")
+
+    timer = StageTimer(stock)
+    inputs = load_backtest_inputs(stock, predictions, start, end, timer=timer)
+    if inputs is None:
+        return None
+    filtered_price_df, earnings_df, reg_preds = inputs
+    params = simulation_params(**strategy_params)
+
+    with timer.stage('check_inputs'):
+        fingerprints = input_fingerprints(filtered_price_df, earnings_df, reg_preds,
+                                          {**params, 'engine': 'vectorized'},
+                                          {'output_format': output_format, 'write_html': write_html})
+        results_dir = create_results_dir(stock)
+        manifest = read_manifest(results_dir) if incremental else None
+        state = None
+        if is_unchanged(manifest, fingerprints, results_dir, result_files(output_format)):
+            state = read_state(results_dir)
+    if state is not None:
+        print(f"Inputs for {stock} are unchanged, keeping the stored results")
+        return {**stored_result(stock, results_dir, state), 'timings': timer.stages}
+
+    with timer.stage('simulate'):
+        result = None
+        if manifest is not None and manifest.get('engine') == 'vectorized':
+            result = resume_simulation(manifest, read_state(results_dir), fingerprints,
+                                       filtered_price_df, earnings_df, reg_preds, params)
+        if result is None:
+            result = simulate_trades(filtered_price_df, earnings_df, reg_preds, **params)
+
+    print(f"Sharpe Ratio for {stock}:", result.sharpe_ratio['sharperatio'])
+
+    with timer.stage('save_results'):
+        save_backtest_results(results_dir, result.trade_analysis, result.sharpe_ratio, result,
+                              output_format=output_format, write_html=write_html, timer=timer,
+                              stream_metrics=result.metrics)
+    with timer.stage('write_manifest'):
+        write_manifest(results_dir, {
+            'stock': stock,
+            'engine': 'vectorized',
+            'fingerprints': fingerprints,
+            'surprises': surprise_fingerprint(filtered_price_df.index, earnings_df, reg_preds,
+                                              params['regression_weight']),
+            'last_bar': str(filtered_price_df.index[-1]) if len(filtered_price_df) else None,
+        }, {
+            'df': result.df,
+            'trade_analysis': result.trade_analysis,
+            'sharpe_ratio': result.sharpe_ratio,
+            'result': result,
+        })
+
+    return {
+        'stock': stock,
+        'sharpe_ratio': result.sharpe_ratio['sharperatio'],
+        'trade_analysis': result.trade_analysis,
+        'results_dir': results_dir,
+        'trade_entries': result.df,
+        'timings': timer.stages,
+    }